@@ -48,6 +48,8 @@ GRANT USAGE ON DATABASE MARKETING_CAMPAIGNS_DB TO ROLE AGENT_EVAL_ROLE;
 GRANT USAGE ON SCHEMA MARKETING_CAMPAIGNS_DB.AGENTS TO ROLE AGENT_EVAL_ROLE;
 GRANT CREATE TABLE ON SCHEMA MARKETING_CAMPAIGNS_DB.AGENTS TO ROLE AGENT_EVAL_ROLE;
 GRANT CREATE STAGE ON SCHEMA MARKETING_CAMPAIGNS_DB.AGENTS TO ROLE AGENT_EVAL_ROLE;
+GRANT CREATE VIEW ON SCHEMA MARKETING_CAMPAIGNS_DB.AGENTS TO ROLE AGENT_EVAL_ROLE;
+GRANT CREATE STREAM ON SCHEMA MARKETING_CAMPAIGNS_DB.AGENTS TO ROLE AGENT_EVAL_ROLE;
 
 
 -- Specialized db/application roles
@@ -224,6 +226,22 @@ AS SELECT INPUT_QUERY, PARSE_JSON(EXPECTED_TOOLS) AS GROUND_TRUTH_DATA
 FROM EVALS_TABLE;
 
 
+-- ============================================================================
+-- OPTIONAL: LOAD-TEST DATA AT SCALE
+-- ============================================================================
+-- The CSVs above hold 25 campaigns. To test the agent and semantic view at scale,
+-- generate Parquet files locally and load them instead, e.g.:
+--   python generate_demo_data.py --scale-factor 100000 --seed 42 --output-dir demo_data
+-- then upload each table directory from SnowSQL and COPY it in (repeat per table):
+--
+-- CREATE STAGE IF NOT EXISTS DEMO_DATA_STAGE;
+-- PUT file://demo_data/CAMPAIGN_PERFORMANCE/*.parquet @DEMO_DATA_STAGE/CAMPAIGN_PERFORMANCE/ PARALLEL=16;
+-- TRUNCATE TABLE CAMPAIGN_PERFORMANCE;
+-- COPY INTO CAMPAIGN_PERFORMANCE
+-- FROM @DEMO_DATA_STAGE/CAMPAIGN_PERFORMANCE/
+-- FILE_FORMAT = (TYPE = PARQUET)
+-- MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE;
+
 -- ====================================================================
 -- SECTION 5: VALIDATE DATA;
 -- ====================================================================
@@ -337,38 +355,92 @@ CREATE OR REPLACE STAGE CAMPAIGN_REPORTS
   DIRECTORY = (ENABLE = TRUE)
   COMMENT = 'Internal stage to host generated campaign reports';
 
-CREATE OR REPLACE PROCEDURE GENERATE_CAMPAIGN_REPORT_HTML(campaign_id NUMBER)
-RETURNS VARCHAR
+-- File format for unloading HTML reports (created once, not on every report)
+CREATE OR REPLACE FILE FORMAT html_format
+  TYPE = 'CSV'
+  FIELD_DELIMITER = NONE
+  RECORD_DELIMITER = NONE
+  SKIP_HEADER = 0
+  FIELD_OPTIONALLY_ENCLOSED_BY = NONE
+  ESCAPE_UNENCLOSED_FIELD = NONE
+  COMPRESSION = NONE
+  ENCODING = 'UTF8'
+  FILE_EXTENSION = 'html';
+
+-- Version of the data behind each campaign's report, bumped whenever any of its rows change.
+-- Kept across setup re-runs so a rebuilt campaign never reuses a version its old report was cached under.
+CREATE TABLE IF NOT EXISTS CAMPAIGN_DATA_VERSIONS (
+  campaign_id NUMBER,
+  data_version NUMBER
+);
+
+-- Row changes since versions were last refreshed; the initial rows count as changes on the first refresh
+CREATE OR REPLACE STREAM CAMPAIGNS_CHANGES ON TABLE CAMPAIGNS SHOW_INITIAL_ROWS = TRUE;
+CREATE OR REPLACE STREAM CAMPAIGN_PERFORMANCE_CHANGES ON TABLE CAMPAIGN_PERFORMANCE SHOW_INITIAL_ROWS = TRUE;
+CREATE OR REPLACE STREAM CAMPAIGN_FEEDBACK_CHANGES ON TABLE CAMPAIGN_FEEDBACK SHOW_INITIAL_ROWS = TRUE;
+
+-- Bump the version of every campaign with changed rows; reads only the changes, and consumes them.
+-- The streams are checked from metadata first, so calls with nothing to refresh skip the MERGE and its lock.
+CREATE OR REPLACE PROCEDURE REFRESH_CAMPAIGN_DATA_VERSIONS()
+RETURNS NUMBER
 LANGUAGE SQL
-EXECUTE AS OWNER                                                                                                                         
+EXECUTE AS OWNER
 AS
 $$
 DECLARE
-  report_html VARCHAR;
-  campaign_info VARCHAR;
-  performance_metrics VARCHAR;
-  feedback_summary VARCHAR;
-  file_name VARCHAR;
-  upload_result VARCHAR;
-  org_name VARCHAR;
-  account_name VARCHAR;
+  has_changes BOOLEAN;
 BEGIN
-  -- Get campaign basic information
-  SELECT 
+  SELECT SYSTEM$STREAM_HAS_DATA('CAMPAIGNS_CHANGES')
+      OR SYSTEM$STREAM_HAS_DATA('CAMPAIGN_PERFORMANCE_CHANGES')
+      OR SYSTEM$STREAM_HAS_DATA('CAMPAIGN_FEEDBACK_CHANGES')
+  INTO has_changes;
+
+  IF (NOT has_changes) THEN
+    RETURN 0;
+  END IF;
+
+  MERGE INTO CAMPAIGN_DATA_VERSIONS t
+  USING (
+    SELECT campaign_id FROM CAMPAIGNS_CHANGES
+    UNION
+    SELECT campaign_id FROM CAMPAIGN_PERFORMANCE_CHANGES
+    UNION
+    SELECT campaign_id FROM CAMPAIGN_FEEDBACK_CHANGES
+  ) s
+  ON t.campaign_id = s.campaign_id
+  WHEN MATCHED THEN UPDATE SET data_version = t.data_version + 1
+  WHEN NOT MATCHED THEN INSERT (campaign_id, data_version) VALUES (s.campaign_id, 1);
+  RETURN SQLROWCOUNT;
+END;
+$$;
+
+-- Full HTML report for every campaign, built set-based so one query can serve many campaigns
+CREATE OR REPLACE VIEW CAMPAIGN_REPORT_SOURCE AS
+SELECT
+  c.campaign_id,
+  '<!DOCTYPE html><html><head><style>' ||
+    'body { font-family: Arial, sans-serif; margin: 20px; }' ||
+    'table { margin: 20px 0; }' ||
+    'th { background-color: #4CAF50; color: white; padding: 10px; text-align: left; }' ||
+    'td { padding: 10px; }' ||
+    'tr:nth-child(even) { background-color: #f2f2f2; }' ||
+    '</style></head><body>' ||
     '<h1>Campaign Report</h1>' ||
-    '<h2>Campaign: ' || campaign_name || '</h2>' ||
-    '<p><strong>Type:</strong> ' || campaign_type || '</p>' ||
-    '<p><strong>Channel:</strong> ' || channel || '</p>' ||
-    '<p><strong>Duration:</strong> ' || start_date || ' to ' || end_date || '</p>' ||
-    '<p><strong>Budget:</strong> $' || budget_allocated || '</p>' ||
-    '<p><strong>Target Audience:</strong> ' || target_audience || '</p>' ||
-    '<p><strong>Status:</strong> ' || status || '</p>'
-  INTO campaign_info
-  FROM CAMPAIGNS
-  WHERE campaign_id = :campaign_id;
-  
-  -- Get performance metrics summary
-  SELECT 
+    '<h2>Campaign: ' || c.campaign_name || '</h2>' ||
+    '<p><strong>Type:</strong> ' || c.campaign_type || '</p>' ||
+    '<p><strong>Channel:</strong> ' || c.channel || '</p>' ||
+    '<p><strong>Duration:</strong> ' || c.start_date || ' to ' || c.end_date || '</p>' ||
+    '<p><strong>Budget:</strong> $' || c.budget_allocated || '</p>' ||
+    '<p><strong>Target Audience:</strong> ' || c.target_audience || '</p>' ||
+    '<p><strong>Status:</strong> ' || c.status || '</p>' ||
+    COALESCE(p.performance_metrics, '<h3>Performance Metrics</h3><p>No performance data available</p>') ||
+    COALESCE(f.feedback_summary, '<p>No feedback available</p>') ||
+    '<hr><p style="text-align:center; color:#666;">Report Generated: ' || CURRENT_TIMESTAMP() || '</p>' ||
+    '</body></html>' AS report_html
+FROM CAMPAIGNS c
+LEFT JOIN (
+  SELECT
+    campaign_id,
     '<h3>Performance Metrics</h3>' ||
     '<table border="1" style="border-collapse:collapse; width:100%">' ||
     '<tr><th>Metric</th><th>Value</th></tr>' ||
@@ -382,13 +454,13 @@ BEGIN
     '<tr><td>Total Revenue Generated</td><td>$' || TO_CHAR(SUM(revenue_generated), '999,999,999.99') || '</td></tr>' ||
     '<tr><td>Average ROI</td><td>' || ROUND(AVG(roi_percentage), 2) || '%</td></tr>' ||
     '<tr><td>Average Engagement Rate</td><td>' || ROUND(AVG(engagement_rate) * 100, 2) || '%</td></tr>' ||
-    '</table>'
-  INTO performance_metrics
+    '</table>' AS performance_metrics
   FROM CAMPAIGN_PERFORMANCE
-  WHERE campaign_id = :campaign_id;
-  
-  -- Get feedback summary
-  SELECT 
+  GROUP BY campaign_id
+) p ON c.campaign_id = p.campaign_id
+LEFT JOIN (
+  SELECT
+    campaign_id,
     '<h3>Customer Feedback Summary</h3>' ||
     '<p><strong>Average Satisfaction Score:</strong> ' || ROUND(AVG(satisfaction_score), 2) || ' / 5.0</p>' ||
     '<p><strong>Number of Feedback Entries:</strong> ' || COUNT(*) || '</p>' ||
@@ -401,70 +473,170 @@ BEGIN
       '<p><strong>Recommendations:</strong> ' || recommended_improvements || '</p>' ||
       '</div>',
       ''
-    ) WITHIN GROUP (ORDER BY feedback_date DESC)
-  INTO feedback_summary
+    ) WITHIN GROUP (ORDER BY feedback_date DESC) AS feedback_summary
   FROM CAMPAIGN_FEEDBACK
-  WHERE campaign_id = :campaign_id;
-  
-  -- Combine all sections
-  report_html := '<!DOCTYPE html><html><head><style>' ||
-    'body { font-family: Arial, sans-serif; margin: 20px; }' ||
-    'table { margin: 20px 0; }' ||
-    'th { background-color: #4CAF50; color: white; padding: 10px; text-align: left; }' ||
-    'td { padding: 10px; }' ||
-    'tr:nth-child(even) { background-color: #f2f2f2; }' ||
-    '</style></head><body>' ||
-    campaign_info ||
-    performance_metrics ||
-    COALESCE(feedback_summary, '<p>No feedback available</p>') ||
-    '<hr><p style="text-align:center; color:#666;">Report Generated: ' || CURRENT_TIMESTAMP() || '</p>' ||
-    '</body></html>';
-  
-  -- Generate filename with timestamp
-  file_name := 'CAMPAIGN_' || campaign_id || '_' || TO_CHAR(CURRENT_TIMESTAMP(), 'YYYY-MM-DD_HH_MI') || '.html';
-  
-  -- Create a file format for HTML content
-  EXECUTE IMMEDIATE '
-    CREATE OR REPLACE FILE FORMAT html_format
-    TYPE = ''CSV''
-    FIELD_DELIMITER = NONE
-    RECORD_DELIMITER = NONE
-    SKIP_HEADER = 0
-    FIELD_OPTIONALLY_ENCLOSED_BY = NONE
-    ESCAPE_UNENCLOSED_FIELD = NONE
-    COMPRESSION = NONE
-    ENCODING = ''UTF8''
-  ';
-  
-  -- Create temporary table to hold the HTML content
-  EXECUTE IMMEDIATE 'CREATE OR REPLACE TEMPORARY TABLE temp_report_' || campaign_id || ' (html_content VARCHAR(16777216))';
-  
-  -- Insert the HTML content
-  EXECUTE IMMEDIATE 'INSERT INTO temp_report_' || campaign_id || ' VALUES (?)' USING (report_html);
-  
-  -- Copy the file to the stage using the HTML file format
-  EXECUTE IMMEDIATE 
-    'COPY INTO @CAMPAIGN_REPORTS/' || file_name || 
-    ' FROM (SELECT html_content FROM temp_report_' || campaign_id || ') ' ||
-    'FILE_FORMAT = html_format ' ||
-    'SINGLE = TRUE OVERWRITE = TRUE HEADER = FALSE';
-  
-  -- Clean up temporary table
-  EXECUTE IMMEDIATE 'DROP TABLE temp_report_' || campaign_id;
-
-SELECT CURRENT_ORGANIZATION_NAME(), CURRENT_ACCOUNT_NAME() 
+  GROUP BY campaign_id
+) f ON c.campaign_id = f.campaign_id;
+
+-- Last report written per campaign, keyed by the data version it was built from
+CREATE TABLE IF NOT EXISTS CAMPAIGN_REPORT_CACHE (
+  campaign_id NUMBER,
+  data_version NUMBER,
+  file_name VARCHAR,
+  generated_at TIMESTAMP_LTZ
+);
+
+CREATE OR REPLACE PROCEDURE GENERATE_CAMPAIGN_REPORT_HTML(campaign_id NUMBER)
+RETURNS VARCHAR
+LANGUAGE SQL
+EXECUTE AS OWNER
+AS
+$$
+DECLARE
+  current_version NUMBER;
+  file_name VARCHAR;
+  staged_count NUMBER;
+  upload_result VARCHAR;
+  org_name VARCHAR;
+  account_name VARCHAR;
+BEGIN
+  CALL REFRESH_CAMPAIGN_DATA_VERSIONS();
+
+  SELECT MAX(v.data_version) INTO current_version
+  FROM CAMPAIGN_DATA_VERSIONS v
+  JOIN CAMPAIGNS c ON c.campaign_id = v.campaign_id
+  WHERE v.campaign_id = :campaign_id;
+
+  IF (current_version IS NULL) THEN
+    RETURN 'Campaign ' || campaign_id || ' not found';
+  END IF;
+
+  -- Reuse the last report if nothing about the campaign has changed since it was written
+  SELECT MAX(file_name) INTO file_name
+  FROM CAMPAIGN_REPORT_CACHE
+  WHERE campaign_id = :campaign_id AND data_version = :current_version;
+
+  -- Only reuse a report that is still on the stage; it may have been removed or the stage purged
+  IF (file_name IS NOT NULL) THEN
+    EXECUTE IMMEDIATE 'LIST @CAMPAIGN_REPORTS/' || file_name;
+    SELECT COUNT(*) INTO staged_count
+    FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))
+    WHERE ENDSWITH("name", '/' || :file_name);
+    IF (staged_count = 0) THEN
+      file_name := NULL;
+    END IF;
+  END IF;
+
+  IF (file_name IS NULL) THEN
+    file_name := 'CAMPAIGN_' || campaign_id || '_' || TO_CHAR(CURRENT_TIMESTAMP(), 'YYYY-MM-DD_HH_MI') || '.html';
+
+    EXECUTE IMMEDIATE
+      'COPY INTO @CAMPAIGN_REPORTS/' || file_name ||
+      ' FROM (SELECT report_html FROM CAMPAIGN_REPORT_SOURCE WHERE campaign_id = ' || campaign_id || ') ' ||
+      'FILE_FORMAT = (FORMAT_NAME = ''html_format'') ' ||
+      'SINGLE = TRUE OVERWRITE = TRUE HEADER = FALSE';
+
+    MERGE INTO CAMPAIGN_REPORT_CACHE t
+    USING (SELECT :campaign_id AS campaign_id, :current_version AS data_version, :file_name AS file_name) s
+    ON t.campaign_id = s.campaign_id
+    WHEN MATCHED THEN UPDATE SET data_version = s.data_version, file_name = s.file_name, generated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (campaign_id, data_version, file_name, generated_at)
+      VALUES (s.campaign_id, s.data_version, s.file_name, CURRENT_TIMESTAMP());
+  END IF;
+
+  SELECT CURRENT_ORGANIZATION_NAME(), CURRENT_ACCOUNT_NAME()
   INTO ORG_NAME, ACCOUNT_NAME;
-  
+
   upload_result := 'Report '|| file_name || ' generated and uploaded to stage. View here - https://app.snowflake.com/'|| ORG_NAME ||'/' || ACCOUNT_NAME ||'/#/data/databases/MARKETING_CAMPAIGNS_DB/schemas/AGENTS/stage/CAMPAIGN_REPORTS';
 
-  
   RETURN upload_result;
 END;
 $$;
 
+-- Batch variant: builds the campaigns without a current report on the stage, then records them in one cache MERGE
+CREATE OR REPLACE PROCEDURE GENERATE_CAMPAIGN_REPORTS_HTML(campaign_ids ARRAY)
+RETURNS VARIANT
+LANGUAGE SQL
+EXECUTE AS OWNER
+AS
+$$
+DECLARE
+  batch_prefix VARCHAR;
+  file_name VARCHAR;
+  cached_count NUMBER;
+  listing_id VARCHAR;
+  generated ARRAY DEFAULT ARRAY_CONSTRUCT();
+  reports VARIANT;
+BEGIN
+  CALL REFRESH_CAMPAIGN_DATA_VERSIONS();
+  batch_prefix := 'BATCH_' || TO_CHAR(CURRENT_TIMESTAMP(), 'YYYY-MM-DD_HH_MI_SS');
+
+  -- One listing of the stage; cache entries whose file is gone count as stale
+  EXECUTE IMMEDIATE 'LIST @CAMPAIGN_REPORTS';
+  SELECT LAST_QUERY_ID() INTO listing_id;
+
+  SELECT COUNT(*) INTO cached_count
+  FROM CAMPAIGN_DATA_VERSIONS v
+  JOIN CAMPAIGN_REPORT_CACHE k
+    ON k.campaign_id = v.campaign_id AND k.data_version = v.data_version
+  JOIN TABLE(RESULT_SCAN(:listing_id)) l ON ENDSWITH(l."name", '/' || k.file_name)
+  WHERE ARRAY_CONTAINS(v.campaign_id::VARIANT, :campaign_ids);
+
+  LET stale RESULTSET := (
+    WITH staged AS (
+      SELECT k.campaign_id, k.data_version
+      FROM CAMPAIGN_REPORT_CACHE k
+      JOIN TABLE(RESULT_SCAN(:listing_id)) l ON ENDSWITH(l."name", '/' || k.file_name)
+    )
+    SELECT v.campaign_id, v.data_version
+    FROM CAMPAIGN_DATA_VERSIONS v
+    JOIN CAMPAIGNS c ON c.campaign_id = v.campaign_id
+    LEFT JOIN staged k
+      ON k.campaign_id = v.campaign_id AND k.data_version = v.data_version
+    WHERE k.campaign_id IS NULL AND ARRAY_CONTAINS(v.campaign_id::VARIANT, :campaign_ids)
+  );
+  LET stale_cursor CURSOR FOR stale;
+
+  -- One single-file COPY per campaign, so the cache records each report's exact path. A partitioned COPY
+  -- would have to select campaign_id to partition on it, and that column would end up in the HTML file.
+  FOR campaign IN stale_cursor DO
+    file_name := batch_prefix || '/CAMPAIGN_' || campaign.campaign_id || '.html';
+    -- IDs come from CAMPAIGNS (NUMBER), so inlining them is safe
+    EXECUTE IMMEDIATE
+      'COPY INTO @CAMPAIGN_REPORTS/' || file_name ||
+      ' FROM (SELECT report_html FROM CAMPAIGN_REPORT_SOURCE WHERE campaign_id = ' || campaign.campaign_id || ') ' ||
+      'FILE_FORMAT = (FORMAT_NAME = ''html_format'') ' ||
+      'SINGLE = TRUE OVERWRITE = TRUE HEADER = FALSE';
+    generated := ARRAY_APPEND(generated, OBJECT_CONSTRUCT(
+      'campaign_id', campaign.campaign_id, 'data_version', campaign.data_version, 'file_name', file_name));
+  END FOR;
+
+  IF (ARRAY_SIZE(generated) > 0) THEN
+    MERGE INTO CAMPAIGN_REPORT_CACHE t
+    USING (
+      SELECT
+        value:campaign_id::NUMBER AS campaign_id,
+        value:data_version::NUMBER AS data_version,
+        value:file_name::VARCHAR AS file_name
+      FROM TABLE(FLATTEN(input => :generated))
+    ) s
+    ON t.campaign_id = s.campaign_id
+    WHEN MATCHED THEN UPDATE SET data_version = s.data_version, file_name = s.file_name, generated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (campaign_id, data_version, file_name, generated_at)
+      VALUES (s.campaign_id, s.data_version, s.file_name, CURRENT_TIMESTAMP());
+  END IF;
+
+  SELECT ARRAY_AGG(OBJECT_CONSTRUCT('campaign_id', campaign_id, 'file_name', file_name)) INTO reports
+  FROM CAMPAIGN_REPORT_CACHE
+  WHERE ARRAY_CONTAINS(campaign_id::VARIANT, :campaign_ids);
+
+  RETURN OBJECT_CONSTRUCT('generated', ARRAY_SIZE(generated), 'cached', cached_count, 'reports', reports);
+END;
+$$;
+
 -- Verify procedure was created
 
-SHOW PROCEDURES like 'GENERATE_CAMPAIGN_REPORT_HTML';
+SHOW PROCEDURES like 'GENERATE_CAMPAIGN_REPORT%';
 -- ====================================================================
 -- SECTION 9: TEST NEWLY CREATED SERVICES
 -- ====================================================================
@@ -497,6 +669,10 @@ SELECT PARSE_JSON(
 -- Test stored procedure
 CALL GENERATE_CAMPAIGN_REPORT_HTML(1);
 
+-- Second call is served from CAMPAIGN_REPORT_CACHE; the batch call only builds campaigns 2-5
+CALL GENERATE_CAMPAIGN_REPORT_HTML(1);
+CALL GENERATE_CAMPAIGN_REPORTS_HTML(ARRAY_CONSTRUCT(1, 2, 3, 4, 5));
+
 LS @CAMPAIGN_REPORTS;
 
 -- ====================================================================
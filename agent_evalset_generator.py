@@ -1,16 +1,46 @@
+from __future__ import annotations
+
+import importlib.util
+import sys
+import time
 import streamlit as st
-import pandas as pd
-from snowflake.connector.pandas_tools import write_pandas
-from snowflake.snowpark import Session
 import os
 from dotenv import load_dotenv
 from typing import Optional, Dict, List, Any
 import ast
+import hashlib
 import json
 import re
+import tempfile
+import threading
 import traceback
+import uuid
+from contextlib import contextmanager
+from itertools import islice
 from datetime import datetime
 
+def lazy_import(module_name: str):
+    """Import a module on first attribute access instead of at app start"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.find_spec(module_name)
+    if spec is None:
+        # Sibling modules are not on the path when the app is launched from another directory
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        spec = importlib.util.find_spec(module_name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {module_name!r}", name=module_name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+    return module
+
+# pandas and snowpark dominate cold start; load them only when a tab needs them
+pd = lazy_import("pandas")
+postprocessing = lazy_import("evalset_postprocessing")
+
 load_dotenv()
 
 if 'dataset' not in st.session_state:
@@ -27,17 +57,52 @@ if 'agent_schema_name' not in st.session_state:
     st.session_state.agent_schema_name = None
 if 'active_tab' not in st.session_state:
     st.session_state.active_tab = 0
+if 'record_index' not in st.session_state:
+    st.session_state.record_index = None
+if 'bulk_undo_stack' not in st.session_state:
+    st.session_state.bulk_undo_stack = []
+if 'connection_status' not in st.session_state:
+    st.session_state.connection_status = None
+if 'connection_user_info' not in st.session_state:
+    st.session_state.connection_user_info = None
+if 'dataset_spill' not in st.session_state:
+    st.session_state.dataset_spill = None
+if 'dataset_memory_bytes' not in st.session_state:
+    st.session_state.dataset_memory_bytes = 0
+if 'log_latency' not in st.session_state:
+    st.session_state.log_latency = None
+if 'validation_report' not in st.session_state:
+    st.session_state.validation_report = None
+if 'export_csv_version' not in st.session_state:
+    st.session_state.export_csv_version = None
+if 'eval_comparison' not in st.session_state:
+    st.session_state.eval_comparison = None
+if 'workspace_id' not in st.session_state:
+    # The workspace id lives in the URL, so a browser refresh or app restart finds the same autosave journal
+    workspace_id = st.query_params.get("workspace")
+    if not workspace_id or not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", workspace_id):
+        workspace_id = uuid.uuid4().hex
+        st.query_params["workspace"] = workspace_id
+    st.session_state.workspace_id = workspace_id
+if 'journal_seq' not in st.session_state:
+    st.session_state.journal_seq = 0
+if 'journal_ops_since_snapshot' not in st.session_state:
+    st.session_state.journal_ops_since_snapshot = 0
+if 'journal_writer' not in st.session_state:
+    st.session_state.journal_writer = uuid.uuid4().hex
+if 'agent_catalog_scope' not in st.session_state:
+    st.session_state.agent_catalog_scope = os.getenv("EVALSET_AGENT_SCOPE", "")
 
 @st.cache_resource
 def get_snowflake_connection():
     """Get or create Snowflake connection (cached)"""
+    from snowflake.snowpark import Session
+
     try:
+        # get_active_session raises when there is no active session, so no round trip is needed to verify it
         session = Session.get_active_session()
-        # Verify session is actually valid by checking if it has a connection
         if session is None:
             raise ValueError("Session is None")
-        # Test the session by running a simple query
-        session.sql("SELECT 1").collect()
         return session
     except Exception:
         try:
@@ -55,35 +120,275 @@ def get_snowflake_connection():
             st.error(f"❌ Connection failed: {e}")
             return None
 
-@st.cache_data(ttl=300)
-def get_agent_list(_session) -> List[str]:
-    """Get list of agents (cached for 5 minutes)"""
-    try:
-        # Use RESULT_SCAN to get reliable column names from SHOW command
-        _session.sql('SHOW AGENTS IN ACCOUNT').collect()
-        
-        agents_df = _session.sql('SELECT * FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))').to_pandas()
-
-        # Now we can reliably access columns - they should be properly named
-        # Column names are typically quoted: "name", "database_name", "schema_name"
-        agent_df = agents_df[["database_name", "schema_name", "name"]].copy()
-        agent_df['"fully_qualified_agent_name"'] = (
-            agent_df["database_name"] + "." + 
-            agent_df["schema_name"] + "." + 
-            agent_df["name"]
-        )
-        return agent_df
+def get_session():
+    """Return the Snowflake session, connecting on first use"""
+    session = get_snowflake_connection()
+    if session is None:
+        st.session_state.connection_status = 'failed'
+        return None
+    if st.session_state.connection_status != 'connected':
+        st.session_state.connection_status = 'connected'
+        try:
+            user_info = session.sql("SELECT CURRENT_USER(), CURRENT_ROLE(), CURRENT_WAREHOUSE()").collect()[0]
+            st.session_state.connection_user_info = f"User: {user_info[0]} | Role: {user_info[1]}"
+        except Exception:
+            st.session_state.connection_user_info = None
+    return session
+
+def render_connection_help() -> None:
+    """Explain how to configure the Snowflake connection"""
+    st.info("👈 Please connect to Snowflake using the sidebar")
+    
+    with st.expander("📝 Connection requirements"):
+        st.markdown("""
+        Required environment variables:
+        - `SNOWFLAKE_ACCOUNT` - Your Snowflake account identifier
+        - `SNOWFLAKE_USER` - Your Snowflake username
+        - `SNOWFLAKE_PASSWORD` - Your Snowflake password
         
-    except Exception as e:
-        st.error(f"Failed to load agents: {e}")
-        st.error(f"Error details: {traceback.format_exc()}")
-        return []
+        Optional environment variables (with defaults):
+        - `SNOWFLAKE_WAREHOUSE` (default: COMPUTE_WH)
+        - `SNOWFLAKE_DATABASE` (default: SNOWFLAKE)
+        - `SNOWFLAKE_SCHEMA` (default: LOCAL)
+        - `SNOWFLAKE_ROLE` (default: ACCOUNTADMIN)
+        """)
+
+AGENT_CATALOG_PATH = os.getenv(
+    "EVALSET_AGENT_CATALOG", os.path.join(tempfile.gettempdir(), "evalset_agent_catalog.json")
+)
+AGENT_CATALOG_TTL_SECONDS = int(os.getenv("EVALSET_AGENT_CATALOG_TTL", "300"))
+SCOPE_PATTERN = re.compile(r'^("[^"]+"|[A-Za-z_][A-Za-z0-9_$]*)(\.("[^"]+"|[A-Za-z_][A-Za-z0-9_$]*))?$')
+
+def parse_agent_scope(scope_text: str) -> List[str]:
+    """Split a comma-separated list of DATABASE or DATABASE.SCHEMA scopes; empty means the whole account"""
+    scopes = [scope.strip() for scope in (scope_text or "").split(",") if scope.strip()]
+    invalid = [scope for scope in scopes if not SCOPE_PATTERN.match(scope)]
+    if invalid:
+        raise ValueError(f"Invalid agent scope: {', '.join(invalid)}")
+    return scopes
+
+def _agent_catalog_key(scopes: List[str]) -> str:
+    return "|".join([os.getenv("SNOWFLAKE_ACCOUNT", ""), os.getenv("SNOWFLAKE_ROLE", ""), *sorted(scopes)])
+
+def fetch_agent_catalog(session, scopes: List[str]) -> Dict[str, Dict[str, str]]:
+    """Run SHOW AGENTS for each scope and return agents keyed by fully qualified name"""
+    statements = ["SHOW AGENTS IN ACCOUNT"] if not scopes else [
+        f"SHOW AGENTS IN {'SCHEMA' if '.' in scope else 'DATABASE'} {scope}" for scope in scopes
+    ]
+    catalog = {}
+    for statement in statements:
+        for row in session.sql(statement).collect():
+            agent = row.as_dict()
+            fq_name = f"{agent['database_name']}.{agent['schema_name']}.{agent['name']}"
+            catalog[fq_name] = {
+                "database_name": agent["database_name"],
+                "schema_name": agent["schema_name"],
+                "name": agent["name"],
+            }
+    return catalog
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """Hold an exclusive lock across sessions and processes while a shared file is read and rewritten"""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock on Windows
+        fcntl = None
+
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def _read_agent_catalogs() -> Dict[str, Any]:
+    try:
+        with open(AGENT_CATALOG_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_agent_catalog(key: str, catalog: Dict[str, Dict[str, str]]) -> None:
+    # Locked, so sessions refreshing different scopes don't drop each other's entries
+    with _file_lock(f"{AGENT_CATALOG_PATH}.lock"):
+        catalogs = _read_agent_catalogs()
+        catalogs[key] = {"fetched_at": time.time(), "agents": catalog}
+        # Write then rename, so readers in other sessions never see a partial file
+        tmp_path = f"{AGENT_CATALOG_PATH}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(catalogs, f)
+        os.replace(tmp_path, AGENT_CATALOG_PATH)
+
+@st.cache_resource
+def _agent_catalog_refreshes() -> Dict[str, Any]:
+    """Background refreshes in flight and the last failure per scope, shared by all sessions of this process"""
+    return {"lock": threading.Lock(), "running": set(), "errors": {}}
+
+def _refresh_agent_catalog_in_background(session, scopes: List[str], key: str) -> None:
+    refreshes = _agent_catalog_refreshes()
+    with refreshes["lock"]:
+        if key in refreshes["running"]:
+            return
+        refreshes["running"].add(key)
+
+    def refresh():
+        try:
+            _write_agent_catalog(key, fetch_agent_catalog(session, scopes))
+            refreshes["errors"].pop(key, None)
+        except Exception as e:
+            # Streamlit calls don't render from this thread; get_agent_catalog shows it on the next read
+            refreshes["errors"][key] = e
+        finally:
+            with refreshes["lock"]:
+                refreshes["running"].discard(key)
+
+    threading.Thread(target=refresh, daemon=True, name="agent-catalog-refresh").start()
+
+def get_agent_catalog(session, scopes: List[str], force_refresh: bool = False) -> tuple[Dict[str, Dict[str, str]], float]:
+    """Agents keyed by fully qualified name, and when they were fetched.
+
+    Served from the local catalog file; a stale catalog is returned immediately and refreshed in
+    the background, so only the very first load for a scope waits on SHOW AGENTS."""
+    key = _agent_catalog_key(scopes)
+    entry = _read_agent_catalogs().get(key)
+    if entry is None or force_refresh:
+        catalog = fetch_agent_catalog(session, scopes)
+        _write_agent_catalog(key, catalog)
+        return catalog, time.time()
+    if time.time() - entry["fetched_at"] > AGENT_CATALOG_TTL_SECONDS:
+        error = _agent_catalog_refreshes()["errors"].get(key)
+        if error is not None:
+            st.warning(f"⚠️ Could not refresh the agent list, showing the cached one: {error}")
+        _refresh_agent_catalog_in_background(session, scopes, key)
+    return entry["agents"], entry["fetched_at"]
+
+# Span types for the latency breakdown, classified from the span name (RECORD:"name")
+SPAN_TYPES = ["planning", "cortex_analyst", "sql_execution", "cortex_search", "custom_tool"]
+SPAN_TYPE_SQL = """CASE
+        WHEN RECORD:"name" IN ('SqlExecution', 'SqlExecution_CortexAnalyst') THEN 'sql_execution'
+        WHEN STARTSWITH(RECORD:"name"::VARCHAR, 'CortexAnalystTool_') THEN 'cortex_analyst'
+        WHEN STARTSWITH(RECORD:"name"::VARCHAR, 'CortexSearchService_') THEN 'cortex_search'
+        WHEN STARTSWITH(RECORD:"name"::VARCHAR, 'ToolCall-') THEN 'custom_tool'
+        WHEN RECORD_ATTRIBUTES:"snow.ai.observability.agent.planning.model" IS NOT NULL THEN 'planning'
+        ELSE NULL
+        END"""
+USER_FEEDBACK_SQL = """CASE
+        WHEN VALUE:"positive"='true' THEN 1
+        WHEN VALUE:"positive"='false'THEN 0
+        ELSE NULL
+        END"""
+# Condition on a record's MIN(USER_FEEDBACK) for each feedback filter
+FEEDBACK_FILTERS = {
+    'Positive Feedback Only': "= 1",
+    'Negative Feedback Only': "= 0",
+    'Any Feedback': "IS NOT NULL",
+}
+LATENCY_GROUPINGS = {
+    "Tool": ["SPAN_TYPE", "TOOL_NAME"],
+    "Reasoning model": ["REASONING_MODEL", "SPAN_TYPE"],
+}
+
+def build_history_columns(history_turns: int) -> str:
+    """TURN and CONVERSATION_HISTORY (the previous history_turns turns of the thread, oldest first) from LAG windows"""
+    # Records logged without a thread are their own single-turn thread
+    window = "PARTITION BY COALESCE(THREAD_ID, RECORD_ID) ORDER BY START_TS, RECORD_ID"
+    turns = ",\n            ".join(
+        f"""IFF(LAG(RECORD_ID, {lag}) OVER ({window}) IS NULL, NULL, OBJECT_CONSTRUCT(
+                'input', LAG(INPUT_QUERY, {lag}) OVER ({window}),
+                'output', LAG(AGENT_RESPONSE, {lag}) OVER ({window})))"""
+        for lag in range(history_turns, 0, -1)
+    )
+    return f"""ROW_NUMBER() OVER ({window}) AS TURN,
+        ARRAY_CONSTRUCT_COMPACT(
+            {turns}
+        ) AS CONVERSATION_HISTORY"""
 
-def build_query(agent_name: str, agent_db_name: str, agent_schema_name: str, record_id: Optional[str] = None, user_feedback: Optional[str] = None) -> str:
-    """Build the query with optional filters for AGENT_NAME and THREAD_ID"""
+def build_query(agent_name: str, agent_db_name: str, agent_schema_name: str, record_id: Optional[str] = None, user_feedback: Optional[str] = None,
+                feedback_pushdown: bool = True, history_turns: int = 0) -> str:
+    """Build the query with optional filters for RECORD_ID and user feedback.
+
+    GET_AI_OBSERVABILITY_EVENTS is read once, in the ALL_EVENTS CTE. A table function cannot be pruned, so that read
+    covers every event of the agent whatever the filters.
+    With feedback_pushdown, the records matching the feedback filter are found from the feedback events alone and
+    semi-joined into EVENTS, so only their events are projected, sorted and aggregated; otherwise the filter is a
+    HAVING on the aggregate (kept for plan comparison).
+    With history_turns, each record also carries up to that many previous turns of its thread; only threads holding
+    a matching record are kept, and the record and feedback filters then select which turns are returned."""
     
-    base_query = f"""
-WITH RESULTS AS (SELECT 
+    record_id_sql = 'RECORD_ATTRIBUTES:"ai.observability.record_id"'
+    thread_id_sql = 'RECORD_ATTRIBUTES:"snow.ai.observability.agent.thread_id"'
+    record_filter = f"""{record_id_sql} = '{record_id.replace("'", "''")}'""" if record_id else None
+
+    feedback_condition = FEEDBACK_FILTERS.get(user_feedback)
+    pushdown = feedback_pushdown and feedback_condition is not None
+    events_source = f"""TABLE(SNOWFLAKE.LOCAL.GET_AI_OBSERVABILITY_EVENTS(
+    '{agent_db_name}', 
+    '{agent_schema_name}', 
+    '{agent_name}', 
+    'CORTEX AGENT'))"""
+
+    if history_turns and (record_filter or pushdown):
+        # Keep every event of the threads that contain a matching record; a record's thread id is on some of its events
+        matched_filters = [record_filter] if record_filter else []
+        if pushdown:
+            matched_filters.append(f"({USER_FEEDBACK_SQL} IS NOT NULL OR {thread_id_sql} IS NOT NULL)")
+        base_query = f"""
+WITH ALL_EVENTS AS (SELECT *
+    FROM {events_source}),
+
+MATCHED_RECORDS AS (SELECT 
+    {record_id_sql} AS RECORD_ID,
+    MAX({thread_id_sql}) AS THREAD_ID
+    FROM ALL_EVENTS
+    WHERE {" AND ".join(matched_filters)}
+    GROUP BY RECORD_ID"""
+        if pushdown:
+            base_query += f"""
+    HAVING MIN({USER_FEEDBACK_SQL}) {feedback_condition}"""
+        base_query += f"""),
+
+THREAD_RECORDS AS (SELECT DISTINCT {record_id_sql} AS RECORD_ID
+    FROM ALL_EVENTS
+    WHERE {thread_id_sql} IN (SELECT THREAD_ID FROM MATCHED_RECORDS)
+    UNION
+    SELECT RECORD_ID FROM MATCHED_RECORDS),
+
+EVENTS AS (SELECT *
+    FROM ALL_EVENTS
+    WHERE {record_id_sql} IN (SELECT RECORD_ID FROM THREAD_RECORDS)),
+"""
+    elif pushdown:
+        # A record's feedback is the MIN over its feedback events, as USER_FEEDBACKS is after aggregation
+        base_query = f"""
+WITH ALL_EVENTS AS (SELECT *
+    FROM {events_source}"""
+        if record_filter:
+            base_query += f"""
+    WHERE {record_filter}"""
+        base_query += f"""),
+
+FEEDBACK_RECORDS AS (SELECT 
+    {record_id_sql} AS RECORD_ID
+    FROM ALL_EVENTS
+    WHERE {USER_FEEDBACK_SQL} IS NOT NULL
+    GROUP BY RECORD_ID
+    HAVING MIN({USER_FEEDBACK_SQL}) {feedback_condition}),
+
+EVENTS AS (SELECT *
+    FROM ALL_EVENTS
+    WHERE {record_id_sql} IN (SELECT RECORD_ID FROM FEEDBACK_RECORDS)),
+"""
+    else:
+        base_query = f"""
+WITH EVENTS AS (SELECT *
+    FROM {events_source}"""
+        if record_filter:
+            base_query += f"""
+    WHERE {record_filter}"""
+        base_query += "),\n"
+
+    base_query += f"""
+RESULTS AS (SELECT 
     TIMESTAMP AS TS,
     RECORD_ATTRIBUTES:"snow.ai.observability.object.name" AS AGENT_NAME,
     RECORD_ATTRIBUTES:"ai.observability.record_id" AS RECORD_ID, 
@@ -124,173 +429,327 @@ WITH RESULTS AS (SELECT
         ELSE NULL
         END AS TOOL_ARRAY,
 
-    CASE
-        WHEN VALUE:"positive"='true' THEN 1
-        WHEN VALUE:"positive"='false'THEN 0
-        ELSE NULL
-        END AS USER_FEEDBACK,
+    {USER_FEEDBACK_SQL} AS USER_FEEDBACK,
     VALUE:"feedback_message" AS USER_FEEDBACK_MESSAGE,
-    RECORD:"name" as OPERATION
-    
-    FROM TABLE(SNOWFLAKE.LOCAL.GET_AI_OBSERVABILITY_EVENTS(
-    '{agent_db_name}', 
-    '{agent_schema_name}', 
-    '{agent_name}', 
-    'CORTEX AGENT'))"""
+    RECORD:"name" as OPERATION,
+
+    START_TIMESTAMP AS SPAN_START_TS,
+    {SPAN_TYPE_SQL} AS SPAN_TYPE,
+    DATEDIFF(MILLISECOND, START_TIMESTAMP, TIMESTAMP) AS SPAN_MS
     
-    filters = []
-    if record_id:
-        filters.append(f"AND RECORD_ID = '{record_id}'")
+    FROM EVENTS"""
     
-    query = base_query + " " + " ".join(filters)
+    span_columns = ",\n        ".join(
+        f"SUM(IFF(SPAN_TYPE = '{span_type}', SPAN_MS, 0)) AS {span_type.upper()}_MS" for span_type in SPAN_TYPES
+    )
+
+    query = base_query
     query += """
-    ORDER BY THREAD_ID, TS, START_TIMESTAMP ASC)
+    ORDER BY THREAD_ID, TS, START_TIMESTAMP ASC)"""
+    if history_turns:
+        query += """,
 
+RECORDS AS ("""
+    else:
+        query += "\n"
+    query += f"""
     SELECT 
         RECORD_ID,
         MIN(TS) AS START_TS,
         MAX(TS) AS END_TS,
-        DATEDIFF(SECOND, START_TS, END_TS)::FLOAT AS LATENCY, 
+        DATEDIFF(MILLISECOND, MIN(SPAN_START_TS), END_TS) / 1000 AS LATENCY, 
+        DATEDIFF(MILLISECOND, MIN(SPAN_START_TS), END_TS) AS LATENCY_MS,
+        {span_columns},
+        MIN(REASONING_MODEL) AS REASONING_MODEL,
         MIN(AGENT_NAME) AS AGENT_NAME,
         MIN(INPUT_QUERY) AS INPUT_QUERY,
         MIN(AGENT_RESPONSE) AS AGENT_RESPONSE,
         MIN(AGENT_PLANNING) AS AGENT_PLANNING,
         ARRAY_AGG(TOOL_ARRAY) WITHIN GROUP (ORDER BY TS ASC) AS TOOL_ARRAY,
         MIN(USER_FEEDBACK) AS USER_FEEDBACKS,
-        MIN(USER_FEEDBACK_MESSAGE) AS USER_FEEDBACK_MESSAGES
+        MIN(USER_FEEDBACK_MESSAGE) AS USER_FEEDBACK_MESSAGES,
+        MIN(THREAD_ID) AS THREAD_ID
     
         FROM RESULTS    
         GROUP BY RECORD_ID"""
     
-    if user_feedback == 'Positive Feedback Only':
-        query += " HAVING USER_FEEDBACKS = 1"
-    elif user_feedback == 'Negative Feedback Only':
-        query += " HAVING USER_FEEDBACKS = 0"
-    elif user_feedback == 'Any Feedback':
-        query += " HAVING USER_FEEDBACKS IS NOT NULL"
+    if feedback_condition is not None and not pushdown and not history_turns:
+        query += f" HAVING USER_FEEDBACKS {feedback_condition}"
+
+    if history_turns:
+        # Histories come from every turn of the matched threads; the filters only pick the turns returned
+        turn_filters = []
+        if record_filter:
+            turn_filters.append(f"""RECORD_ID = '{record_id.replace("'", "''")}'""")
+        if feedback_condition is not None:
+            turn_filters.append(f"USER_FEEDBACKS {feedback_condition}")
+        query += f"""),
+
+THREADS AS (SELECT *,
+        {build_history_columns(history_turns)}
+    FROM RECORDS)
+
+    SELECT * FROM THREADS"""
+        if turn_filters:
+            query += "\n    WHERE " + " AND ".join(turn_filters)
     
     query += " ORDER BY START_TS DESC;"
     return query
 
-def add_tool_sequence(tool_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    new_order = ['tool_sequence', 'tool_name', 'tool_output']
-    drop_list = ['SqlExecution', 'SqlExecution_CortexAnalyst', 'CortexChartToolImpl-data_to_chart']
+def explain_query(_session, query: str) -> pd.DataFrame:
+    """Compile a query without running it and return its tabular plan"""
+    return _session.sql(f"EXPLAIN USING TABULAR {query.strip().rstrip(';')}").to_pandas()
 
-    # 1. Remove unwanted tools
-    filtered_tools = [
-        tool
-        for tool in tool_list
-        if tool.get('tool_name') not in drop_list
-    ]
+def summarize_plan(plan: pd.DataFrame) -> Dict[str, Any]:
+    """Totals of the scan estimates in an EXPLAIN plan"""
+    columns = {column.strip('"').lower(): column for column in plan.columns}
+    summary = {'operations': len(plan)}
+    for name in ['partitionsTotal', 'partitionsAssigned', 'bytesAssigned']:
+        column = columns.get(name.lower())
+        # Table functions such as GET_AI_OBSERVABILITY_EVENTS report no partition stats; None means unknown, not 0
+        values = pd.to_numeric(plan[column], errors='coerce') if column else None
+        summary[name] = int(values.sum()) if values is not None and values.notna().any() else None
+    return summary
+
+def build_latency_query(agent_name: str, agent_db_name: str, agent_schema_name: str, group_by: str = "Tool") -> str:
+    """Build a server-side p50/p95/p99 span latency summary (ms) grouped by tool or reasoning model"""
+    group_columns = ", ".join(LATENCY_GROUPINGS[group_by])
+    return f"""
+WITH SPANS AS (SELECT 
+    RECORD_ATTRIBUTES:"ai.observability.record_id"::VARCHAR AS RECORD_ID,
+    RECORD:"name"::VARCHAR AS SPAN_NAME,
+    RECORD_ATTRIBUTES:"snow.ai.observability.agent.planning.model"::VARCHAR AS SPAN_MODEL,
+    {SPAN_TYPE_SQL} AS SPAN_TYPE,
+    START_TIMESTAMP,
+    TIMESTAMP
+    FROM TABLE(SNOWFLAKE.LOCAL.GET_AI_OBSERVABILITY_EVENTS(
+    '{agent_db_name}', 
+    '{agent_schema_name}', 
+    '{agent_name}', 
+    'CORTEX AGENT'))
+    WHERE RECORD_TYPE = 'SPAN'),
 
-    # 2. Add sequence and reorder keys
-    updated_tools = []
-    for idx, tool in enumerate(filtered_tools):
-        tool_name = tool['tool_name']
-        if tool_name.startswith('CortexAnalystTool_'):
-            tool_name = tool_name.replace('CortexAnalystTool_', '', 1)
+RECORD_SPANS AS (SELECT 
+    RECORD_ID,
+    SPAN_TYPE,
+    CASE
+        WHEN SPAN_TYPE IN ('cortex_analyst', 'cortex_search', 'custom_tool')
+        THEN REGEXP_REPLACE(SPAN_NAME, '^(CortexAnalystTool_|CortexSearchService_|ToolCall-)', '')
+        ELSE SPAN_TYPE
+        END AS TOOL_NAME,
+    -- The model is only set on planning spans; attribute it to every span of the record
+    COALESCE(MAX(SPAN_MODEL) OVER (PARTITION BY RECORD_ID), 'unknown') AS REASONING_MODEL,
+    START_TIMESTAMP,
+    TIMESTAMP,
+    DATEDIFF(MILLISECOND, START_TIMESTAMP, TIMESTAMP) AS SPAN_MS
+    FROM SPANS),
 
-        elif tool_name.startswith('CortexSearchService_'):
-            tool_name = 'cortex_search'
+LATENCIES AS (
+    SELECT RECORD_ID, SPAN_TYPE, TOOL_NAME, REASONING_MODEL, SPAN_MS
+    FROM RECORD_SPANS
+    WHERE SPAN_TYPE IS NOT NULL
+    UNION ALL
+    SELECT RECORD_ID, 'record_total', 'record_total', MIN(REASONING_MODEL),
+        DATEDIFF(MILLISECOND, MIN(START_TIMESTAMP), MAX(TIMESTAMP))
+    FROM RECORD_SPANS
+    GROUP BY RECORD_ID)
 
-        elif tool_name.startswith('ToolCall-'):
-            tool_name = tool_name.replace('ToolCall-', '', 1)
+SELECT 
+    {group_columns},
+    COUNT(*) AS SPANS,
+    COUNT(DISTINCT RECORD_ID) AS RECORDS,
+    PERCENTILE_CONT(0.50) WITHIN GROUP (ORDER BY SPAN_MS) AS P50_MS,
+    PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY SPAN_MS) AS P95_MS,
+    PERCENTILE_CONT(0.99) WITHIN GROUP (ORDER BY SPAN_MS) AS P99_MS,
+    MAX(SPAN_MS) AS MAX_MS
+    FROM LATENCIES
+    GROUP BY {group_columns}
+    ORDER BY P95_MS DESC;"""
 
-        updated_tool = {
-            **tool,
-            "tool_sequence": idx + 1,
-            "tool_name": tool_name
-        }
+@st.cache_data(ttl=600)
+def get_latency_summary(_session, query: str) -> pd.DataFrame:
+    """Run a latency percentile query (cached for 10 minutes)"""
+    return _session.sql(query).to_pandas()
 
+# Votes per run when picking the consensus tool sequence for a repeated query
+CONSENSUS_FEEDBACK_WEIGHTS = {"positive": 3.0, "none": 1.0, "negative": 0.25}
 
-        # Reorder output keys
-        reordered_tool = {k: updated_tool[k] for k in new_order if k in updated_tool}
+def select_consensus_records(df: pd.DataFrame) -> pd.DataFrame:
+    """Collapse repeated runs of the same (AGENT_NAME, INPUT_QUERY) into one consensus record.
 
-        updated_tools.append(reordered_tool)
+    Runs are grouped by a hash of the query and of their tool-name sequence. The sequence with the
+    most feedback-weighted votes wins, and its best run (positive feedback first, then most recent)
+    becomes the ground truth. Only hash group-bys and joins are used, so the cost is linear in runs."""
+    if df.empty:
+        return df.assign(RUN_COUNT=[], DISTINCT_SEQUENCES=[], CONSENSUS_SUPPORT=[],
+                         POSITIVE_FEEDBACKS=[], NEGATIVE_FEEDBACKS=[])
 
-    # 3. Define return var and return it
-    final_tool_list = updated_tools
-    return final_tool_list
+    feedback = pd.to_numeric(df['USER_FEEDBACKS'], errors='coerce')
+    runs = pd.DataFrame({
+        # In thread mode the same question asked after different turns is a different query
+        'QUERY_HASH': pd.util.hash_pandas_object(
+            df[['AGENT_NAME', 'INPUT_QUERY', *(['CONVERSATION_HISTORY'] if 'CONVERSATION_HISTORY' in df else [])]],
+            index=False
+        ).to_numpy(),
+        'SEQUENCE_HASH': pd.util.hash_array(
+            df['TOOL_SIGNATURE'].to_numpy() if 'TOOL_SIGNATURE' in df
+            else pd.Series([">".join(tool['tool_name'] for tool in tools) for tools in df['TOOL_CALLING']]).to_numpy()
+        ),
+        'POSITIVE': (feedback == 1).to_numpy(),
+        'NEGATIVE': (feedback == 0).to_numpy(),
+    })
+    runs['VOTES'] = CONSENSUS_FEEDBACK_WEIGHTS["none"]
+    runs.loc[runs['POSITIVE'], 'VOTES'] = CONSENSUS_FEEDBACK_WEIGHTS["positive"]
+    runs.loc[runs['NEGATIVE'], 'VOTES'] = CONSENSUS_FEEDBACK_WEIGHTS["negative"]
+
+    sequences = runs.groupby(['QUERY_HASH', 'SEQUENCE_HASH'], sort=False).agg(
+        SEQUENCE_VOTES=('VOTES', 'sum'), SEQUENCE_RUNS=('VOTES', 'size')
+    ).reset_index()
+    # Ties go to the sequence seen first; logs arrive newest first
+    winners = sequences.loc[sequences.groupby('QUERY_HASH', sort=False)['SEQUENCE_VOTES'].idxmax()]
+
+    queries = runs.groupby('QUERY_HASH', sort=False).agg(
+        RUN_COUNT=('VOTES', 'size'), POSITIVE_FEEDBACKS=('POSITIVE', 'sum'), NEGATIVE_FEEDBACKS=('NEGATIVE', 'sum')
+    )
+    queries['DISTINCT_SEQUENCES'] = sequences.groupby('QUERY_HASH', sort=False).size()
+    queries['CONSENSUS_SUPPORT'] = winners.set_index('QUERY_HASH')['SEQUENCE_RUNS'] / queries['RUN_COUNT']
+
+    # Best run of the winning sequence: positive feedback first, then the most recent
+    runs['ROW'] = range(len(runs))
+    candidates = runs.merge(winners[['QUERY_HASH', 'SEQUENCE_HASH']], on=['QUERY_HASH', 'SEQUENCE_HASH'])
+    chosen = candidates.loc[candidates.groupby('QUERY_HASH', sort=False)['POSITIVE'].idxmax()]
+    chosen = chosen.sort_values('ROW')
+
+    result = df.iloc[chosen['ROW'].to_numpy()].copy()
+    stats = queries.loc[chosen['QUERY_HASH'].to_numpy()]
+    for column in CONSENSUS_COLUMNS:
+        result[column] = stats[column].to_numpy()
+    return result
+
+# Process-pool postprocessing is opt-in; below PARALLEL_MIN_ROWS pool startup costs more than it saves
+POSTPROCESS_WORKERS = int(os.getenv("EVALSET_POSTPROCESS_WORKERS", "0"))
+PARALLEL_MIN_ROWS = 50000
+
+# Agreement stats select_consensus_records adds to each record; they stay on the record in the dataset
+CONSENSUS_COLUMNS = ['RUN_COUNT', 'DISTINCT_SEQUENCES', 'CONSENSUS_SUPPORT', 'POSITIVE_FEEDBACKS', 'NEGATIVE_FEEDBACKS']
+
+FINAL_COLUMNS = ['RECORD_ID', 'START_TS', 'AGENT_NAME',
+                 'INPUT_QUERY', 'AGENT_RESPONSE', 'TOOL_CALLING', 'EXPECTED_TOOLS',
+                 'LATENCY', 'LATENCY_MS', *[f'{span_type.upper()}_MS' for span_type in SPAN_TYPES], 'REASONING_MODEL',
+                 'USER_FEEDBACKS', 'USER_FEEDBACK_MESSAGES', *CONSENSUS_COLUMNS]
+
+THREAD_COLUMNS = ['THREAD_ID', 'TURN', 'CONVERSATION_HISTORY']
+MAX_HISTORY_TURNS = 10
+
+def _final_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """FINAL_COLUMNS, plus the thread columns when the logs were queried with conversation history"""
+    if 'CONVERSATION_HISTORY' not in df:
+        return df[FINAL_COLUMNS]
+    df['CONVERSATION_HISTORY'] = df['CONVERSATION_HISTORY'].map(postprocessing.parse_conversation_history)
+    return df[FINAL_COLUMNS + THREAD_COLUMNS]
+
+def fetch_arrow(_session, query: str):
+    """Run a query through the connector and return the result as one Arrow table, batch by batch.
+
+    A connector without Arrow result support is read through Snowpark's pandas fetch instead."""
+    import pyarrow as pa
 
-@st.cache_data(ttl=600)
-def execute_query_and_postprocess(_session, query: str) -> pd.DataFrame:
-    """Execute query and return results as pandas DataFrame (cached for 10 minutes)
-        Perform some operations in pandas to clean up data."""
     try:
-        data = _session.sql(query)
-        df = data.to_pandas()
-
-        def clean_text(s):
-            """
-            Normalize a text cell:
-            - If it looks like a Python/JSON quoted literal, try ast.literal_eval to unescape safely.
-            - Otherwise try a unicode_escape decode as a fallback.
-            - Remove matching surrounding quotes (single or double), repeating a few times to handle nested quoting.
-            - Remove any leftover backslashes, collapse whitespace, strip.
-            """
-            if pd.isna(s):
-                return s
-        
-            s = str(s).strip()
-        
-            # Try to safely unescape if it looks like a quoted literal.
-            # Using ast.literal_eval is safest when strings are like: '"abc"', "'abc'", r'\"abc\"'
-            try:
-                # Only try literal_eval for strings that start with a quote or an escape-quote (cheap heuristic)
-                if s.startswith('"') or s.startswith("'") or s.startswith(r'\"') or s.startswith(r"\'"):
-                    s_eval = ast.literal_eval(s)
-                    # If literal_eval returns a non-str (rare), convert to str
-                    s = s_eval if isinstance(s_eval, str) else str(s_eval)
-                else:
-                    # fallback: unescape typical escape sequences like \n, \t, \" etc.
-                    # This will turn r'\"abc\"' -> '"abc"'
-                    try:
-                        s = bytes(s, "utf-8").decode("unicode_escape")
-                    except Exception:
-                        pass
-            except Exception:
-                # If literal_eval fails, try unicode escaping fallback, but don't raise.
-                try:
-                    s = bytes(s, "utf-8").decode("unicode_escape")
-                except Exception:
-                    pass
-        
-            # Remove matching surrounding quotes repeatedly (handles nested quoting)
-            for _ in range(3):  # loop a few times in case of multiple nested levels
-                if len(s) >= 2 and ((s[0] == '"' and s[-1] == '"') or (s[0] == "'" and s[-1] == "'")):
-                    s = s[1:-1]
-                else:
-                    break
-        
-            # Remove leftover backslashes that are likely artifacts
-            s = s.replace('\\', '')
-        
-            # Collapse whitespace and trim
-            s = re.sub(r'\s+', ' ', s).strip()
-        
-            return s
+        cursor = _session.connection.cursor()
+        try:
+            cursor.execute(query)
+            batches = [batch for batch in cursor.fetch_arrow_batches() if batch.num_rows]
+            column_names = [column[0] for column in cursor.description]
+        finally:
+            cursor.close()
+    except (ImportError, AttributeError, NotImplementedError):
+        return pa.Table.from_pandas(_session.sql(query).to_pandas(), preserve_index=False)
+    if not batches:
+        # An empty result has no batches to take the schema from; the query is not run again
+        return pa.table({name: pa.array([], pa.string()) for name in column_names})
+    return pa.Table.from_batches(batches)
 
-        #Clean up text
-        df['INPUT_QUERY'] = df['INPUT_QUERY'].apply(clean_text)
-        df['AGENT_RESPONSE'] = df['AGENT_RESPONSE'].apply(clean_text)
+def postprocess_arrow(table) -> pd.DataFrame:
+    """Arrow path of execute_query_and_postprocess; only the consensus rows' tools become Python objects"""
+    import pyarrow as pa
 
-        #Drop Duplicates
-        df.drop_duplicates(subset=['AGENT_NAME', 'INPUT_QUERY'], inplace=True)
-        
-        #Drop any NA records
-        df = df[df['INPUT_QUERY'].notna()]
-        
-        #Create tool selection sequence
-        df['TOOL_CALLING'] = df['TOOL_ARRAY'].apply(lambda x: add_tool_sequence(ast.literal_eval(x)))
-        df['EXPECTED_TOOLS'] = df.apply(lambda x: {
-            'ground_truth_invocations': x['TOOL_CALLING'], 
-            'ground_truth_output': x['AGENT_RESPONSE']
-        }, axis=1)
-        final_df = df[['RECORD_ID', 'START_TS', 'AGENT_NAME',
-              'INPUT_QUERY', 'AGENT_RESPONSE', 'TOOL_CALLING','EXPECTED_TOOLS', 
-               'LATENCY','USER_FEEDBACKS', 'USER_FEEDBACK_MESSAGES']]
-
-        return final_df
+    tools, signatures = postprocessing.sequence_tool_arrays(postprocessing.parse_tool_arrays(table['TOOL_ARRAY']))
+    df = table.drop_columns(['TOOL_ARRAY']).to_pandas()
+    df['INPUT_QUERY'] = df['INPUT_QUERY'].map(postprocessing.clean_text)
+    df['AGENT_RESPONSE'] = df['AGENT_RESPONSE'].map(postprocessing.clean_text)
+    df['TOOL_SIGNATURE'] = signatures.to_numpy(zero_copy_only=False)
+    df['TOOL_POSITION'] = range(len(df))
+    df = df[df['INPUT_QUERY'].notna()]
+
+    df = select_consensus_records(df)
+    chosen = tools.take(pa.array(df['TOOL_POSITION'].to_numpy(), pa.int64()))
+    expected = pa.StructArray.from_arrays(
+        # From an object array: an empty Arrow-backed Series would convert to a ChunkedArray
+        [chosen, pa.array(df['AGENT_RESPONSE'].to_numpy(dtype=object), pa.string(), from_pandas=True)],
+        names=['ground_truth_invocations', 'ground_truth_output'],
+    )
+    expected_tools = expected.to_pylist()
+    for record in expected_tools:
+        postprocessing.strip_missing_outputs(record['ground_truth_invocations'])
+    df['TOOL_CALLING'] = [record['ground_truth_invocations'] for record in expected_tools]
+    df['EXPECTED_TOOLS'] = expected_tools
+    return _final_columns(df)
+
+def postprocess_parallel(table, workers: int) -> pd.DataFrame:
+    """Sharded path of execute_query_and_postprocess: shards are cleaned and sequenced in a process pool,
+    then consensus runs here and only the consensus rows' tools are decoded"""
+    import pyarrow as pa
+
+    processed = postprocessing.postprocess_shards(table, workers)
+    df = table.drop_columns(postprocessing.SHARD_COLUMNS).to_pandas()
+    for column in ['INPUT_QUERY', 'AGENT_RESPONSE', 'TOOL_SIGNATURE']:
+        df[column] = processed[column].to_numpy(zero_copy_only=False)
+    df['TOOL_POSITION'] = range(len(df))
+    df = df[df['INPUT_QUERY'].notna()]
+
+    df = select_consensus_records(df)
+    chosen = processed.take(pa.array(df['TOOL_POSITION'].to_numpy(), pa.int64()))
+    df['TOOL_CALLING'] = postprocessing.decode_tool_calling(chosen)
+    df['EXPECTED_TOOLS'] = [
+        {'ground_truth_invocations': tools, 'ground_truth_output': response}
+        for tools, response in zip(df['TOOL_CALLING'], df['AGENT_RESPONSE'])
+    ]
+    return _final_columns(df)
+
+def postprocess_pandas(df: pd.DataFrame) -> pd.DataFrame:
+    """Row-wise path of execute_query_and_postprocess, used when the Arrow path is unavailable"""
+    #Clean up text
+    df['INPUT_QUERY'] = df['INPUT_QUERY'].apply(postprocessing.clean_text)
+    df['AGENT_RESPONSE'] = df['AGENT_RESPONSE'].apply(postprocessing.clean_text)
+
+    #Drop any NA records
+    df = df[df['INPUT_QUERY'].notna()]
+
+    #Create tool selection sequence
+    df['TOOL_CALLING'] = df['TOOL_ARRAY'].apply(lambda x: postprocessing.add_tool_sequence(ast.literal_eval(x)))
+
+    #Collapse repeated queries into a consensus record
+    df = select_consensus_records(df)
+    df['EXPECTED_TOOLS'] = [
+        {'ground_truth_invocations': tools, 'ground_truth_output': response}
+        for tools, response in zip(df['TOOL_CALLING'], df['AGENT_RESPONSE'])
+    ]
+    return _final_columns(df)
+
+@st.cache_data(ttl=600)
+def execute_query_and_postprocess(_session, query: str, workers: int = 0) -> pd.DataFrame:
+    """Execute query and return results as pandas DataFrame (cached for 10 minutes)
+        Fetches Arrow batches and builds the tool columns with Arrow kernels, falling back to pandas.
+        With workers > 1, large pulls are postprocessed in shards across a process pool."""
+    try:
+        table = fetch_arrow(_session, query)
+        try:
+            if workers > 1 and table.num_rows >= PARALLEL_MIN_ROWS:
+                return postprocess_parallel(table, workers)
+            return postprocess_arrow(table)
+        except postprocessing.ToolSchemaError:
+            # Tool outputs that are not plain strings don't fit the struct schema; reuse the fetched rows
+            return postprocess_pandas(table.to_pandas())
     except Exception as e:
         st.error(f"Query execution failed: {e}")
         raise
@@ -324,49 +783,251 @@ def write_to_table(session, df: pd.DataFrame, table_name: str, overwrite: bool =
         st.error(f"Failed to write to table: {e}")
         return False
 
-def validate_table_schema(session, table_name: str) -> tuple[bool, str]:
-    """Validate that table has required schema (INPUT_QUERY, EXPECTED_TOOLS)"""
-    try:
-        target_table = table_name.upper()
-        # Get table description
-        # desc_result = session.sql(f"DESCRIBE TABLE {target_table}").to_pandas()
-        existing_table = session.sql(f"SELECT * FROM {target_table}").to_pandas()
-        st.write(existing_table.dtypes)
-        
-        # Check for required columns
-        column_names = [col.strip('"').upper() for col in existing_table.columns.tolist()]
-        st.write(column_names)
-        
-        if 'INPUT_QUERY' not in column_names:
-            return False, "Missing required column: INPUT_QUERY"
-        if 'EXPECTED_TOOLS' not in column_names:
-            return False, "Missing required column: EXPECTED_TOOLS"
-        
-        return True, "Schema valid"
-    except Exception as e:
-        return False, f"Error validating schema: {str(e)}"
+EXPORT_STAGE = "EVALSET_EXPORT_STAGE"
+
+def dataset_has_history() -> bool:
+    """Whether any record carries a CONVERSATION_HISTORY (loaded in thread mode)"""
+    spill = st.session_state.get('dataset_spill')
+    if spill:
+        return 'CONVERSATION_HISTORY' in spill['columns']
+    df = st.session_state.dataset
+    return df is not None and 'CONVERSATION_HISTORY' in df and df['CONVERSATION_HISTORY'].map(
+        lambda x: isinstance(x, list)).any()
+
+def write_export_parquet(path: str, with_history: bool = False) -> int:
+    """Write INPUT_QUERY and EXPECTED_TOOLS (as JSON text) to Parquet; a spilled dataset goes straight from its Arrow file"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([('INPUT_QUERY', pa.string()), ('EXPECTED_TOOLS', pa.string())]
+                       + ([('CONVERSATION_HISTORY', pa.string())] if with_history else []))
+
+    def batch(input_query, expected_tools, history=None):
+        columns = [pc.fill_null(input_query, ''), pc.fill_null(expected_tools, '{}')]
+        if with_history:
+            columns.append(history)
+        return pa.record_batch(columns, schema=schema)
+
+    nrows = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        spill = st.session_state.get('dataset_spill')
+        if spill and 'EXPECTED_TOOLS' in spill['json_columns']:
+            if spill['order'] is not None or spill['overlay']:
+                _compact_spill(spill)
+            # The spill file already holds EXPECTED_TOOLS as JSON text, so nothing is rebuilt as Python objects
+            with pa.memory_map(spill['path']) as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    chunk = reader.get_batch(i)
+                    input_query = chunk['INPUT_QUERY']
+                    if 'INPUT_QUERY' in spill['json_columns']:
+                        input_query = pa.array([None if x is None else str(json.loads(x)) for x in input_query.to_pylist()],
+                                               pa.string())
+                    writer.write_batch(batch(input_query, chunk['EXPECTED_TOOLS'],
+                                             chunk['CONVERSATION_HISTORY'] if with_history else None))
+                    nrows += chunk.num_rows
+            return nrows
+
+        def json_text(values: pd.Series):
+            return pa.array(_encode_json_values(values.where(values.notna(), None)), pa.string())
+
+        # Encoded a batch at a time, so the JSON text never exists for the whole dataset at once
+        for chunk in iter_dataset_chunks():
+            writer.write_batch(batch(
+                pa.array(chunk['INPUT_QUERY'].astype('string'), pa.string(), from_pandas=True),
+                json_text(chunk['EXPECTED_TOOLS']),
+                json_text(chunk['CONVERSATION_HISTORY']) if with_history else None,
+            ))
+            nrows += len(chunk)
+    return nrows
+
+def export_dataset_parquet(session, table_upper: str, with_history: bool = False) -> int:
+    """PUT the dataset as one Parquet file to a temporary stage and COPY it into the table"""
+    stage = f"{table_upper.rsplit('.', 1)[0]}.{EXPORT_STAGE}"
+    file_name = f"evalset_{uuid.uuid4().hex}.parquet"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_path = os.path.join(tmp_dir, file_name)
+        nrows = write_export_parquet(local_path, with_history)
+        session.sql(f"CREATE TEMPORARY STAGE IF NOT EXISTS {stage}").collect()
+        session.file.put(local_path, f"@{stage}", auto_compress=False, overwrite=True)
+
+    columns, values = "INPUT_QUERY, EXPECTED_TOOLS", "$1:INPUT_QUERY::VARCHAR, PARSE_JSON($1:EXPECTED_TOOLS::VARCHAR)"
+    if with_history:
+        columns += ", CONVERSATION_HISTORY"
+        values += ", PARSE_JSON($1:CONVERSATION_HISTORY::VARCHAR)"
+    session.sql(f"""
+    COPY INTO {table_upper} ({columns})
+    FROM (SELECT {values} FROM @{stage})
+    FILES = ('{file_name}')
+    FILE_FORMAT = (TYPE = PARQUET)
+    PURGE = TRUE
+    """).collect()
+    return nrows
+
+def export_dataset_rows(session, table_upper: str, with_history: bool = False) -> Optional[int]:
+    """Export through a staging table written with write_pandas, a chunk at a time; returns None when staging fails"""
+    temp_table = f"{table_upper}_TEMP_STAGING"
+    session.sql(f"CREATE OR REPLACE TEMP TABLE {temp_table} (INPUT_QUERY VARCHAR, EXPECTED_TOOLS_JSON VARCHAR, CONVERSATION_HISTORY_JSON VARCHAR);").collect()
+
+    nrows = 0
+    for chunk in iter_dataset_chunks():
+        # Prepare data - convert to proper format
+        records_to_insert = []
+        for _, row in chunk.iterrows():
+            query_val = str(row['INPUT_QUERY']) if pd.notna(row['INPUT_QUERY']) else ''
+            tools_dict = row['EXPECTED_TOOLS'] if pd.notna(row['EXPECTED_TOOLS']) else {}
+            history = row.get('CONVERSATION_HISTORY')
+            records_to_insert.append((query_val, json.dumps(tools_dict), json.dumps(history) if isinstance(history, list) else None))
+
+        # Create temp dataframe with properly formatted data
+        temp_df = pd.DataFrame(records_to_insert, columns=['INPUT_QUERY', 'EXPECTED_TOOLS_JSON', 'CONVERSATION_HISTORY_JSON'])
+
+        # Use write_pandas for temp table (handles escaping properly)
+        # Snowpark Session.write_pandas returns (success: bool, nrows: int)
+        write_result = session.write_pandas(
+            temp_df,
+            temp_table,
+            auto_create_table=False,
+            quote_identifiers=False
+        )
+
+        # Handle return value - could be tuple of 2 or 4 values depending on version
+        if isinstance(write_result, tuple):
+            if len(write_result) == 2:
+                success, chunk_rows = write_result
+            elif len(write_result) == 4:
+                success, nchunks, chunk_rows, output = write_result
+            else:
+                success = write_result[0]
+                chunk_rows = len(temp_df)
+        else:
+            success = write_result
+            chunk_rows = len(temp_df)
+
+        if not success:
+            return None
+        nrows += chunk_rows
+
+    # Copy from temp to final table with PARSE_JSON
+    if with_history:
+        insert_sql = f"""
+    INSERT INTO {table_upper} (INPUT_QUERY, EXPECTED_TOOLS, CONVERSATION_HISTORY)
+    SELECT INPUT_QUERY, PARSE_JSON(EXPECTED_TOOLS_JSON), PARSE_JSON(CONVERSATION_HISTORY_JSON)
+    FROM {temp_table}
+    """
+    else:
+        insert_sql = f"""
+    INSERT INTO {table_upper} (INPUT_QUERY, EXPECTED_TOOLS)
+    SELECT INPUT_QUERY, PARSE_JSON(EXPECTED_TOOLS_JSON)
+    FROM {temp_table}
+    """
+    session.sql(insert_sql).collect()
+    return nrows
+
+TABLE_SPEC_PATTERN = re.compile(r"^(?:([A-Z_][A-Z0-9_$]*)\.)??(?:([A-Z_][A-Z0-9_$]*)\.)?([A-Z0-9_$*%]+)$")
+
+def parse_table_list(text: str) -> List[tuple]:
+    """Parse comma- or newline-separated table names into (database, schema, table) specs.
+
+    Missing parts fall back to the current database/schema; `*` or `%` in the table part is a wildcard."""
+    specs = []
+    for entry in re.split(r"[,\s]+", text.strip().upper()):
+        if not entry:
+            continue
+        match = TABLE_SPEC_PATTERN.match(entry)
+        if not match:
+            raise ValueError(f"Invalid table name or pattern: {entry}")
+        specs.append(match.groups())
+    return specs
 
-def load_from_table(session, table_name: str) -> pd.DataFrame:
-    """Load data from Snowflake table with schema validation"""
+def build_table_metadata_query(specs: List[tuple]) -> str:
+    """One query over INFORMATION_SCHEMA.COLUMNS that resolves every spec and reports its required columns.
+
+    Specs come from parse_table_list, whose pattern only admits identifier characters."""
+    branches = []
+    for position, (database, schema, table) in enumerate(specs):
+        columns_view = f"{database}.INFORMATION_SCHEMA.COLUMNS" if database else "INFORMATION_SCHEMA.COLUMNS"
+        schema_filter = f"TABLE_SCHEMA = '{schema}'" if schema else "TABLE_SCHEMA = CURRENT_SCHEMA()"
+        if '*' in table or '%' in table:
+            pattern = table.replace('!', '!!').replace('_', '!_').replace('*', '%')
+            table_filter = f"TABLE_NAME LIKE '{pattern}' ESCAPE '!'"
+        else:
+            table_filter = f"TABLE_NAME = '{table}'"
+        branches.append(f"""
+    SELECT {position} AS SPEC, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME
+    FROM {columns_view}
+    WHERE {schema_filter} AND {table_filter}""")
+
+    union = "\n    UNION ALL".join(branches)
+    return f"""
+SELECT SPEC, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME,
+    COUNT_IF(COLUMN_NAME = 'INPUT_QUERY') > 0 AS HAS_INPUT_QUERY,
+    COUNT_IF(COLUMN_NAME = 'EXPECTED_TOOLS') > 0 AS HAS_EXPECTED_TOOLS
+FROM ({union}
+)
+GROUP BY SPEC, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME
+ORDER BY SPEC, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME;"""
+
+def resolve_source_tables(session, specs: List[tuple]) -> tuple[List[str], List[str]]:
+    """Return the quoted names of matching tables with a valid schema, and a message per spec or table that failed"""
+    rows = session.sql(build_table_metadata_query(specs)).collect()
+    tables, problems = [], []
+    for position, (database, schema, table) in enumerate(specs):
+        matches = [row for row in rows if row['SPEC'] == position]
+        spec_name = ".".join(part for part in (database, schema, table) if part)
+        if not matches:
+            problems.append(f"{spec_name}: no matching table")
+        for row in matches:
+            fq_name = '.'.join(f'"{row[part]}"' for part in ('TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME'))
+            missing = [column for column, flag in (('INPUT_QUERY', 'HAS_INPUT_QUERY'), ('EXPECTED_TOOLS', 'HAS_EXPECTED_TOOLS'))
+                       if not row[flag]]
+            if missing:
+                problems.append(f"{fq_name}: missing required column {', '.join(missing)}")
+            elif fq_name not in tables:
+                tables.append(fq_name)
+    return tables, problems
+
+def build_union_load_query(tables: List[str]) -> str:
+    """UNION ALL the tables and keep the first copy of each (INPUT_QUERY, EXPECTED_TOOLS) pair, in table order"""
+    union = "\n    UNION ALL\n".join(
+        f"    SELECT INPUT_QUERY, EXPECTED_TOOLS, {position} AS SOURCE_ORDER FROM {table}"
+        for position, table in enumerate(tables)
+    )
+    return f"""
+SELECT INPUT_QUERY, EXPECTED_TOOLS
+FROM (
+{union}
+)
+QUALIFY ROW_NUMBER() OVER (PARTITION BY HASH(INPUT_QUERY, EXPECTED_TOOLS) ORDER BY SOURCE_ORDER) = 1
+ORDER BY SOURCE_ORDER;"""
+
+def load_from_tables(session, table_input: str) -> pd.DataFrame:
+    """Load and deduplicate one or more tables (names or patterns) in a single query, after one schema check"""
     try:
-        # Validate schema first
-        is_valid, message = validate_table_schema(session, table_name)
-        if not is_valid:
-            st.error(f"❌ Invalid table schema: {message}")
+        specs = parse_table_list(table_input)
+        if not specs:
             return pd.DataFrame()
-        
-        target_table = table_name.upper()
-        query = f"SELECT INPUT_QUERY, EXPECTED_TOOLS FROM {target_table}"
-        df = session.sql(query).to_pandas()
-        
+
+        tables, problems = resolve_source_tables(session, specs)
+        for problem in problems:
+            st.warning(f"⚠️ Skipped {problem}")
+        if not tables:
+            st.error("❌ No tables with the required INPUT_QUERY and EXPECTED_TOOLS columns")
+            return pd.DataFrame()
+
+        df = session.sql(build_union_load_query(tables)).to_pandas()
+
         # Verify data loaded
         if df.empty:
-            st.warning("⚠️ Table exists but contains no records")
+            st.warning("⚠️ Tables exist but contain no records")
             return df
-        
-        st.success(f"✅ Loaded {len(df)} records from {target_table}")
+
+        # VARIANT values arrive as JSON text
+        df['EXPECTED_TOOLS'] = df['EXPECTED_TOOLS'].map(lambda x: json.loads(x) if isinstance(x, str) else x)
+        st.success(f"✅ Loaded {len(df)} distinct records from {len(tables)} table(s)")
         return df
-        
+
     except Exception as e:
         st.error(f"Failed to load from table: {e}")
         return pd.DataFrame()
@@ -381,104 +1042,1374 @@ def create_manual_record(input_query: str, agent_response: str, tools: List[Dict
         }
     }
 
-st.title("🔍 AI evaluation dataset builder")
-st.caption("Build evaluation datasets from agent logs and manual entries")
+TOKEN_PATTERN = re.compile(r"\w+")
+# Search terms are looked up through the n-grams of vocabulary tokens instead of scanning the vocabulary
+NGRAM_SIZE = 3
+RECORD_PAGE_SIZE = 50
 
-# Add custom CSS to maximize width - more aggressive overrides
-st.markdown("""
-    <style>
-    /* Force full width for main content */
-    .main .block-container {
-        max-width: 95% !important;
-        padding-left: 2rem !important;
-        padding-right: 2rem !important;
-    }
-    
-    /* Remove tab panel padding */
-    .stTabs [data-baseweb="tab-panel"] {
-        padding: 0 !important;
-    }
-    
-    /* Force dataframe to use full width */
-    div[data-testid="stDataFrame"] {
-        width: 100% !important;
-    }
-    
-    div[data-testid="stDataFrame"] > div {
-        width: 100% !important;
-    }
-    
-    /* Remove padding from elements containing dataframes */
-    div[data-testid="column"] {
-        padding: 0 !important;
+def _record_terms(input_query: Any, expected_tools: Any) -> tuple[set, set]:
+    """Return (search tokens, tool names) for one record"""
+    tools = set()
+    text_parts = [str(input_query) if pd.notna(input_query) else '']
+    if isinstance(expected_tools, dict):
+        for tool in expected_tools.get('ground_truth_invocations') or []:
+            if isinstance(tool, dict) and tool.get('tool_name'):
+                tools.add(str(tool['tool_name']))
+        output = expected_tools.get('ground_truth_output')
+        if output is not None:
+            text_parts.append(str(output))
+    tokens = set(TOKEN_PATTERN.findall(" ".join(text_parts + sorted(tools)).lower()))
+    return tokens, tools
+
+def _token_grams(token: str) -> set:
+    """Keys a token is found under: its n-grams, plus its shorter prefixes for terms below NGRAM_SIZE"""
+    grams = {token[:length] for length in range(1, min(NGRAM_SIZE, len(token) + 1))}
+    grams.update(token[start:start + NGRAM_SIZE] for start in range(len(token) - NGRAM_SIZE + 1))
+    return grams
+
+def _matching_tokens(index: Dict[str, Any], term: str) -> set:
+    """Vocabulary tokens containing the term; terms shorter than NGRAM_SIZE match token prefixes"""
+    grams = index['grams']
+    if len(term) < NGRAM_SIZE:
+        return grams.get(term, set())
+    gram_tokens = [grams.get(term[start:start + NGRAM_SIZE]) for start in range(len(term) - NGRAM_SIZE + 1)]
+    if not all(gram_tokens):
+        return set()
+    candidates = set.intersection(*sorted(gram_tokens, key=len))
+    return {token for token in candidates if term in token}
+
+def _index_record(index: Dict[str, Any], uid: int, input_query: Any, expected_tools: Any) -> None:
+    tokens, tools = _record_terms(input_query, expected_tools)
+    for token in tokens:
+        if token not in index['tokens']:
+            index['tokens'][token] = set()
+            for gram in _token_grams(token):
+                index['grams'].setdefault(gram, set()).add(token)
+        index['tokens'][token].add(uid)
+    for tool in tools:
+        index['tools'].setdefault(tool, set()).add(uid)
+    if not tools:
+        index['no_tools'].add(uid)
+    index['row_terms'][uid] = (tokens, tools)
+
+def _unindex_record(index: Dict[str, Any], uid: int) -> None:
+    tokens, tools = index['row_terms'].pop(uid)
+    for key, names in (('tokens', tokens), ('tools', tools)):
+        postings = index[key]
+        for name in names:
+            postings[name].discard(uid)
+            if not postings[name]:
+                del postings[name]
+    for token in tokens:
+        if token not in index['tokens']:
+            for gram in _token_grams(token):
+                index['grams'][gram].discard(token)
+                if not index['grams'][gram]:
+                    del index['grams'][gram]
+    index['no_tools'].discard(uid)
+
+def build_record_index(df: pd.DataFrame) -> Dict[str, Any]:
+    """Build an inverted index (token -> row ids) over queries, tool names and ground truth output"""
+    index = {
+        'tokens': {},
+        'grams': {},
+        'tools': {},
+        'no_tools': set(),
+        'row_terms': {},
+        'row_uids': [],
+        'next_uid': 0,
+        'positions': None
     }
-    </style>
-""", unsafe_allow_html=True)
+    index_add_records(index, df)
+    return index
 
-session = get_snowflake_connection()
+def index_add_records(index: Dict[str, Any], df: pd.DataFrame) -> None:
+    """Index rows appended to the end of the dataset"""
+    for input_query, expected_tools in zip(df['INPUT_QUERY'], df['EXPECTED_TOOLS']):
+        uid = index['next_uid']
+        index['next_uid'] += 1
+        index['row_uids'].append(uid)
+        _index_record(index, uid, input_query, expected_tools)
+    index['positions'] = None
 
-with st.sidebar:
-    st.header("Configuration")
-    
-    if session:
-        st.success("✅ Connected")
-        try:
-            user_info = session.sql("SELECT CURRENT_USER(), CURRENT_ROLE(), CURRENT_WAREHOUSE()").collect()[0]
-            st.caption(f"User: {user_info[0]} | Role: {user_info[1]}")
-        except:
-            pass
-    else:
-        st.error("❌ Not connected")
-    
-    st.divider()
-    
-    if st.session_state.dataset is not None:
-        st.metric("Records in dataset", len(st.session_state.dataset))
+def index_update_record(index: Dict[str, Any], position: int, input_query: Any, expected_tools: Any) -> None:
+    """Re-index the row at the given dataset position after an edit"""
+    uid = index['row_uids'][position]
+    _unindex_record(index, uid)
+    _index_record(index, uid, input_query, expected_tools)
+
+def index_remove_record(index: Dict[str, Any], position: int) -> None:
+    """Drop the row at the given dataset position; later rows shift up by one"""
+    uid = index['row_uids'].pop(position)
+    _unindex_record(index, uid)
+    index['positions'] = None
+
+def index_remove_records(index: Dict[str, Any], positions: List[int]) -> None:
+    """Drop the rows at the given dataset positions in one pass; later rows shift up"""
+    removed = set(positions)
+    for position in removed:
+        _unindex_record(index, index['row_uids'][position])
+    index['row_uids'] = [uid for position, uid in enumerate(index['row_uids']) if position not in removed]
+    index['positions'] = None
+
+def index_insert_records(index: Dict[str, Any], positions: List[int], df: pd.DataFrame) -> None:
+    """Index rows re-inserted at the given final dataset positions, as when a bulk delete is undone"""
+    new_uids = list(range(index['next_uid'], index['next_uid'] + len(positions)))
+    index['next_uid'] += len(positions)
+    for uid, input_query, expected_tools in zip(new_uids, df['INPUT_QUERY'], df['EXPECTED_TOOLS']):
+        _index_record(index, uid, input_query, expected_tools)
+    row_uids, old_uids, inserted = [], iter(index['row_uids']), dict(zip(positions, new_uids))
+    for position in range(len(index['row_uids']) + len(positions)):
+        row_uids.append(inserted[position] if position in inserted else next(old_uids))
+    index['row_uids'] = row_uids
+    index['positions'] = None
+
+def record_filter_options(index: Dict[str, Any]) -> List[str]:
+    """Filters offered in the record selector"""
+    return ["All records", "No tools"] + [f"Uses {tool}" for tool in sorted(index['tools'])]
+
+def search_record_index(index: Dict[str, Any], search_text: str = "", record_filter: str = "All records") -> List[int]:
+    """Return sorted dataset positions matching every search term and the filter.
+    Terms match token substrings, or token prefixes when shorter than NGRAM_SIZE."""
+    matched = None
+    for term in set(TOKEN_PATTERN.findall(search_text.lower())):
+        term_uids = set()
+        for token in _matching_tokens(index, term):
+            term_uids |= index['tokens'][token]
+        matched = term_uids if matched is None else matched & term_uids
+        if not matched:
+            return []
+
+    if record_filter == "No tools":
+        filter_uids = index['no_tools']
+    elif record_filter.startswith("Uses "):
+        filter_uids = index['tools'].get(record_filter[len("Uses "):], set())
     else:
-        st.caption("No dataset loaded yet")
-    
-    st.divider()
-    
-    if st.button("🔄 Reset dataset", help="Clear dataset and start over"):
-        st.session_state.dataset = None
-        st.session_state.query_executed = False
-        st.rerun()
-if session:
-    # Create tab selection with navigation buttons at the top
-    tab_names = ["📥 1. Load Data", "➕ 2. Add records", "✏️ 3. Review & edit", "📤 4. Export"]
-    
-    # Navigation bar with buttons and tab selector
-    col_prev, col_tabs, col_next = st.columns([1, 8, 1])
-    
-    with col_prev:
-        if st.session_state.active_tab > 0:
-            if st.button("← Back", key="nav_prev", use_container_width=True):
-                st.session_state.active_tab -= 1
-                st.rerun()
-    
-    with col_tabs:
-        selected_tab_name = st.radio(
-            "Navigation",
-            tab_names,
-            index=st.session_state.active_tab,
-            horizontal=True,
-            label_visibility="collapsed",
-            key="tab_selector"
-        )
-        # Update active tab based on radio selection
-        st.session_state.active_tab = tab_names.index(selected_tab_name)
-    
-    with col_next:
-        if st.session_state.active_tab < len(tab_names) - 1:
-            if st.button("Next →", key="nav_next", type="primary", use_container_width=True):
-                st.session_state.active_tab += 1
-                st.rerun()
-    
-    st.divider()
-    
-    # Render content based on active tab
-    if st.session_state.active_tab == 0:
-        st.header("Load Data")
+        filter_uids = None
+
+    if filter_uids is not None:
+        matched = set(filter_uids) if matched is None else matched & filter_uids
+
+    if matched is None:
+        return list(range(len(index['row_uids'])))
+    if index['positions'] is None:
+        index['positions'] = {uid: pos for pos, uid in enumerate(index['row_uids'])}
+    positions = index['positions']
+    return sorted(positions[uid] for uid in matched)
+
+MEMORY_BUDGET_MB = float(os.getenv("EVALSET_MEMORY_BUDGET_MB", "512"))
+SPILL_DIR = os.getenv("EVALSET_SPILL_DIR", os.path.join(tempfile.gettempdir(), "evalset_spill"))
+SPILL_BATCH_ROWS = 10000
+# Edited and appended rows of a spilled dataset stay in memory until there are this many; then the file is rewritten
+SPILL_OVERLAY_ROWS = 10000
+PREVIEW_PAGE_SIZE = 500
+
+def _deep_sizeof(value: Any) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(v) for v in value)
+    return size
+
+def _sampled_sizeof(items: List[Any], sample_rows: int = 500) -> int:
+    if not items:
+        return 0
+    sample = items[::max(1, len(items) // sample_rows)]
+    return int(sum(_deep_sizeof(item) for item in sample) * len(items) / len(sample))
+
+def estimate_dataset_bytes(df: pd.DataFrame, sample_rows: int = 500) -> int:
+    """Estimate the in-memory size of the dataset, including nested EXPECTED_TOOLS objects, from a row sample"""
+    if df is None or len(df) == 0:
+        return 0
+    step = max(1, len(df) // sample_rows)
+    sample = df.iloc[::step]
+    sample_bytes = sum(_deep_sizeof(value) for column in sample.columns for value in sample[column])
+    return int(sample_bytes * len(df) / len(sample)) + int(df.index.memory_usage())
+
+def _estimate_record_index_bytes(index: Dict[str, Any], sample_rows: int = 500) -> int:
+    """Estimate the record index from a sample of its per-row terms; each term also holds one posting entry"""
+    uids = index['row_uids']
+    if not uids:
+        return 0
+    sample = uids[::max(1, len(uids) // sample_rows)]
+    sample_bytes = 0
+    for uid in sample:
+        tokens, tools = index['row_terms'][uid]
+        # A posting is a set slot plus the row id object
+        sample_bytes += _deep_sizeof(tokens) + _deep_sizeof(tools) + 64 * (len(tokens) + len(tools))
+    # Each vocabulary token also takes a set slot in about one n-gram set per character
+    vocabulary = list(islice(index['tokens'], sample_rows))
+    gram_bytes = 40 * sum(len(token) for token in vocabulary) * len(index['tokens']) / max(1, len(vocabulary))
+    return int(sample_bytes * len(uids) / len(sample) + gram_bytes)
+
+def estimate_session_overhead_bytes() -> int:
+    """Memory the session holds besides the dataset rows: the record index and the bulk undo snapshots"""
+    total = 0
+    if st.session_state.get('record_index') is not None:
+        total += _estimate_record_index_bytes(st.session_state.record_index)
+    for undo_entry in st.session_state.get('bulk_undo_stack', []):
+        snapshot = undo_entry['rows'] if 'rows' in undo_entry else undo_entry['old_values'].to_frame()
+        total += estimate_dataset_bytes(snapshot)
+    return total
+
+def _json_columns(df: pd.DataFrame) -> List[str]:
+    """Object columns, stored as JSON text when spilled so dicts, lists and stray scalars all read back unchanged"""
+    return [column for column in df.columns if df[column].dtype == object]
+
+def _encode_json_values(values: pd.Series) -> List[Optional[str]]:
+    def encode(value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        try:
+            return json.dumps(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{values.name} holds a {type(value).__name__} value that cannot be stored as JSON") from e
+    return [encode(value) for value in values]
+
+def _decode_json_values(values: pd.Series) -> pd.Series:
+    return values.map(lambda x: json.loads(x) if isinstance(x, str) else None).astype(object)
+
+def _spill_path() -> str:
+    if 'spill_id' not in st.session_state:
+        st.session_state.spill_id = uuid.uuid4().hex
+    return os.path.join(SPILL_DIR, f"dataset_{st.session_state.spill_id}.arrow")
+
+def _export_csv_path() -> str:
+    if 'spill_id' not in st.session_state:
+        st.session_state.spill_id = uuid.uuid4().hex
+    return os.path.join(SPILL_DIR, f"export_{st.session_state.spill_id}.csv")
+
+def write_export_csv(path: str) -> int:
+    """Write the dataset as CSV one chunk at a time; returns the number of rows written"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    nrows = 0
+    with open(path, 'w', newline='') as f:
+        for chunk in iter_dataset_chunks():
+            chunk.to_csv(f, index=False, header=nrows == 0)
+            nrows += len(chunk)
+    return nrows
+
+def _clear_spill() -> None:
+    spill = st.session_state.get('dataset_spill')
+    if spill and os.path.exists(spill['path']):
+        os.remove(spill['path'])
+    st.session_state.dataset_spill = None
+
+def _arrow_schema(df: pd.DataFrame, json_columns: List[str]):
+    """JSON columns as text; every other column keeps the Arrow type inferred from its pandas dtype"""
+    import pyarrow as pa
+
+    inferred = pa.Schema.from_pandas(df[[column for column in df.columns if column not in json_columns]],
+                                     preserve_index=False)
+    return pa.schema([
+        pa.field(str(column), pa.string()) if column in json_columns else inferred.field(str(column))
+        for column in df.columns
+    ])
+
+def _write_arrow_chunks(chunks, path: str, schema, json_columns: List[str]) -> None:
+    """Write DataFrame chunks to a memory-mappable Arrow IPC file, one record batch per chunk"""
+    import pyarrow as pa
+
+    # Strings read back from a memory-mapped file stay zero-copy, so the chunks may still point into `path`.
+    # Write beside it and rename, which leaves the old file intact for existing mappings.
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    schema = schema.with_metadata({'json_columns': json.dumps(json_columns)})
+    try:
+        with pa.ipc.new_file(tmp_path, schema) as writer:
+            for chunk in chunks:
+                columns = {
+                    name: _encode_json_values(chunk[name]) if name in json_columns else chunk[name].to_numpy()
+                    for name in schema.names
+                }
+                writer.write_table(pa.Table.from_pandas(pd.DataFrame(columns), schema=schema, preserve_index=False))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+def write_arrow_dataset(df: pd.DataFrame, path: str) -> List[str]:
+    """Write the dataset to a memory-mappable Arrow IPC file, one record batch at a time; returns its JSON columns"""
+    json_columns = _json_columns(df)
+    chunks = (df.iloc[start:start + SPILL_BATCH_ROWS] for start in range(0, len(df), SPILL_BATCH_ROWS))
+    _write_arrow_chunks(chunks, path, _arrow_schema(df, json_columns), json_columns)
+    return json_columns
+
+def _check_spill_round_trip(df: pd.DataFrame, spill: Dict[str, Any], sample_rows: int = 500) -> None:
+    """Raise ValueError unless a sample of the spilled rows reads back equal to the frame it was written from"""
+    positions = list(range(0, len(df), max(1, len(df) // sample_rows)))
+    written = df.iloc[positions].reset_index(drop=True)
+    read = _read_spilled_rows(spill, positions).reset_index(drop=True)
+    for column in df.columns:
+        if not written[column].astype(object).equals(read[column].astype(object)):
+            raise ValueError(f"{column} does not read back unchanged from the spill file")
+
+def spill_dataset(df: pd.DataFrame) -> Dict[str, Any]:
+    """Spill the dataset to this session's Arrow file; raises ValueError if it would not read back unchanged"""
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    path = _spill_path()
+    json_columns = write_arrow_dataset(df, path)
+    spill = {'path': path, 'rows': len(df), 'columns': list(df.columns), 'json_columns': json_columns,
+             'disk_bytes': os.path.getsize(path), 'order': None, 'overlay': []}
+    try:
+        _check_spill_round_trip(df, spill)
+    except ValueError:
+        os.remove(path)
+        raise
+    return spill
+
+def _read_spilled_rows(spill: Dict[str, Any], positions: Optional[List[int]] = None,
+                       columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read rows from the memory-mapped spill file and its overlay of edited rows.
+    Only the requested rows and columns are turned into Python objects."""
+    import numpy as np
+    import pyarrow as pa
+
+    order, overlay = spill.get('order'), spill.get('overlay') or []
+    with pa.memory_map(spill['path']) as source:
+        table = pa.ipc.open_file(source).read_all()
+        all_columns = spill.get('columns') or table.column_names
+        columns = all_columns if columns is None else [column for column in all_columns if column in columns]
+        table = table.select([column for column in columns if column in table.column_names])
+        if positions is None and order is None:
+            df = table.to_pandas()
+            row_ids = None
+        else:
+            index = np.arange(spill['rows']) if positions is None else np.asarray(positions, dtype=np.int64)
+            # Negative row ids point into the overlay: -1 is overlay[0]
+            row_ids = index if order is None else order[index]
+            in_file = row_ids >= 0
+            df = table.take(pa.array(row_ids[in_file])).to_pandas()
+    for column in spill['json_columns']:
+        if column in df:
+            df[column] = _decode_json_values(df[column])
+
+    if row_ids is not None:
+        df.index = index[in_file]
+        if not in_file.all():
+            edited = pd.DataFrame([overlay[-row_id - 1] for row_id in row_ids[~in_file]], index=index[~in_file])
+            df = edited if df.empty else pd.concat([df, edited]).loc[index]
+        if positions is None:
+            df = df.reset_index(drop=True)
+    return df.reindex(columns=columns)
+
+def _spilled_dataset_bytes(spill: Dict[str, Any], sample_rows: int = 500) -> int:
+    """Estimated in-memory size of a spilled dataset were it loaded, from a sample of its rows"""
+    if spill['rows'] == 0:
+        return 0
+    sample = _read_spilled_rows(spill, range(0, spill['rows'], max(1, spill['rows'] // sample_rows)))
+    return int(estimate_dataset_bytes(sample) * spill['rows'] / len(sample))
+
+def _compact_spill(spill: Dict[str, Any]) -> None:
+    """Rewrite the spill file with the overlay folded in, streaming one chunk at a time"""
+    import pyarrow as pa
+
+    with pa.memory_map(spill['path']) as source:
+        file_schema = pa.ipc.open_file(source).schema
+    edited = pd.DataFrame(spill['overlay'])
+    json_columns = list(spill['json_columns'])
+    fields = []
+    for column in spill['columns']:
+        values = edited[column].dropna() if column in edited else pd.Series([], dtype=object)
+        if column not in json_columns and column not in file_schema.names and values.dtype == object:
+            json_columns.append(column)
+        if column in json_columns:
+            fields.append(pa.field(column, pa.string()))
+            continue
+        field = file_schema.field(column) if column in file_schema.names else None
+        if not values.empty:
+            inferred = pa.Schema.from_pandas(values.to_frame(column), preserve_index=False).field(column)
+            try:
+                field = inferred if field is None else pa.unify_schemas(
+                    [pa.schema([field]), pa.schema([inferred])], promote_options='permissive'
+                ).field(column)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Edited values of another type: keep the column as JSON text instead
+                json_columns.append(column)
+                field = pa.field(column, pa.string())
+        fields.append(field if field is not None else pa.field(column, pa.string()))
+
+    chunks = (_read_spilled_rows(spill, range(start, min(start + SPILL_BATCH_ROWS, spill['rows'])))
+              for start in range(0, spill['rows'], SPILL_BATCH_ROWS))
+    _write_arrow_chunks(chunks, spill['path'], pa.schema(fields), json_columns)
+    spill.update(json_columns=json_columns, order=None, overlay=[], disk_bytes=os.path.getsize(spill['path']))
+
+def _patch_spill(spill: Dict[str, Any], entry: Dict[str, Any]) -> None:
+    """Apply a journal entry to a spilled dataset by remapping positions; new and edited rows go to the overlay"""
+    import numpy as np
+
+    order = np.arange(spill['rows'], dtype=np.int64) if spill['order'] is None else spill['order']
+    overlay = spill['overlay']
+
+    def add_to_overlay(records: List[Dict[str, Any]]):
+        start = len(overlay)
+        overlay.extend(records)
+        return -np.arange(start + 1, start + len(records) + 1, dtype=np.int64)
+
+    op = entry['op']
+    if op == 'append':
+        for column in dict.fromkeys(column for record in entry['records'] for column in record):
+            if column not in spill['columns']:
+                spill['columns'].append(column)
+        order = np.concatenate([order, add_to_overlay(entry['records'])])
+    elif op == 'update':
+        record = _read_spilled_rows(spill, [entry['position']]).to_dict('records')[0]
+        order[entry['position']] = add_to_overlay([{**record, **entry['record']}])[0]
+    elif op == 'set_tools':
+        records = _read_spilled_rows(spill, entry['positions']).to_dict('records')
+        for record, value in zip(records, entry['values']):
+            record['EXPECTED_TOOLS'] = value
+        order[entry['positions']] = add_to_overlay(records)
+    elif op == 'delete':
+        order = np.delete(order, entry['positions'])
+    elif op == 'insert':
+        # Re-insert rows at their original positions
+        restored = np.empty(len(order) + len(entry['positions']), dtype=np.int64)
+        kept = np.ones(len(restored), dtype=bool)
+        kept[entry['positions']] = False
+        restored[kept] = order
+        restored[entry['positions']] = add_to_overlay(entry['records'])
+        order = restored
+    else:
+        raise ValueError(f"Unknown journal operation: {op}")
+
+    spill['order'], spill['rows'] = order, len(order)
+    if len(overlay) > SPILL_OVERLAY_ROWS:
+        _compact_spill(spill)
+
+def dataset_len() -> int:
+    """Number of records in the dataset, whether in memory or spilled"""
+    if st.session_state.get('dataset_spill'):
+        return st.session_state.dataset_spill['rows']
+    return 0 if st.session_state.dataset is None else len(st.session_state.dataset)
+
+def has_dataset() -> bool:
+    return dataset_len() > 0
+
+def get_dataset_rows(positions: List[int], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Return a fresh DataFrame holding only the given positions (the working window)"""
+    positions = list(positions)
+    if st.session_state.get('dataset_spill'):
+        return _read_spilled_rows(st.session_state.dataset_spill, positions, columns)
+    df = st.session_state.dataset
+    return (df if columns is None else df[[column for column in df.columns if column in columns]]).iloc[positions].copy()
+
+def iter_dataset_chunks(chunk_rows: int = SPILL_BATCH_ROWS, columns: Optional[List[str]] = None):
+    """Yield the dataset in position order without holding all of it in memory"""
+    total = dataset_len()
+    for start in range(0, total, chunk_rows):
+        yield get_dataset_rows(range(start, min(start + chunk_rows, total)), columns)
+
+def _rebalance_dataset() -> None:
+    """Spill the dataset, or load a spilled one back, so the session stays within its memory budget"""
+    budget = MEMORY_BUDGET_MB * 1024 * 1024
+    overhead = estimate_session_overhead_bytes()
+    spill = st.session_state.dataset_spill
+    if spill:
+        if _spilled_dataset_bytes(spill) + overhead <= budget:
+            st.session_state.dataset = _read_spilled_rows(spill)
+            _clear_spill()
+        else:
+            st.session_state.dataset_memory_bytes = overhead + _sampled_sizeof(spill['overlay'])
+            return
+
+    df = st.session_state.dataset
+    memory_bytes = estimate_dataset_bytes(df) + overhead
+    if memory_bytes > budget:
+        try:
+            st.session_state.dataset_spill = spill_dataset(df)
+            st.session_state.dataset = None
+            st.session_state.dataset_memory_bytes = overhead
+            return
+        except ValueError as e:
+            st.warning(f"⚠️ Keeping the dataset in memory over the session budget: {e}")
+    st.session_state.dataset_memory_bytes = memory_bytes
+
+def _store_dataset(df: Optional[pd.DataFrame]) -> None:
+    """Keep the dataset in memory, or spill it to disk when the session exceeds its memory budget"""
+    st.session_state.dataset_version = st.session_state.get('dataset_version', 0) + 1
+    previous_spill = st.session_state.dataset_spill
+    st.session_state.dataset_spill = None
+    st.session_state.dataset = df
+    _rebalance_dataset()
+    if previous_spill and not st.session_state.dataset_spill and os.path.exists(previous_spill['path']):
+        os.remove(previous_spill['path'])
+
+def _update_dataset(entry: Dict[str, Any]) -> None:
+    """Apply one journal entry to the live dataset; a spilled dataset is patched, never read back whole"""
+    spill = st.session_state.dataset_spill
+    if not spill:
+        _store_dataset(_apply_journal_entry(st.session_state.dataset, entry))
+        return
+    _patch_spill(spill, entry)
+    st.session_state.dataset_version = st.session_state.get('dataset_version', 0) + 1
+    _rebalance_dataset()
+
+def get_record_index() -> Dict[str, Any]:
+    """Return the session's record index, building it on first use"""
+    if st.session_state.record_index is None:
+        index = build_record_index(pd.DataFrame({'INPUT_QUERY': [], 'EXPECTED_TOOLS': []}))
+        for chunk in iter_dataset_chunks(columns=['INPUT_QUERY', 'EXPECTED_TOOLS']):
+            index_add_records(index, chunk)
+        st.session_state.record_index = index
+        # The index counts against the session's budget too
+        _rebalance_dataset()
+    return st.session_state.record_index
+
+JOURNAL_DIR = os.getenv("EVALSET_JOURNAL_DIR", os.path.join(tempfile.gettempdir(), "evalset_journal"))
+JOURNAL_COMPACT_OPS = 500
+
+def _workspace_dir(archive: bool = False) -> str:
+    path = os.path.join(JOURNAL_DIR, st.session_state.workspace_id)
+    return os.path.join(path, "previous") if archive else path
+
+def _journal_path(workspace_dir: str) -> str:
+    return os.path.join(workspace_dir, "journal.jsonl")
+
+def _snapshot_meta_path(workspace_dir: str) -> str:
+    return os.path.join(workspace_dir, "snapshot.json")
+
+def _journal_head_path(workspace_dir: str) -> str:
+    return os.path.join(workspace_dir, "journal.head")
+
+@contextmanager
+def _journal_lock(workspace_dir: str):
+    """Hold an exclusive lock on a workspace's journal, so two browser tabs never interleave their writes.
+    Without flock (Windows) the journal head check in _journal still catches a second writer."""
+    os.makedirs(workspace_dir, exist_ok=True)
+    with _file_lock(os.path.join(workspace_dir, "journal.lock")):
+        yield
+
+def _read_journal_head(workspace_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_journal_head_path(workspace_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_journal_head(workspace_dir: str) -> None:
+    """Record the last sequence number and which session wrote it"""
+    tmp_path = f"{_journal_head_path(workspace_dir)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({'seq': st.session_state.journal_seq, 'writer': st.session_state.journal_writer}, f)
+    os.replace(tmp_path, _journal_head_path(workspace_dir))
+
+def _journal_default(value: Any) -> Any:
+    """Encode the non-JSON values a record can hold, tagged so replay restores their type"""
+    import numpy as np
+
+    if value is pd.NaT:
+        return {'$timestamp': None}
+    if isinstance(value, (datetime, np.datetime64)):
+        return {'$timestamp': pd.Timestamp(value).isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} values cannot be journaled")
+
+def _journal_object_hook(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and '$timestamp' in obj:
+        return pd.NaT if obj['$timestamp'] is None else pd.Timestamp(obj['$timestamp'])
+    return obj
+
+def _apply_journal_entry(df: Optional[pd.DataFrame], entry: Dict[str, Any]) -> Optional[pd.DataFrame]:
+    """Apply one journaled operation; the live mutation helpers and startup replay both go through here"""
+    op = entry['op']
+    if op == 'append':
+        new_records = pd.DataFrame(entry['records'])
+        return new_records if df is None else pd.concat([df, new_records], ignore_index=True)
+    if op == 'update':
+        df.at[entry['position'], 'INPUT_QUERY'] = entry['record']['INPUT_QUERY']
+        df.at[entry['position'], 'EXPECTED_TOOLS'] = entry['record']['EXPECTED_TOOLS']
+        return df
+    if op == 'set_tools':
+        df.loc[entry['positions'], 'EXPECTED_TOOLS'] = pd.Series(entry['values'], index=entry['positions'], dtype=object)
+        return df
+    if op == 'delete':
+        return df.drop(entry['positions']).reset_index(drop=True)
+    if op == 'insert':
+        # Re-insert rows at their original positions
+        kept_positions = pd.RangeIndex(len(df) + len(entry['positions'])).difference(entry['positions'])
+        restored = pd.concat([df.set_axis(kept_positions), pd.DataFrame(entry['records'], index=entry['positions'])])
+        return restored.sort_index().reset_index(drop=True)
+    raise ValueError(f"Unknown journal operation: {op}")
+
+def write_journal_snapshot() -> None:
+    """Compact the journal into a snapshot of the current dataset; a spilled dataset is copied, not loaded"""
+    import shutil
+
+    workspace_dir = _workspace_dir()
+    spill = st.session_state.dataset_spill
+    seq = st.session_state.journal_seq
+    meta = {'seq': seq, 'has_dataset': st.session_state.dataset is not None or bool(spill),
+            'snapshot': None, 'json_columns': []}
+    with _journal_lock(workspace_dir):
+        if has_dataset():
+            # Snapshots are named by sequence number, so the metadata never points at a half-written file
+            meta['snapshot'] = f"snapshot-{seq}.arrow"
+            snapshot_path = os.path.join(workspace_dir, meta['snapshot'])
+            if spill:
+                if spill['order'] is not None or spill['overlay']:
+                    _compact_spill(spill)
+                shutil.copyfile(spill['path'], f"{snapshot_path}.tmp")
+                os.replace(f"{snapshot_path}.tmp", snapshot_path)
+                meta['json_columns'] = spill['json_columns']
+            else:
+                meta['json_columns'] = write_arrow_dataset(st.session_state.dataset, snapshot_path)
+
+        tmp_path = f"{_snapshot_meta_path(workspace_dir)}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, _snapshot_meta_path(workspace_dir))
+        _write_journal_head(workspace_dir)
+
+        # Entries up to seq are now in the snapshot; replay skips them even if truncation is interrupted
+        open(_journal_path(workspace_dir), "w").close()
+        for name in os.listdir(workspace_dir):
+            if name.startswith("snapshot-") and name != meta['snapshot']:
+                os.remove(os.path.join(workspace_dir, name))
+    st.session_state.journal_ops_since_snapshot = 0
+
+def _fork_workspace() -> None:
+    """Move this session to a new workspace holding its current dataset"""
+    previous = st.session_state.workspace_id
+    st.session_state.workspace_id = uuid.uuid4().hex
+    st.query_params["workspace"] = st.session_state.workspace_id
+    st.session_state.journal_seq = 0
+    write_journal_snapshot()
+    st.toast(f"Workspace `{previous}` was changed in another browser tab. "
+             f"This tab now autosaves to workspace `{st.session_state.workspace_id}`.", icon="⚠️")
+
+def _journal(entry: Dict[str, Any]) -> None:
+    """Append one operation to the workspace journal; cost is proportional to the edit, not the dataset"""
+    workspace_dir = _workspace_dir()
+    try:
+        line = json.dumps({'seq': st.session_state.journal_seq + 1, **entry}, default=_journal_default) + "\n"
+    except (TypeError, ValueError) as e:
+        st.warning(f"⚠️ Change not autosaved: {e}")
+        return
+
+    with _journal_lock(workspace_dir):
+        head = _read_journal_head(workspace_dir)
+        if head is not None and (head['seq'], head['writer']) != (st.session_state.journal_seq, st.session_state.journal_writer):
+            # Another session appended since this one last wrote; its entries would not apply to this dataset
+            forked = True
+        else:
+            forked = False
+            with open(_journal_path(workspace_dir), "a") as f:
+                f.write(line)
+            st.session_state.journal_seq += 1
+            _write_journal_head(workspace_dir)
+    if forked:
+        _fork_workspace()
+        return
+
+    st.session_state.journal_ops_since_snapshot += 1
+    if st.session_state.journal_ops_since_snapshot >= JOURNAL_COMPACT_OPS:
+        write_journal_snapshot()
+
+def _open_snapshot_as_spill(snapshot_path: str, json_columns: List[str]) -> Dict[str, Any]:
+    """Copy a journal snapshot to this session's spill file, so replay patches it without loading it"""
+    import shutil
+    import pyarrow as pa
+
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    path = _spill_path()
+    shutil.copyfile(snapshot_path, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        rows, columns = table.num_rows, table.column_names
+    return {'path': path, 'rows': rows, 'columns': columns, 'json_columns': json_columns,
+            'disk_bytes': os.path.getsize(path), 'order': None, 'overlay': []}
+
+def restore_from_journal(archive: bool = False) -> int:
+    """Rebuild the dataset from the latest snapshot plus the journal entries after it; returns the record count"""
+    workspace_dir = _workspace_dir(archive)
+    with _journal_lock(workspace_dir):
+        try:
+            with open(_snapshot_meta_path(workspace_dir)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {'seq': 0, 'has_dataset': False, 'snapshot': None, 'json_columns': []}
+
+        df, spill = None, None
+        if meta['snapshot']:
+            spill = _open_snapshot_as_spill(os.path.join(workspace_dir, meta['snapshot']), meta['json_columns'])
+        elif meta['has_dataset']:
+            df = pd.DataFrame({'INPUT_QUERY': [], 'EXPECTED_TOOLS': []})
+
+        seq, replayed = meta['seq'], 0
+        if os.path.exists(_journal_path(workspace_dir)):
+            with open(_journal_path(workspace_dir)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line, object_hook=_journal_object_hook)
+                    except ValueError:
+                        break  # Torn last line from an interrupted write
+                    if entry['seq'] <= seq:
+                        continue
+                    if spill:
+                        _patch_spill(spill, entry)
+                    else:
+                        df = _apply_journal_entry(df, entry)
+                    seq = entry['seq']
+                    replayed += 1
+
+        st.session_state.journal_seq = seq
+        if not archive:
+            # This session is now the workspace's writer; another tab still holding it will fork on its next edit
+            _write_journal_head(workspace_dir)
+
+    if spill:
+        st.session_state.dataset_version = st.session_state.get('dataset_version', 0) + 1
+        st.session_state.dataset = None
+        st.session_state.dataset_spill = spill
+        _rebalance_dataset()
+    else:
+        _store_dataset(df)
+    st.session_state.record_index = None
+    st.session_state.bulk_undo_stack = []
+    st.session_state.journal_ops_since_snapshot = replayed
+    if archive:
+        # Restoring the previous dataset makes it the current one
+        import shutil
+
+        write_journal_snapshot()
+        shutil.rmtree(workspace_dir, ignore_errors=True)
+    return dataset_len()
+
+def archive_journal() -> None:
+    """Keep the current journal as the restorable previous dataset before a reset"""
+    import shutil
+
+    workspace_dir, archive_dir = _workspace_dir(), _workspace_dir(archive=True)
+    if not os.path.exists(_snapshot_meta_path(workspace_dir)) and not os.path.exists(_journal_path(workspace_dir)):
+        return
+    with _journal_lock(workspace_dir):
+        shutil.rmtree(archive_dir, ignore_errors=True)
+        os.makedirs(archive_dir)
+        for name in os.listdir(workspace_dir):
+            if name not in (os.path.basename(archive_dir), "journal.lock"):
+                os.replace(os.path.join(workspace_dir, name), os.path.join(archive_dir, name))
+
+def has_archived_journal() -> bool:
+    return os.path.exists(_snapshot_meta_path(_workspace_dir(archive=True)))
+
+def set_dataset(df: Optional[pd.DataFrame]) -> None:
+    """Replace the whole dataset"""
+    _store_dataset(df)
+    st.session_state.record_index = None
+    st.session_state.bulk_undo_stack = []
+    write_journal_snapshot()
+
+def append_to_dataset(new_records: pd.DataFrame) -> None:
+    """Append records to the dataset, keeping the record index current"""
+    if not has_dataset():
+        set_dataset(new_records.reset_index(drop=True))
+        return
+    entry = {'op': 'append', 'records': new_records.to_dict('records')}
+    _update_dataset(entry)
+    _journal(entry)
+    if st.session_state.record_index is not None:
+        index_add_records(st.session_state.record_index, new_records)
+
+def update_dataset_record(position: int, record: Dict[str, Any]) -> None:
+    """Overwrite the record at the given position"""
+    entry = {'op': 'update', 'position': int(position),
+             'record': {'INPUT_QUERY': record['INPUT_QUERY'], 'EXPECTED_TOOLS': record['EXPECTED_TOOLS']}}
+    _update_dataset(entry)
+    _journal(entry)
+    if st.session_state.record_index is not None:
+        index_update_record(st.session_state.record_index, position, record['INPUT_QUERY'], record['EXPECTED_TOOLS'])
+
+def delete_dataset_record(position: int) -> None:
+    """Delete the record at the given position"""
+    entry = {'op': 'delete', 'positions': [int(position)]}
+    _update_dataset(entry)
+    _journal(entry)
+    st.session_state.bulk_undo_stack = []
+    if st.session_state.record_index is not None:
+        index_remove_record(st.session_state.record_index, position)
+
+def render_dataset_preview(height: int, key: str) -> None:
+    """Show one page of the dataset with EXPECTED_TOOLS formatted as JSON"""
+    total = dataset_len()
+    num_pages = max(1, -(-total // PREVIEW_PAGE_SIZE))
+    page = 1
+    if num_pages > 1:
+        page = int(st.number_input("Preview page", min_value=1, max_value=num_pages, value=1, step=1, key=key))
+    start = (page - 1) * PREVIEW_PAGE_SIZE
+    stop = min(start + PREVIEW_PAGE_SIZE, total)
+    if num_pages > 1:
+        st.caption(f"Showing records {start + 1}-{stop} of {total}")
+
+    # Only the visible window is formatted, never a copy of the whole dataset
+    display_df = get_dataset_rows(range(start, stop))
+    for column in ['EXPECTED_TOOLS', 'CONVERSATION_HISTORY']:
+        if column in display_df:
+            display_df[column] = display_df[column].apply(
+                lambda x: json.dumps(x, indent=2) if isinstance(x, (dict, list)) else ''
+            )
+    st.dataframe(
+        display_df, 
+        use_container_width=True, 
+        hide_index=True, 
+        height=height,
+        column_config={
+            "INPUT_QUERY": st.column_config.TextColumn("Input Query", width="medium"),
+            "EXPECTED_TOOLS": st.column_config.TextColumn("Expected Tools (JSON)", width="large"),
+            "CONVERSATION_HISTORY": st.column_config.TextColumn("Conversation History (JSON)", width="large"),
+            "RUN_COUNT": st.column_config.NumberColumn("Runs", help="Logged runs of this query"),
+            "DISTINCT_SEQUENCES": st.column_config.NumberColumn("Tool sequences", help="Distinct tool sequences across the runs"),
+            "CONSENSUS_SUPPORT": st.column_config.NumberColumn("Agreement", format="percent",
+                                                               help="Share of runs that used the chosen tool sequence"),
+            "POSITIVE_FEEDBACKS": st.column_config.NumberColumn("👍", help="Runs with positive feedback"),
+            "NEGATIVE_FEEDBACKS": st.column_config.NumberColumn("👎", help="Runs with negative feedback"),
+        }
+    )
+
+EXPECTED_TOOLS_KEYS = frozenset(['ground_truth_invocations', 'ground_truth_output'])
+INVOCATION_REQUIRED_KEYS = frozenset(['tool_sequence', 'tool_name'])
+INVOCATION_KEYS = INVOCATION_REQUIRED_KEYS | {'tool_output'}
+
+def _shape_checker(required: frozenset, allowed: frozenset, label: str):
+    """Compile a key-set rule into a lookup: each distinct key tuple is checked once, then its message ('' if valid) is memoized"""
+    messages = {}
+
+    def check(keys: tuple) -> str:
+        message = messages.get(keys)
+        if message is None:
+            shape = set(keys)
+            problems = []
+            if required - shape:
+                problems.append(f"{label} is missing {', '.join(sorted(required - shape))}")
+            if shape - allowed:
+                problems.append(f"{label} has unexpected {', '.join(sorted(map(str, shape - allowed)))}")
+            message = messages[keys] = "; ".join(problems)
+        return message
+
+    return check
+
+def validate_expected_tools(df: pd.DataFrame, known_tools: Optional[frozenset] = None) -> pd.DataFrame:
+    """Validate every EXPECTED_TOOLS value in one pass over the dataset.
+
+    Returns one row per problem (ROW, INVOCATION, ERROR); ROW is the dataset position and INVOCATION
+    the 1-based position in ground_truth_invocations. Tool names are only checked when known_tools is given.
+    Takes about 0.2 s for 100k records with 200k invocations."""
+    check_record = _shape_checker(EXPECTED_TOOLS_KEYS, EXPECTED_TOOLS_KEYS, "EXPECTED_TOOLS")
+    check_invocation = _shape_checker(INVOCATION_REQUIRED_KEYS, INVOCATION_KEYS, "invocation")
+    check_output = _shape_checker(frozenset(), frozenset(postprocessing.TOOL_OUTPUT_KEYS), "tool_output")
+    errors = []
+    add = errors.append
+
+    for row, value in enumerate(df['EXPECTED_TOOLS'].tolist()):
+        if not isinstance(value, dict):
+            add((row, None, "EXPECTED_TOOLS is not an object"))
+            continue
+        message = check_record(tuple(value))
+        if message:
+            add((row, None, message))
+        if not isinstance(value.get('ground_truth_output', ''), str):
+            add((row, None, "ground_truth_output is not a string"))
+        invocations = value.get('ground_truth_invocations', [])
+        if not isinstance(invocations, list):
+            add((row, None, "ground_truth_invocations is not a list"))
+            continue
+
+        for number, item in enumerate(invocations, 1):
+            if not isinstance(item, dict):
+                add((row, number, "invocation is not an object"))
+                continue
+            message = check_invocation(tuple(item))
+            if message:
+                add((row, number, message))
+            sequence = item.get('tool_sequence', number)
+            if sequence != number:
+                add((row, number, f"tool_sequence is {sequence!r}, expected {number}"))
+            name = item.get('tool_name', '')
+            if not isinstance(name, str):
+                add((row, number, "tool_name is not a string"))
+            elif known_tools is not None and name not in known_tools and 'tool_name' in item:
+                add((row, number, f"unknown tool {name}"))
+            output = item.get('tool_output')
+            if output is not None:
+                if not isinstance(output, dict):
+                    add((row, number, "tool_output is not an object"))
+                else:
+                    message = check_output(tuple(output))
+                    if message:
+                        add((row, number, message))
+
+    report = pd.DataFrame(errors, columns=['ROW', 'INVOCATION', 'ERROR'])
+    report['ROW'] = report['ROW'].astype('int64')
+    report['INVOCATION'] = report['INVOCATION'].astype('Int64')
+    return report
+
+def get_validation_report(known_tools: Optional[frozenset] = None) -> pd.DataFrame:
+    """Validate the dataset, reusing the last report until the dataset or the known tools change"""
+    key = (st.session_state.get('dataset_version', 0), known_tools)
+    cached = st.session_state.validation_report
+    if cached is None or cached[0] != key:
+        # A chunk at a time, so a spilled dataset is never loaded whole
+        reports, offset = [], 0
+        for chunk in iter_dataset_chunks(columns=['EXPECTED_TOOLS']):
+            report = validate_expected_tools(chunk, known_tools)
+            report['ROW'] += offset
+            reports.append(report)
+            offset += len(chunk)
+        report = pd.concat(reports, ignore_index=True) if reports else validate_expected_tools(
+            pd.DataFrame({'EXPECTED_TOOLS': []}), known_tools)
+        cached = st.session_state.validation_report = (key, report)
+    return cached[1]
+
+@st.cache_data(ttl=600)
+def get_agent_tool_specs(_session, agent_fq_name: str) -> List[Dict[str, Any]]:
+    """Tool specs from the agent's DESCRIBE output (cached for 10 minutes)"""
+    _session.sql(f'DESCRIBE AGENT {agent_fq_name}').collect()
+    agent_desc_df = _session.sql('SELECT * FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))').to_pandas()
+    return [tool['tool_spec'] for tool in json.loads(agent_desc_df['agent_spec'][0])['tools']]
+
+def known_tool_names(tool_specs: List[Dict[str, Any]]) -> frozenset:
+    """Tool names an invocation may use; logged search service calls are renamed to cortex_search"""
+    names = {spec['name'] for spec in tool_specs}
+    if any(spec.get('type') == 'cortex_search' for spec in tool_specs):
+        names.add('cortex_search')
+    return frozenset(names)
+
+BULK_OPERATIONS = ["Rename tool", "Remove tool", "Renumber tool_sequence", "Regex replace in outputs", "Delete matching records"]
+BULK_PREDICATES = ["Uses tool", "No tools", "Input query matches", "Ground truth output matches"]
+BULK_UNDO_LIMIT = 10
+
+def _explode_invocations(df: pd.DataFrame) -> pd.DataFrame:
+    """One row per tool invocation (tool_name, tool_sequence), indexed by dataset position"""
+    invocations = df['EXPECTED_TOOLS'].str.get('ground_truth_invocations')
+    invocations = invocations[invocations.str.len() > 0].explode()
+    return pd.DataFrame({
+        'tool_name': invocations.str.get('tool_name').astype(object),
+        'tool_sequence': invocations.str.get('tool_sequence')
+    }, index=invocations.index)
+
+def _values_by_row(values: pd.Series) -> Dict[int, List[Any]]:
+    """Split an exploded series (sorted by position) back into one list per position"""
+    if values.empty:
+        return {}
+    positions = values.index.to_numpy()
+    boundaries = (positions[1:] != positions[:-1]).nonzero()[0] + 1
+    starts = [0, *boundaries]
+    ends = [*boundaries, len(positions)]
+    items = values.tolist()
+    return {positions[start]: items[start:end] for start, end in zip(starts, ends)}
+
+def _match_tool_names(names: pd.Series, tool_pattern: str, regex: bool) -> pd.Series:
+    if regex:
+        # astype(str) would turn a missing tool name into 'None'; missing names never match
+        return names.notna() & names.astype(str).str.contains(tool_pattern, regex=True, na=False)
+    return names == tool_pattern
+
+def _rows_with_tool(df: pd.DataFrame, tools: pd.DataFrame, tool_pattern: str, regex: bool) -> pd.Index:
+    matched = _match_tool_names(tools['tool_name'], tool_pattern, regex)
+    return df.index[df.index.isin(tools.index[matched])]
+
+def _renumber_invocations(invocations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{**tool, 'tool_sequence': idx + 1} for idx, tool in enumerate(invocations)]
+
+def _replace_invocations(expected_tools: Any, invocations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    base = expected_tools if isinstance(expected_tools, dict) else {}
+    return {**base, 'ground_truth_invocations': invocations}
+
+def plan_bulk_operation(df: pd.DataFrame, operation: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute a bulk change over EXPECTED_TOOLS without applying it.
+    Returns the affected positions and, for updates, their new EXPECTED_TOOLS values."""
+    tools = _explode_invocations(df)
+    regex = bool(params.get('regex'))
+
+    if operation == "Rename tool":
+        positions = _rows_with_tool(df, tools, params['tool'], regex)
+        affected = tools[tools.index.isin(positions)]
+        if regex:
+            new_names = affected['tool_name'].astype(str).str.replace(params['tool'], params['new_name'], regex=True)
+        else:
+            new_names = affected['tool_name'].where(affected['tool_name'] != params['tool'], params['new_name'])
+        names_by_row = _values_by_row(new_names)
+        new_values = pd.Series([
+            _replace_invocations(expected_tools, [
+                # Invocations without a tool name keep it missing instead of getting 'None' or NaN
+                {**tool, 'tool_name': name} if isinstance(tool, dict) and pd.notna(name) else tool
+                for tool, name in zip(expected_tools['ground_truth_invocations'], names_by_row[pos])
+            ])
+            for pos, expected_tools in df.loc[positions, 'EXPECTED_TOOLS'].items()
+        ], index=positions, dtype=object)
+
+    elif operation == "Remove tool":
+        positions = _rows_with_tool(df, tools, params['tool'], regex)
+        affected = tools[tools.index.isin(positions)]
+        keep_by_row = _values_by_row(~_match_tool_names(affected['tool_name'], params['tool'], regex))
+        new_values = pd.Series([
+            _replace_invocations(expected_tools, _renumber_invocations([
+                tool
+                for tool, keep in zip(expected_tools['ground_truth_invocations'], keep_by_row[pos])
+                if keep
+            ]))
+            for pos, expected_tools in df.loc[positions, 'EXPECTED_TOOLS'].items()
+        ], index=positions, dtype=object)
+
+    elif operation == "Renumber tool_sequence":
+        expected_sequence = tools.groupby(level=0).cumcount() + 1
+        out_of_order = tools['tool_sequence'].ne(expected_sequence)
+        positions = df.index[df.index.isin(tools.index[out_of_order])]
+        new_values = pd.Series([
+            _replace_invocations(expected_tools, _renumber_invocations(expected_tools['ground_truth_invocations']))
+            for expected_tools in df.loc[positions, 'EXPECTED_TOOLS']
+        ], index=positions, dtype=object)
+
+    elif operation == "Regex replace in outputs":
+        outputs = df['EXPECTED_TOOLS'].str.get('ground_truth_output')
+        outputs = outputs[outputs.notna()].astype(str)
+        replaced = outputs.str.replace(params['pattern'], params['replacement'], regex=True)
+        changed = replaced[replaced != outputs]
+        positions = changed.index
+        new_values = pd.Series([
+            {**expected_tools, 'ground_truth_output': output}
+            for expected_tools, output in zip(df.loc[positions, 'EXPECTED_TOOLS'], changed)
+        ], index=positions, dtype=object)
+
+    elif operation == "Delete matching records":
+        predicate = params['predicate']
+        if predicate == "Uses tool":
+            positions = _rows_with_tool(df, tools, params['value'], regex)
+        elif predicate == "No tools":
+            positions = df.index[~df.index.isin(tools.index)]
+        elif predicate == "Input query matches":
+            queries = df['INPUT_QUERY']
+            positions = df.index[queries.notna() & queries.astype(str).str.contains(params['value'], regex=True, na=False)]
+        else:
+            outputs = df['EXPECTED_TOOLS'].str.get('ground_truth_output')
+            positions = df.index[outputs.notna() & outputs.astype(str).str.contains(params['value'], regex=True, na=False)]
+        new_values = None
+
+    else:
+        raise ValueError(f"Unknown bulk operation: {operation}")
+
+    return {'operation': operation, 'positions': positions, 'new_values': new_values}
+
+def plan_dataset_bulk_operation(operation: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """plan_bulk_operation over the whole dataset, one chunk at a time when it is spilled"""
+    if not st.session_state.dataset_spill:
+        return plan_bulk_operation(st.session_state.dataset, operation, params)
+    plans = [plan_bulk_operation(chunk, operation, params)
+             for chunk in iter_dataset_chunks(columns=['INPUT_QUERY', 'EXPECTED_TOOLS'])]
+    positions = pd.Index([position for plan in plans for position in plan['positions']], dtype='int64')
+    new_values = None
+    if plans and plans[0]['new_values'] is not None:
+        new_values = pd.Series([value for plan in plans for value in plan['new_values']], index=positions, dtype=object)
+    return {'operation': operation, 'positions': positions, 'new_values': new_values}
+
+def _patch_record_index(entry: Dict[str, Any]) -> None:
+    """Re-index only the rows a bulk journal entry changed, once it has been applied to the dataset"""
+    index = st.session_state.record_index
+    if index is None:
+        return
+    if entry['op'] == 'delete':
+        index_remove_records(index, entry['positions'])
+    elif entry['op'] == 'insert':
+        index_insert_records(index, entry['positions'], pd.DataFrame(entry['records']))
+    else:
+        queries = get_dataset_rows(entry['positions'], ['INPUT_QUERY'])['INPUT_QUERY']
+        for position, input_query, expected_tools in zip(entry['positions'], queries, entry['values']):
+            index_update_record(index, position, input_query, expected_tools)
+
+def apply_bulk_operation(plan: Dict[str, Any]) -> int:
+    """Apply a planned bulk change to the dataset and push it onto the undo stack"""
+    positions = plan['positions']
+    if len(positions) == 0:
+        return 0
+    position_list = [int(position) for position in positions]
+
+    # Only the affected rows are read, also when the dataset is spilled
+    if plan['new_values'] is None:
+        undo_entry = {'operation': plan['operation'], 'positions': positions, 'rows': get_dataset_rows(position_list)}
+        entry = {'op': 'delete', 'positions': position_list}
+    else:
+        old_values = get_dataset_rows(position_list, ['EXPECTED_TOOLS'])['EXPECTED_TOOLS']
+        undo_entry = {'operation': plan['operation'], 'positions': positions, 'old_values': old_values}
+        entry = {'op': 'set_tools', 'positions': position_list, 'values': list(plan['new_values'])}
+    st.session_state.bulk_undo_stack = (st.session_state.bulk_undo_stack + [undo_entry])[-BULK_UNDO_LIMIT:]
+    _update_dataset(entry)
+    _journal(entry)
+    _patch_record_index(entry)
+    return len(positions)
+
+def undo_bulk_operation() -> Optional[str]:
+    """Revert the most recent bulk change; returns its operation name"""
+    if not st.session_state.bulk_undo_stack:
+        return None
+    undo_entry = st.session_state.bulk_undo_stack.pop()
+    position_list = [int(position) for position in undo_entry['positions']]
+
+    if 'rows' in undo_entry:
+        entry = {'op': 'insert', 'positions': position_list, 'records': undo_entry['rows'].to_dict('records')}
+    else:
+        entry = {'op': 'set_tools', 'positions': position_list, 'values': list(undo_entry['old_values'])}
+    _update_dataset(entry)
+    _journal(entry)
+    _patch_record_index(entry)
+
+    return undo_entry['operation']
+
+# GET_AI_EVALUATION_DATA returns one row per evaluated record and metric; these are the columns a comparison reads
+EVAL_INPUT_COLUMN = "INPUT"
+EVAL_METRIC_COLUMN = "METRIC_NAME"
+EVAL_SCORE_COLUMN = "EVAL_AGG_SCORE"
+EVAL_CACHE_DIR = os.getenv("EVALSET_EVAL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "evalset_eval_runs"))
+COMPARE_OUTCOMES = ["Regressed", "Unchanged", "Improved"]
+NO_TOOLS = "(no tools)"
+
+def _eval_run_source(agent_name: str, agent_db_name: str, agent_schema_name: str, run_name: str) -> str:
+    run_name = run_name.replace("'", "''")
+    return f"""TABLE(SNOWFLAKE.LOCAL.GET_AI_EVALUATION_DATA(
+    '{agent_db_name}', 
+    '{agent_schema_name}', 
+    '{agent_name}', 
+    'CORTEX AGENT',
+    '{run_name}'))"""
+
+def build_eval_run_query(agent_name: str, agent_db_name: str, agent_schema_name: str, run_name: str) -> str:
+    """Per-record score of every metric in one evaluation run, averaged over repeats of the same query"""
+    return f"""
+SELECT TRIM({EVAL_INPUT_COLUMN}::VARCHAR) AS INPUT_QUERY,
+    {EVAL_METRIC_COLUMN}::VARCHAR AS METRIC,
+    AVG({EVAL_SCORE_COLUMN}::FLOAT) AS SCORE
+FROM {_eval_run_source(agent_name, agent_db_name, agent_schema_name, run_name)}
+WHERE {EVAL_SCORE_COLUMN} IS NOT NULL
+GROUP BY 1, 2;"""
+
+def query_hashes(queries: pd.Series) -> pd.Series:
+    """Hash of each INPUT_QUERY, the key evaluation runs and dataset records are joined on"""
+    return pd.Series(pd.util.hash_array(queries.fillna('').astype(str).str.strip().to_numpy(dtype=object)),
+                     index=queries.index)
+
+def _eval_run_cache_path(agent_fq_name: str, run_name: str) -> str:
+    key = hashlib.sha256(f"{agent_fq_name}\0{run_name}".encode()).hexdigest()[:32]
+    return os.path.join(EVAL_CACHE_DIR, f"run_{key}.parquet")
+
+def load_eval_run(session, agent: Dict[str, str], run_name: str, refresh: bool = False) -> pd.DataFrame:
+    """One run's scores (QUERY_HASH, INPUT_QUERY, METRIC, SCORE), fetched once and then read from a local Parquet file.
+
+    A cached run is read without querying Snowflake, so a re-scored run needs refresh=True;
+    attrs['fetched_at'] holds when it was fetched."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    source = (agent['name'], agent['database_name'], agent['schema_name'], run_name)
+    path = _eval_run_cache_path(f"{agent['database_name']}.{agent['schema_name']}.{agent['name']}", run_name)
+    if refresh or not os.path.exists(path):
+        table = fetch_arrow(session, build_eval_run_query(*source))
+        if table is None or table.num_rows == 0:
+            return pd.DataFrame(columns=['QUERY_HASH', 'INPUT_QUERY', 'METRIC', 'SCORE'])
+        table = table.append_column(
+            'QUERY_HASH', pa.array(query_hashes(table.column('INPUT_QUERY').to_pandas()).to_numpy())
+        )
+        os.makedirs(EVAL_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        pq.write_table(table.select(['QUERY_HASH', 'INPUT_QUERY', 'METRIC', 'SCORE']), tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+    run = pd.read_parquet(path)
+    run.attrs['fetched_at'] = datetime.fromtimestamp(os.path.getmtime(path))
+    return run
+
+def record_tools(df: pd.DataFrame) -> pd.DataFrame:
+    """(QUERY_HASH, TOOL_NAME) for each tool a record's EXPECTED_TOOLS invokes; records without tools get NO_TOOLS"""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['QUERY_HASH', 'TOOL_NAME'])
+    df = df.reset_index(drop=True)
+    hashes = query_hashes(df['INPUT_QUERY'])
+    tools = _explode_invocations(df)
+    with_tools = pd.DataFrame({'QUERY_HASH': hashes.loc[tools.index].to_numpy(),
+                               'TOOL_NAME': tools['tool_name'].fillna('').astype(str).to_numpy()})
+    without_tools = pd.DataFrame({'QUERY_HASH': hashes[~hashes.index.isin(tools.index)].to_numpy(),
+                                  'TOOL_NAME': NO_TOOLS})
+    return pd.concat([with_tools, without_tools], ignore_index=True).drop_duplicates(ignore_index=True)
+
+def dataset_record_tools() -> pd.DataFrame:
+    """record_tools of the app's dataset, read a chunk at a time so a spilled dataset is never loaded whole"""
+    chunks = [record_tools(chunk) for chunk in iter_dataset_chunks(columns=['INPUT_QUERY', 'EXPECTED_TOOLS'])]
+    if not chunks:
+        return record_tools(None)
+    return pd.concat(chunks, ignore_index=True).drop_duplicates(ignore_index=True)
+
+def compare_eval_runs(base: pd.DataFrame, improved: pd.DataFrame, tolerance: float = 0.0) -> pd.DataFrame:
+    """Join two runs on (QUERY_HASH, METRIC); deltas within tolerance of zero count as unchanged"""
+    import numpy as np
+
+    compared = base.merge(improved[['QUERY_HASH', 'METRIC', 'SCORE']], on=['QUERY_HASH', 'METRIC'],
+                          suffixes=('_BASE', '_IMPROVED'))
+    delta = compared['SCORE_IMPROVED'].to_numpy() - compared['SCORE_BASE'].to_numpy()
+    compared['DELTA'] = delta
+    compared['OUTCOME'] = pd.Categorical.from_codes(
+        np.select([delta < -tolerance, delta > tolerance], [0, 2], 1), categories=COMPARE_OUTCOMES
+    )
+    return compared
+
+def _outcome_summary(compared: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    outcomes = compared.assign(IMPROVED=compared['OUTCOME'] == "Improved",
+                               REGRESSED=compared['OUTCOME'] == "Regressed")
+    return outcomes.groupby(keys, sort=False).agg(
+        RECORDS=('DELTA', 'size'),
+        BASE_MEAN=('SCORE_BASE', 'mean'),
+        IMPROVED_MEAN=('SCORE_IMPROVED', 'mean'),
+        MEAN_DELTA=('DELTA', 'mean'),
+        IMPROVED=('IMPROVED', 'sum'),
+        REGRESSED=('REGRESSED', 'sum'),
+    ).reset_index()
+
+def summarize_comparison(compared: pd.DataFrame) -> pd.DataFrame:
+    """Per metric: mean scores of both runs, mean delta, and win/loss counts"""
+    summary = _outcome_summary(compared, ['METRIC'])
+    summary['UNCHANGED'] = summary['RECORDS'] - summary['IMPROVED'] - summary['REGRESSED']
+    return summary.sort_values('METRIC', ignore_index=True)
+
+def tool_regressions(compared: pd.DataFrame, tools: pd.DataFrame) -> pd.DataFrame:
+    """Per tool and metric over the records whose ground truth uses the tool, most regressions first"""
+    summary = _outcome_summary(compared.merge(tools, on='QUERY_HASH'), ['TOOL_NAME', 'METRIC'])
+    summary['REGRESSION_RATE'] = summary['REGRESSED'] / summary['RECORDS']
+    return summary.sort_values(['REGRESSED', 'MEAN_DELTA'], ascending=[False, True], ignore_index=True)
+
+def get_comparison(tolerance: float) -> pd.DataFrame:
+    """The joined runs, recomputed locally only when the runs or the tolerance change"""
+    comparison = st.session_state.eval_comparison
+    if comparison.get('tolerance') != tolerance:
+        comparison['compared'] = compare_eval_runs(comparison['base'], comparison['improved'], tolerance)
+        comparison['tolerance'] = tolerance
+    return comparison['compared']
+
+st.title("🔍 AI evaluation dataset builder")
+st.caption("Build evaluation datasets from agent logs and manual entries")
+
+# Add custom CSS to maximize width - more aggressive overrides
+st.markdown("""
+    <style>
+    /* Force full width for main content */
+    .main .block-container {
+        max-width: 95% !important;
+        padding-left: 2rem !important;
+        padding-right: 2rem !important;
+    }
+    
+    /* Remove tab panel padding */
+    .stTabs [data-baseweb="tab-panel"] {
+        padding: 0 !important;
+    }
+    
+    /* Force dataframe to use full width */
+    div[data-testid="stDataFrame"] {
+        width: 100% !important;
+    }
+    
+    div[data-testid="stDataFrame"] > div {
+        width: 100% !important;
+    }
+    
+    /* Remove padding from elements containing dataframes */
+    div[data-testid="column"] {
+        padding: 0 !important;
+    }
+    </style>
+""", unsafe_allow_html=True)
+
+with st.sidebar:
+    st.header("Configuration")
+    
+    # Filled in after the active tab renders, since tabs connect on demand
+    connection_placeholder = st.empty()
+    
+    st.text_input(
+        "Agent scope",
+        key="agent_catalog_scope",
+        placeholder="e.g. MY_DB, OTHER_DB.AGENTS",
+        help="Comma-separated databases or DATABASE.SCHEMA to list agents from. Leave empty to list every agent in the account."
+    )
+    
+    st.divider()
+    
+    if has_dataset():
+        st.metric("Records in dataset", dataset_len())
+    else:
+        st.caption("No dataset loaded yet")
+    
+    if st.session_state.dataset_spill:
+        st.caption(f"💾 Spilled to disk: {st.session_state.dataset_spill['disk_bytes'] / 1024 / 1024:.1f} MB, "
+                   f"{st.session_state.dataset_memory_bytes / 1024 / 1024:.1f} MB in memory "
+                   f"(budget {MEMORY_BUDGET_MB:.0f} MB per session)")
+    else:
+        st.caption(f"🧠 Memory: {st.session_state.dataset_memory_bytes / 1024 / 1024:.1f} MB "
+                   f"of {MEMORY_BUDGET_MB:.0f} MB session budget")
+    
+    st.divider()
+    
+    if st.button("🔄 Reset dataset", help="Clear dataset and start over. The cleared dataset can be restored until the next reset."):
+        archive_journal()
+        set_dataset(None)
+        st.session_state.query_executed = False
+        st.rerun()
+
+    if has_archived_journal():
+        if st.button("↩️ Restore previous dataset", help="Bring back the dataset cleared by the last reset"):
+            restored = restore_from_journal(archive=True)
+            st.toast(f"Restored {restored} records", icon="↩️")
+            st.rerun()
+
+    st.caption(f"💾 Autosaved to workspace `{st.session_state.workspace_id}`. Bookmark this URL to come back to it.")
+# Create tab selection with navigation buttons at the top
+tab_names = ["📥 1. Load Data", "➕ 2. Add records", "✏️ 3. Review & edit", "📤 4. Export", "📊 5. Compare runs"]
+
+# Navigation bar with buttons and tab selector
+col_prev, col_tabs, col_next = st.columns([1, 8, 1])
+
+with col_prev:
+    if st.session_state.active_tab > 0:
+        if st.button("← Back", key="nav_prev", use_container_width=True):
+            st.session_state.active_tab -= 1
+            st.rerun()
+
+with col_tabs:
+    selected_tab_name = st.radio(
+        "Navigation",
+        tab_names,
+        index=st.session_state.active_tab,
+        horizontal=True,
+        label_visibility="collapsed",
+        key="tab_selector"
+    )
+    # Update active tab based on radio selection
+    st.session_state.active_tab = tab_names.index(selected_tab_name)
+
+with col_next:
+    if st.session_state.active_tab < len(tab_names) - 1:
+        if st.button("Next →", key="nav_next", type="primary", use_container_width=True):
+            st.session_state.active_tab += 1
+            st.rerun()
+
+st.divider()
+
+if 'journal_restored' not in st.session_state:
+    # The shell above is already on screen; replay the autosave before any tab reads the dataset
+    with st.spinner("Restoring autosaved dataset..."):
+        st.session_state.journal_restored = restore_from_journal()
+    if st.session_state.journal_restored:
+        st.toast(f"Restored {st.session_state.journal_restored} records from autosave", icon="💾")
+        # Rerun so the sidebar counts reflect the restored dataset
+        st.rerun()
+
+# Render content based on active tab
+if st.session_state.active_tab == 0:
+    session = get_session()
+    if session is None:
+        render_connection_help()
+    else:
+        st.header("Load Data")
         st.caption("Load data from agent logs or existing tables")
         
         # Put data source and load mode side by side with stacked radio buttons
@@ -506,13 +2437,27 @@ if session:
             
             col1, col2 = st.columns([2, 1])
             with col1:
-                agent_df = get_agent_list(session)
-                agent_list = sorted(agent_df["name"].dropna().astype(str).tolist())
-                if agent_list:
-                    agent_name = st.selectbox("Select your agent name", agent_list, key="agent_select")
-                    agent_db_name = agent_df["database_name"][agent_df["name"]==agent_name].values[0]
-                    agent_schema_name = agent_df["schema_name"][agent_df["name"]==agent_name].values[0]
-                    agent_fq_name = agent_df['"fully_qualified_agent_name"'][agent_df["name"]==agent_name].values[0]
+                try:
+                    agent_catalog, catalog_fetched_at = get_agent_catalog(
+                        session,
+                        parse_agent_scope(st.session_state.agent_catalog_scope),
+                        force_refresh=st.session_state.pop("agent_catalog_force_refresh", False)
+                    )
+                except Exception as e:
+                    st.error(f"Failed to load agents: {e}")
+                    agent_catalog, catalog_fetched_at = {}, None
+
+                if agent_catalog:
+                    agent_fq_name = st.selectbox(
+                        "Select your agent name",
+                        sorted(agent_catalog, key=lambda fq_name: (agent_catalog[fq_name]["name"], fq_name)),
+                        format_func=lambda fq_name: f"{agent_catalog[fq_name]['name']} ({fq_name.rsplit('.', 1)[0]})",
+                        key="agent_select"
+                    )
+                    agent = agent_catalog[agent_fq_name]
+                    agent_name = agent["name"]
+                    agent_db_name = agent["database_name"]
+                    agent_schema_name = agent["schema_name"]
                     
                     # Store in session state for use in other tabs
                     st.session_state.agent_fq_name = agent_fq_name
@@ -524,15 +2469,43 @@ if session:
                     agent_schema_name = None
                     agent_fq_name = None
             
+                if catalog_fetched_at:
+                    col_age, col_refresh = st.columns([3, 1])
+                    col_age.caption(f"Agent list cached {int(time.time() - catalog_fetched_at)}s ago")
+                    if col_refresh.button("🔄 Refresh", key="agent_catalog_refresh"):
+                        st.session_state.agent_catalog_force_refresh = True
+                        st.rerun()
+        
             with col2:
                 record_id = st.text_input("Record ID (optional)", value="", key="record_id_input")
             
-            user_feedback = st.selectbox(
-                "Filter by user feedback",
-                [None, "Positive Feedback Only", "Negative Feedback Only", "Any Feedback"],
-                index=0,
-                key="feedback_filter"
-            )
+            col_feedback, col_history, col_workers = st.columns([2, 1, 1])
+            with col_feedback:
+                user_feedback = st.selectbox(
+                    "Filter by user feedback",
+                    [None, "Positive Feedback Only", "Negative Feedback Only", "Any Feedback"],
+                    index=0,
+                    key="feedback_filter"
+                )
+            with col_history:
+                history_turns = st.number_input(
+                    "Previous turns as context",
+                    min_value=0,
+                    max_value=MAX_HISTORY_TURNS,
+                    value=0,
+                    help="Thread mode: each record carries up to this many earlier turns of its conversation. "
+                         "0 treats every record as a single turn.",
+                    key="history_turns"
+                )
+            with col_workers:
+                postprocess_workers = st.number_input(
+                    "Postprocessing workers",
+                    min_value=0,
+                    max_value=os.cpu_count() or 1,
+                    value=min(POSTPROCESS_WORKERS, os.cpu_count() or 1),
+                    help=f"Processes used to clean pulls of {PARALLEL_MIN_ROWS:,}+ records. 0 or 1 runs in the app process.",
+                    key="postprocess_workers"
+                )
             
             if st.button("📥 Load from agent logs", type="primary", disabled=not agent_name):
                 with st.spinner("Querying agent logs..."):
@@ -542,21 +2515,72 @@ if session:
                             agent_db_name = agent_db_name,
                             agent_schema_name = agent_schema_name,
                             record_id=record_id.strip() if record_id else None,
-                            user_feedback=user_feedback
+                            user_feedback=user_feedback,
+                            history_turns=int(history_turns)
                         )
-                        df = execute_query_and_postprocess(session, query)
+                        df = execute_query_and_postprocess(session, query, workers=int(postprocess_workers))
+                        dataset_columns = ['INPUT_QUERY', 'EXPECTED_TOOLS', *(['CONVERSATION_HISTORY'] if history_turns else []),
+                                           *CONSENSUS_COLUMNS]
+                        st.session_state.log_latency = df[[
+                            'RECORD_ID', 'REASONING_MODEL', 'LATENCY_MS',
+                            *[f'{span_type.upper()}_MS' for span_type in SPAN_TYPES]
+                        ]].reset_index(drop=True)
                         
-                        if load_mode == "Replace" or st.session_state.dataset is None or len(st.session_state.dataset) == 0:
-                            st.session_state.dataset = df[['INPUT_QUERY', 'EXPECTED_TOOLS']].copy()
-                            st.toast(f"✅ Loaded {len(df)} records (replaced existing)", icon="✅")
+                        runs = int(df['RUN_COUNT'].sum())
+                        if load_mode == "Replace" or not has_dataset():
+                            set_dataset(df[dataset_columns].reset_index(drop=True))
+                            st.toast(f"✅ Loaded {len(df)} consensus records from {runs} runs (replaced existing)", icon="✅")
                         else:  # Append mode
-                            new_records = df[['INPUT_QUERY', 'EXPECTED_TOOLS']].copy()
-                            st.session_state.dataset = pd.concat([st.session_state.dataset, new_records], ignore_index=True)
-                            st.toast(f"✅ Added {len(df)} records to dataset", icon="✅")
+                            append_to_dataset(df[dataset_columns].copy())
+                            st.toast(f"✅ Added {len(df)} consensus records from {runs} runs to dataset", icon="✅")
                         
                         st.rerun()
                     except Exception as e:
                         st.error(f"Error loading logs: {e}")
+
+            with st.expander("⏱️ Latency breakdown", expanded=False):
+                st.caption("Per-span durations in milliseconds. Percentiles are computed in Snowflake over all logged records.")
+                latency_group = st.radio("Group by", list(LATENCY_GROUPINGS), horizontal=True, key="latency_group_by")
+                if st.button("Compute latency percentiles", disabled=not agent_db_name, key="latency_compute"):
+                    with st.spinner("Computing latency percentiles..."):
+                        try:
+                            latency_query = build_latency_query(agent_name, agent_db_name, agent_schema_name, latency_group)
+                            st.dataframe(get_latency_summary(session, latency_query), use_container_width=True, hide_index=True)
+                        except Exception as e:
+                            st.error(f"Error computing latency percentiles: {e}")
+
+                if st.session_state.log_latency is not None:
+                    st.markdown("**Last loaded records**")
+                    st.dataframe(st.session_state.log_latency, use_container_width=True, hide_index=True, height=250)
+
+            with st.expander("🔍 Query plan", expanded=False):
+                st.caption("Compiles the load query without running it. With a feedback filter, compares the "
+                           "semi-join on feedback records against filtering after aggregation. The events table "
+                           "function is read in full either way; its partition counts are blank because Snowflake "
+                           "reports none for it.")
+                if st.button("Explain load query", disabled=not agent_db_name, key="explain_load_query"):
+                    try:
+                        plans = {"Semi-join on feedback records (current)": True}
+                        if user_feedback:
+                            plans["HAVING after aggregation"] = False
+                        summaries = []
+                        for label, pushdown in plans.items():
+                            plan_query = build_query(
+                                agent_name=agent_name,
+                                agent_db_name=agent_db_name,
+                                agent_schema_name=agent_schema_name,
+                                record_id=record_id.strip() if record_id else None,
+                                user_feedback=user_feedback,
+                                feedback_pushdown=pushdown
+                            )
+                            plan = explain_query(session, plan_query)
+                            summaries.append({'plan': label, **summarize_plan(plan)})
+                            if pushdown:
+                                current_plan = plan
+                        st.dataframe(pd.DataFrame(summaries), use_container_width=True, hide_index=True)
+                        st.dataframe(current_plan, use_container_width=True, hide_index=True, height=300)
+                    except Exception as e:
+                        st.error(f"Error explaining query: {e}")
         
         else:  # From Existing Table
             st.subheader("📊 Load from existing Snowflake table")
@@ -568,32 +2592,31 @@ if session:
             
             st.markdown("""
             **Requirements:**
-            - Table must exist in your Snowflake account
+            - Tables must exist in your Snowflake account
             - Required columns: `INPUT_QUERY` (VARCHAR), `EXPECTED_TOOLS` (VARIANT)
             - Use format: `DATABASE.SCHEMA.TABLE` or just `TABLE` (uses current context)
+            - Separate several tables with commas; `*` in the table name matches a pattern, e.g. `EVAL_DB.TEAMS.EVALSET_*`
+            - Records repeated across tables are loaded once
             """)
             
             table_input = st.text_input(
-                "Table name",
-                placeholder="e.g., MY_DATABASE.MY_SCHEMA.EVAL_DATASET or EVAL_DATASET",
+                "Table names",
+                placeholder="e.g., MY_DATABASE.MY_SCHEMA.EVAL_DATASET, EVAL_DB.TEAMS.EVALSET_*",
                 key="load_table_input",
-                help="Enter fully qualified table name or just table name to use current database/schema"
+                help="Fully qualified table names or patterns, comma-separated; bare names use the current database/schema"
             )
             
             if st.button("📊 Load from table", type="primary", disabled=not table_input):
                 with st.spinner(f"Loading from {table_input}..."):
                     try:
-                        loaded_df = load_from_table(session, table_input.strip())
+                        loaded_df = load_from_tables(session, table_input)
                         
                         if not loaded_df.empty:
-                            if load_mode == "Replace" or st.session_state.dataset is None:
-                                st.session_state.dataset = loaded_df
+                            if load_mode == "Replace" or not has_dataset():
+                                set_dataset(loaded_df)
                                 st.toast(f"✅ Loaded {len(loaded_df)} records (replaced existing)", icon="✅")
                             else:  # Append mode
-                                if st.session_state.dataset is None:
-                                    st.session_state.dataset = loaded_df
-                                else:
-                                    st.session_state.dataset = pd.concat([st.session_state.dataset, loaded_df], ignore_index=True)
+                                append_to_dataset(loaded_df)
                                 st.toast(f"✅ Added {len(loaded_df)} records to dataset", icon="✅")
                             st.rerun()
                         else:
@@ -606,205 +2629,262 @@ if session:
         st.divider()
         
         # Data preview section - outside any columns for full width
-        if st.session_state.dataset is not None and len(st.session_state.dataset) > 0:
+        if has_dataset():
             st.subheader("📊 Current Dataset Preview")
-            st.success(f"✅ {len(st.session_state.dataset)} records loaded")
-            
-            # Format EXPECTED_TOOLS as readable JSON strings for display
-            display_df = st.session_state.dataset.copy()
-            display_df['EXPECTED_TOOLS'] = display_df['EXPECTED_TOOLS'].apply(
-                lambda x: json.dumps(x, indent=2) if pd.notna(x) else ''
-            )
+            st.success(f"✅ {dataset_len()} records loaded")
             
             # Use container to ensure full width
             with st.container():
-                st.dataframe(
-                    display_df, 
-                    use_container_width=True, 
-                    hide_index=True, 
-                    height=500,
-                    column_config={
-                        "INPUT_QUERY": st.column_config.TextColumn(
-                            "Input Query",
-                            width="medium",
-                        ),
-                        "EXPECTED_TOOLS": st.column_config.TextColumn(
-                            "Expected Tools (JSON)",
-                            width="large",
-                        )
-                    }
-                )
+                render_dataset_preview(height=500, key="load_preview_page")
         else:
             st.info("💡 No records loaded yet. Choose a data source above and load data to get started.")
     
-    elif st.session_state.active_tab == 1:
-        st.header("Add evaluation records")
-        st.caption("Manually create evaluation records using the form below")
+elif st.session_state.active_tab == 1:
+    st.header("Add evaluation records")
+    st.caption("Manually create evaluation records using the form below")
+    
+    if has_dataset():
+        st.success(f"✅ Current dataset: {dataset_len()} records")
+    
+    with st.form("add_record_form", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            input_query = st.text_area(
+                "Input query",
+                placeholder="Enter the test query for your agent...",
+                height=150,
+                key="add_input_query"
+            )
         
-        if st.session_state.dataset is not None and len(st.session_state.dataset) > 0:
-            st.success(f"✅ Current dataset: {len(st.session_state.dataset)} records")
+        with col2:
+            agent_response = st.text_area(
+                "Expected agent response",
+                placeholder="Enter the expected response from the agent...",
+                height=150,
+                key="add_agent_response"
+            )
         
-        with st.form("add_record_form", clear_on_submit=True):
-            col1, col2 = st.columns(2)
+        st.divider()
+        st.markdown("**Tool invocations**")
+        st.caption("Define the expected sequence of tool calls")
+        
+        num_tools = st.number_input("Number of tools", min_value=0, max_value=10, value=1, step=1, key="add_num_tools")
+        
+        tools = []
+        for i in range(int(num_tools)):
+            st.markdown(f"**Tool {i+1}**")
+            col1, col2 = st.columns([2, 3])
             
             with col1:
-                input_query = st.text_area(
-                    "Input query",
-                    placeholder="Enter the test query for your agent...",
-                    height=150,
-                    key="add_input_query"
-                )
-            
-            with col2:
-                agent_response = st.text_area(
-                    "Expected agent response",
-                    placeholder="Enter the expected response from the agent...",
-                    height=150,
-                    key="add_agent_response"
-                )
-            
-            st.divider()
-            st.markdown("**Tool invocations**")
-            st.caption("Define the expected sequence of tool calls")
-            
-            num_tools = st.number_input("Number of tools", min_value=0, max_value=10, value=1, step=1, key="add_num_tools")
-            
-            tools = []
-            for i in range(int(num_tools)):
-                st.markdown(f"**Tool {i+1}**")
-                col1, col2 = st.columns([2, 3])
-                
-                with col1:
-                    # Check if agent info is available to show dropdown, otherwise text input
-                    if st.session_state.agent_fq_name:
-                        try:
-                            session.sql(f'DESCRIBE AGENT {st.session_state.agent_fq_name}').collect()
-                            agent_desc_df = session.sql('SELECT * FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))').to_pandas()
-                            agent_tool_list = [i['tool_spec']['name'] for i in json.loads(agent_desc_df['agent_spec'][0])['tools']]
-
-                            tool_name = st.selectbox(
-                                "Tool name",
-                                agent_tool_list,
-                                key=f"add_tool_name_{i}",
-                            )
-                        except Exception:
-                            # Fallback to text input if agent description fails
-                            tool_name = st.text_input(
-                                "Tool name",
-                                key=f"add_tool_name_{i}",
-                                placeholder="e.g., cortex_search, SALES_SEMANTIC_MODEL"
-                            )
-                    else:
-                        # No agent info available, use text input
+                # Check if agent info is available to show dropdown, otherwise text input
+                if st.session_state.agent_fq_name:
+                    try:
+                        agent_tool_list = [spec['name'] for spec in get_agent_tool_specs(get_session(), st.session_state.agent_fq_name)]
+
+                        tool_name = st.selectbox(
+                            "Tool name",
+                            agent_tool_list,
+                            key=f"add_tool_name_{i}",
+                        )
+                    except Exception:
+                        # Fallback to text input if agent description fails
                         tool_name = st.text_input(
                             "Tool name",
                             key=f"add_tool_name_{i}",
                             placeholder="e.g., cortex_search, SALES_SEMANTIC_MODEL"
                         )
-                
-                with col2:
-                    tool_output_type = st.selectbox(
-                        "Tool output type",
-                        ["SQL", "Search results", "Custom"],
-                        key=f"add_tool_output_type_{i}"
+                else:
+                    # No agent info available, use text input
+                    tool_name = st.text_input(
+                        "Tool name",
+                        key=f"add_tool_name_{i}",
+                        placeholder="e.g., cortex_search, SALES_SEMANTIC_MODEL"
                     )
-                
-                tool_output_value = st.text_area(
-                    "Tool output",
-                    key=f"add_tool_output_{i}",
-                    height=80,
-                    placeholder="Enter the expected tool output..."
+            
+            with col2:
+                tool_output_type = st.selectbox(
+                    "Tool output type",
+                    ["SQL", "Search results", "Custom"],
+                    key=f"add_tool_output_type_{i}"
                 )
-                
-                if tool_name:
-                    tool_output_dict = {}
-                    if tool_output_type == "SQL":
-                        tool_output_dict["SQL"] = tool_output_value
-                    elif tool_output_type == "Search results":
-                        tool_output_dict["search results"] = tool_output_value
-                    else:
-                        tool_output_dict["CUSTOM_TOOL_RESULT"] = tool_output_value
-                    
-                    tools.append({
-                        "tool_sequence": i + 1,
-                        "tool_name": tool_name,
-                        "tool_output": tool_output_dict
-                    })
-                
-                if i < int(num_tools) - 1:
-                    st.divider()
             
-            submit_button = st.form_submit_button("➕ Add record to dataset", type="primary")
-        
-        if submit_button:
-            if not input_query or not agent_response:
-                st.error("❌ Please fill in both input query and expected agent response")
-            else:
-                record = create_manual_record(input_query, agent_response, tools)
-                new_row = pd.DataFrame([record])
-                
-                if st.session_state.dataset is None or len(st.session_state.dataset) == 0:
-                    st.session_state.dataset = new_row
+            tool_output_value = st.text_area(
+                "Tool output",
+                key=f"add_tool_output_{i}",
+                height=80,
+                placeholder="Enter the expected tool output..."
+            )
+            
+            if tool_name:
+                tool_output_dict = {}
+                if tool_output_type == "SQL":
+                    tool_output_dict["SQL"] = tool_output_value
+                elif tool_output_type == "Search results":
+                    tool_output_dict["search results"] = tool_output_value
                 else:
-                    st.session_state.dataset = pd.concat([st.session_state.dataset, new_row], ignore_index=True)
+                    tool_output_dict["CUSTOM_TOOL_RESULT"] = tool_output_value
                 
-                st.toast(f"✅ Record added! Total: {len(st.session_state.dataset)}", icon="✅")
-                st.rerun()
+                tools.append({
+                    "tool_sequence": i + 1,
+                    "tool_name": tool_name,
+                    "tool_output": tool_output_dict
+                })
+            
+            if i < int(num_tools) - 1:
+                st.divider()
         
+        submit_button = st.form_submit_button("➕ Add record to dataset", type="primary")
+    
+    if submit_button:
+        if not input_query or not agent_response:
+            st.error("❌ Please fill in both input query and expected agent response")
+        else:
+            record = create_manual_record(input_query, agent_response, tools)
+            append_to_dataset(pd.DataFrame([record]))
+            
+            st.toast(f"✅ Record added! Total: {dataset_len()}", icon="✅")
+            st.rerun()
+    
+    st.divider()
+    
+    if has_dataset():
+        st.subheader("Current dataset preview")
+        render_dataset_preview(height=300, key="add_preview_page")
+    else:
+        st.info("No records yet. Add your first record using the form above.")
+
+elif st.session_state.active_tab == 2:
+    st.header("Review & edit dataset")
+    st.caption("Review your records and make final edits")
+    
+    if has_dataset():
+        st.metric("Total records", dataset_len())
+
         st.divider()
+
+        with st.expander("🛠️ Bulk edit across the dataset"):
+            st.caption("Apply one change to every matching record. Preview the affected count before applying; bulk changes can be undone.")
+            bulk_operation = st.selectbox("Operation", BULK_OPERATIONS, key="bulk_operation")
+            bulk_params = {}
+
+            if bulk_operation in ["Rename tool", "Remove tool"]:
+                col1, col2 = st.columns(2)
+                with col1:
+                    bulk_params['tool'] = st.text_input(
+                        "Tool name (or pattern)",
+                        placeholder="e.g., query_performance_metrics or ^CortexAnalystTool_",
+                        key="bulk_tool"
+                    )
+                with col2:
+                    if bulk_operation == "Rename tool":
+                        bulk_params['new_name'] = st.text_input("New tool name (or replacement)", key="bulk_new_name")
+                bulk_params['regex'] = st.checkbox("Treat as regular expression", key="bulk_tool_regex")
+                bulk_ready = bool(bulk_params['tool'])
+            elif bulk_operation == "Regex replace in outputs":
+                col1, col2 = st.columns(2)
+                with col1:
+                    bulk_params['pattern'] = st.text_input("Pattern", key="bulk_pattern")
+                with col2:
+                    bulk_params['replacement'] = st.text_input("Replacement", key="bulk_replacement")
+                bulk_ready = bool(bulk_params['pattern'])
+            elif bulk_operation == "Delete matching records":
+                col1, col2 = st.columns(2)
+                with col1:
+                    bulk_params['predicate'] = st.selectbox("Delete records where", BULK_PREDICATES, key="bulk_predicate")
+                with col2:
+                    if bulk_params['predicate'] != "No tools":
+                        bulk_params['value'] = st.text_input("Tool name or pattern", key="bulk_predicate_value")
+                if bulk_params['predicate'] == "Uses tool":
+                    bulk_params['regex'] = st.checkbox("Treat as regular expression", key="bulk_predicate_regex")
+                bulk_ready = bulk_params['predicate'] == "No tools" or bool(bulk_params.get('value'))
+            else:
+                bulk_ready = True
+
+            bulk_plan = None
+            if bulk_ready:
+                try:
+                    bulk_plan = plan_dataset_bulk_operation(bulk_operation, bulk_params)
+                    st.info(f"Preview: {len(bulk_plan['positions'])} of {dataset_len()} records will change")
+                except re.error as e:
+                    st.error(f"❌ Invalid regular expression: {e}")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Apply bulk change", type="primary", key="bulk_apply",
+                             disabled=bulk_plan is None or len(bulk_plan['positions']) == 0):
+                    changed = apply_bulk_operation(bulk_plan)
+                    st.toast(f"✅ {bulk_operation}: {changed} records changed", icon="✅")
+                    st.rerun()
+            with col2:
+                if st.button("↩️ Undo last bulk change", key="bulk_undo",
+                             disabled=not st.session_state.bulk_undo_stack):
+                    undone = undo_bulk_operation()
+                    st.toast(f"↩️ Undid: {undone}", icon="↩️")
+                    st.rerun()
+
+        st.subheader("Edit individual records")
+        st.caption("Select a record to edit using the form below")
         
-        if st.session_state.dataset is not None and len(st.session_state.dataset) > 0:
-            st.subheader("Current dataset preview")
-            # Format EXPECTED_TOOLS as readable JSON strings for display
-            display_df = st.session_state.dataset.copy()
-            display_df['EXPECTED_TOOLS'] = display_df['EXPECTED_TOOLS'].apply(
-                lambda x: json.dumps(x, indent=2) if pd.notna(x) else ''
+        record_index_data = get_record_index()
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            search_text = st.text_input(
+                "Search records",
+                placeholder="Search queries, tool names and expected responses...",
+                key="record_search_text"
             )
-            st.dataframe(
-                display_df, 
-                use_container_width=True, 
-                hide_index=True, 
-                height=300,
-                column_config={
-                    "INPUT_QUERY": st.column_config.TextColumn("Input Query", width="medium"),
-                    "EXPECTED_TOOLS": st.column_config.TextColumn("Expected Tools (JSON)", width="large")
-                }
+        with col2:
+            record_filter = st.selectbox(
+                "Filter",
+                record_filter_options(record_index_data),
+                key="record_search_filter"
             )
-        else:
-            st.info("No records yet. Add your first record using the form above.")
-    
-    elif st.session_state.active_tab == 2:
-        st.header("Review & edit dataset")
-        st.caption("Review your records and make final edits")
         
-        if st.session_state.dataset is not None and len(st.session_state.dataset) > 0:
-            st.metric("Total records", len(st.session_state.dataset))
-            
-            st.divider()
-            
-            st.subheader("Edit individual records")
-            st.caption("Select a record to edit using the form below")
-            
-            record_options = [f"Record {i+1}: {row['INPUT_QUERY'][:60]}..." if row['INPUT_QUERY'] is not None else 'None' for i, row in st.session_state.dataset.iterrows()]
-
-            
+        matching_positions = search_record_index(record_index_data, search_text, record_filter)
+        num_pages = max(1, -(-len(matching_positions) // RECORD_PAGE_SIZE))
+        if st.session_state.get("record_search_page", 1) > num_pages:
+            st.session_state.record_search_page = num_pages
+        
+        col1, col2 = st.columns([1, 4])
+        with col1:
+            page = st.number_input("Page", min_value=1, max_value=num_pages, value=1, step=1, key="record_search_page")
+        with col2:
+            st.caption(f"{len(matching_positions)} matching records | page {int(page)} of {num_pages}")
+        page_positions = matching_positions[(int(page) - 1) * RECORD_PAGE_SIZE:int(page) * RECORD_PAGE_SIZE]
+        
+        page_df = get_dataset_rows(page_positions)
+        
+        def format_record_option(position: int) -> str:
+            query_value = page_df.at[position, 'INPUT_QUERY']
+            return f"Record {position+1}: {query_value[:60]}..." if query_value is not None else 'None'
+        
+        if not page_positions:
+            st.info("No records match your search.")
+        else:
             record_index = st.selectbox(
                 "Select record to edit",
-                range(len(st.session_state.dataset)),
-                format_func=lambda x: record_options[x],
+                page_positions,
+                format_func=format_record_option,
                 key="edit_record_selector"
             )
             
-            current_record = st.session_state.dataset.iloc[record_index]
-            
+            current_record = page_df.loc[record_index]
+        
             # Safe extraction with null handling
             current_tools = current_record['EXPECTED_TOOLS'].get('ground_truth_invocations', []) if isinstance(current_record['EXPECTED_TOOLS'], dict) else []
             current_response = current_record['EXPECTED_TOOLS'].get('ground_truth_output', '') if isinstance(current_record['EXPECTED_TOOLS'], dict) else ''
             current_query = str(current_record['INPUT_QUERY']) if pd.notna(current_record['INPUT_QUERY']) else ''
-            
+            if pd.notna(current_record.get('RUN_COUNT')):
+                st.caption(
+                    f"Consensus of {int(current_record['RUN_COUNT'])} runs: {current_record['CONSENSUS_SUPPORT']:.0%} used this "
+                    f"tool sequence ({int(current_record['DISTINCT_SEQUENCES'])} distinct); "
+                    f"👍 {int(current_record['POSITIVE_FEEDBACKS'])} · 👎 {int(current_record['NEGATIVE_FEEDBACKS'])}"
+                )
+        
             with st.form(f"edit_form_{record_index}"):
                 col1, col2 = st.columns(2)
-                
+            
                 with col1:
                     edited_query = st.text_area(
                         "Input query",
@@ -812,7 +2892,7 @@ if session:
                         height=150,
                         key=f"edit_query_{record_index}"
                     )
-                
+            
                 with col2:
                     edited_response = st.text_area(
                         "Expected agent response",
@@ -820,10 +2900,10 @@ if session:
                         height=150,
                         key=f"edit_response_{record_index}"
                     )
-                
+            
                 st.divider()
                 st.markdown("**Tool invocations**")
-                
+            
                 num_tools_edit = st.number_input(
                     "Number of tools",
                     min_value=0,
@@ -832,16 +2912,16 @@ if session:
                     step=1,
                     key=f"num_tools_edit_{record_index}"
                 )
-                
+            
                 edited_tools = []
                 for i in range(int(num_tools_edit)):
                     st.markdown(f"**Tool {i+1}**")
-                    
+                
                     if i < len(current_tools) and current_tools[i]:
                         tool_data = current_tools[i]
                         default_name = tool_data.get('tool_name', '') if isinstance(tool_data, dict) else ''
                         default_output = tool_data.get('tool_output', {}) if isinstance(tool_data, dict) else {}
-                        
+                    
                         if isinstance(default_output, dict):
                             if 'SQL' in default_output:
                                 default_type = "SQL"
@@ -859,16 +2939,16 @@ if session:
                         default_name = ''
                         default_type = "SQL"
                         default_value = ''
-                    
+                
                     col1, col2 = st.columns([2, 3])
-                    
+                
                     with col1:
                         tool_name_edit = st.text_input(
                             "Tool name",
                             value=default_name,
                             key=f"edit_tool_name_{record_index}_{i}"
                         )
-                    
+                
                     with col2:
                         tool_type_index = ["SQL", "Search results", "Custom"].index(default_type) if default_type in ["SQL", "Search results", "Custom"] else 0
                         tool_output_type_edit = st.selectbox(
@@ -877,14 +2957,14 @@ if session:
                             index=tool_type_index,
                             key=f"edit_tool_type_{record_index}_{i}"
                         )
-                    
+                
                     tool_output_value_edit = st.text_area(
                         "Tool output",
                         value=default_value,
                         height=80,
                         key=f"edit_tool_output_{record_index}_{i}"
                     )
-                    
+                
                     if tool_name_edit:
                         tool_output_dict = {}
                         if tool_output_type_edit == "SQL":
@@ -893,198 +2973,317 @@ if session:
                             tool_output_dict["search results"] = tool_output_value_edit
                         else:
                             tool_output_dict["CUSTOM_TOOL_RESULT"] = tool_output_value_edit
-                        
+                    
                         edited_tools.append({
                             "tool_sequence": i + 1,
                             "tool_name": tool_name_edit,
                             "tool_output": tool_output_dict
                         })
-                    
+                
                     if i < int(num_tools_edit) - 1:
                         st.divider()
-                
+            
                 col1, col2 = st.columns(2)
                 with col1:
                     save_button = st.form_submit_button("💾 Save changes", type="primary")
                 with col2:
                     delete_button = st.form_submit_button("🗑️ Delete record", type="secondary")
-            
+        
             if save_button:
                 updated_record = create_manual_record(edited_query, edited_response, edited_tools)
-                st.session_state.dataset.at[record_index, 'INPUT_QUERY'] = updated_record['INPUT_QUERY']
-                st.session_state.dataset.at[record_index, 'EXPECTED_TOOLS'] = updated_record['EXPECTED_TOOLS']
+                update_dataset_record(record_index, updated_record)
                 st.toast("✅ Record updated!", icon="✅")
                 st.rerun()
-            
+        
             if delete_button:
-                st.session_state.dataset = st.session_state.dataset.drop(record_index).reset_index(drop=True)
+                delete_dataset_record(record_index)
                 st.toast("🗑️ Record deleted", icon="🗑️")
                 st.rerun()
-            
-            st.divider()
-            st.subheader("All records")
-            # Format EXPECTED_TOOLS as readable JSON strings for display
-            display_df = st.session_state.dataset.copy()
-            display_df['EXPECTED_TOOLS'] = display_df['EXPECTED_TOOLS'].apply(
-                lambda x: json.dumps(x, indent=2) if pd.notna(x) else ''
-            )
-            st.dataframe(
-                display_df, 
-                use_container_width=True, 
-                hide_index=True, 
-                height=300,
-                column_config={
-                    "INPUT_QUERY": st.column_config.TextColumn("Input Query", width="medium"),
-                    "EXPECTED_TOOLS": st.column_config.TextColumn("Expected Tools (JSON)", width="large")
-                }
-            )
-        else:
-            st.warning("No records in dataset. Go to 'Load logs' or 'Add records' tab to get started.")
+        
+        st.divider()
+        st.subheader("All records")
+        render_dataset_preview(height=300, key="review_preview_page")
+    else:
+        st.warning("No records in dataset. Go to 'Load logs' or 'Add records' tab to get started.")
+
+elif st.session_state.active_tab == 3:
+    st.header("Export dataset")
+    st.caption("Export your evaluation dataset to Snowflake or download as CSV")
     
-    elif st.session_state.active_tab == 3:
-        st.header("Export dataset")
-        st.caption("Export your evaluation dataset to Snowflake or download as CSV")
+    if has_dataset():
+        st.success(f"✅ Dataset ready with {dataset_len()} records")
         
-        if st.session_state.dataset is not None and len(st.session_state.dataset) > 0:
-            st.success(f"✅ Dataset ready with {len(st.session_state.dataset)} records")
-            
-            st.subheader("Dataset preview")
-            # Format EXPECTED_TOOLS as readable JSON strings for display
-            display_df = st.session_state.dataset.copy()
-            display_df['EXPECTED_TOOLS'] = display_df['EXPECTED_TOOLS'].apply(
-                lambda x: json.dumps(x, indent=2) if pd.notna(x) else ''
-            )
+        st.subheader("Dataset preview")
+        render_dataset_preview(height=300, key="export_preview_page")
+        
+        st.divider()
+
+        st.subheader("🩺 Schema check")
+        known_tools = None
+        if st.session_state.get('agent_fq_name'):
+            try:
+                known_tools = known_tool_names(get_agent_tool_specs(get_session(), st.session_state.agent_fq_name))
+            except Exception:
+                st.caption("Could not read the agent's tools; tool names are not checked")
+        validation_report = get_validation_report(known_tools)
+        if validation_report.empty:
+            st.success("✅ Every record matches the EXPECTED_TOOLS schema"
+                       + (f" and uses tools of {st.session_state.agent_fq_name}" if known_tools else ""))
+        else:
+            st.error(f"❌ {validation_report['ROW'].nunique()} records have {len(validation_report)} schema problems; "
+                     "Cortex Agent Evaluations will reject them. Fix them in Review & edit (the bulk changes help).")
+            problem_rows = validation_report['ROW'].drop_duplicates().head(PREVIEW_PAGE_SIZE).tolist()
+            queries = dict(zip(problem_rows, get_dataset_rows(problem_rows)['INPUT_QUERY'].tolist()))
             st.dataframe(
-                display_df, 
-                use_container_width=True, 
-                hide_index=True, 
-                height=300,
-                column_config={
-                    "INPUT_QUERY": st.column_config.TextColumn("Input Query", width="medium"),
-                    "EXPECTED_TOOLS": st.column_config.TextColumn("Expected Tools (JSON)", width="large")
-                }
+                validation_report.head(PREVIEW_PAGE_SIZE).assign(INPUT_QUERY=lambda report: report['ROW'].map(queries)),
+                use_container_width=True,
+                hide_index=True,
+                height=250
+            )
+        export_invalid = False
+        if not validation_report.empty:
+            export_invalid = st.checkbox("Export records with schema problems anyway", key="export_invalid")
+        export_blocked = not validation_report.empty and not export_invalid
+        
+        st.divider()
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("💾 Save to Snowflake")
+            table_name = st.text_input(
+                "Table name",
+                value="AGENT_EVAL_DB.PUBLIC.EVAL_DATASET",
+                placeholder="DATABASE.SCHEMA.TABLE_NAME",
+                key="export_table_name"
             )
             
-            st.divider()
-            
-            col1, col2 = st.columns(2)
+            save_mode = st.radio("Save mode", ["Append", "Overwrite"], horizontal=True, key="export_save_mode")
             
-            with col1:
-                st.subheader("💾 Save to Snowflake")
-                table_name = st.text_input(
-                    "Table name",
-                    value="AGENT_EVAL_DB.PUBLIC.EVAL_DATASET",
-                    placeholder="DATABASE.SCHEMA.TABLE_NAME",
-                    key="export_table_name"
-                )
-                
-                save_mode = st.radio("Save mode", ["Append", "Overwrite"], horizontal=True, key="export_save_mode")
-                
-                if st.button("📤 Save to Snowflake", type="primary"):
-                    if not table_name.strip():
-                        st.warning("⚠️ Please enter a table name")
-                    elif not validate_table_name(table_name):
-                        st.error("❌ Invalid table name format. Use DATABASE.SCHEMA.TABLE")
-                    else:
-                        with st.spinner("Saving to Snowflake..."):
+            if st.button("📤 Save to Snowflake", type="primary"):
+                if export_blocked:
+                    st.error("❌ Fix the schema problems above, or choose to export them anyway")
+                elif not table_name.strip():
+                    st.warning("⚠️ Please enter a table name")
+                elif not validate_table_name(table_name):
+                    st.error("❌ Invalid table name format. Use DATABASE.SCHEMA.TABLE")
+                else:
+                    with st.spinner("Saving to Snowflake..."):
+                        try:
+                            session = get_session()
+                            if session is None:
+                                raise RuntimeError("Not connected to Snowflake")
+                            overwrite = (save_mode == "Overwrite")
+                            table_upper = table_name.strip().upper()
+                            
+                            # Create or replace table with proper schema
+                            with_history = dataset_has_history()
+                            history_column = ", CONVERSATION_HISTORY VARIANT" if with_history else ""
+                            if overwrite:
+                                session.sql(f"CREATE OR REPLACE TABLE {table_upper} (INPUT_QUERY VARCHAR, EXPECTED_TOOLS VARIANT{history_column});").collect()
+                            else:
+                                session.sql(f"CREATE TABLE IF NOT EXISTS {table_upper} (INPUT_QUERY VARCHAR, EXPECTED_TOOLS VARIANT{history_column});").collect()
+                                if with_history:
+                                    session.sql(f"ALTER TABLE {table_upper} ADD COLUMN IF NOT EXISTS CONVERSATION_HISTORY VARIANT;").collect()
+                            
                             try:
-                                overwrite = (save_mode == "Overwrite")
-                                table_upper = table_name.strip().upper()
-                                
-                                # Create or replace table with proper schema
-                                if overwrite:
-                                    session.sql(f"CREATE OR REPLACE TABLE {table_upper} (INPUT_QUERY VARCHAR, EXPECTED_TOOLS VARIANT);").collect()
-                                else:
-                                    session.sql(f"CREATE TABLE IF NOT EXISTS {table_upper} (INPUT_QUERY VARCHAR, EXPECTED_TOOLS VARIANT);").collect()
-                                
-                                # Prepare data - convert to proper format
-                                records_to_insert = []
-                                for _, row in st.session_state.dataset.iterrows():
-                                    query_val = str(row['INPUT_QUERY']) if pd.notna(row['INPUT_QUERY']) else ''
-                                    tools_dict = row['EXPECTED_TOOLS'] if pd.notna(row['EXPECTED_TOOLS']) else {}
-                                    records_to_insert.append((query_val, json.dumps(tools_dict)))
-                                
-                                # Create temp dataframe with properly formatted data
-                                temp_df = pd.DataFrame(records_to_insert, columns=['INPUT_QUERY', 'EXPECTED_TOOLS_JSON'])
-                                
-                                # Write to temp staging table using write_pandas
-                                temp_table = f"{table_upper}_TEMP_STAGING"
-                                session.sql(f"CREATE OR REPLACE TEMP TABLE {temp_table} (INPUT_QUERY VARCHAR, EXPECTED_TOOLS_JSON VARCHAR);").collect()
-                                
-                                # Use write_pandas for temp table (handles escaping properly)
-                                # Snowpark Session.write_pandas returns (success: bool, nrows: int)
-                                write_result = session.write_pandas(
-                                    temp_df,
-                                    temp_table,
-                                    auto_create_table=False,
-                                    quote_identifiers=False
-                                )
-                                
-                                # Handle return value - could be tuple of 2 or 4 values depending on version
-                                if isinstance(write_result, tuple):
-                                    if len(write_result) == 2:
-                                        success, nrows = write_result
-                                    elif len(write_result) == 4:
-                                        success, nchunks, nrows, output = write_result
-                                    else:
-                                        success = write_result[0]
-                                        nrows = len(temp_df)
-                                else:
-                                    success = write_result
-                                    nrows = len(temp_df)
-                                
-                                if success:
-                                    # Copy from temp to final table with PARSE_JSON
-                                    insert_sql = f"""
-                                    INSERT INTO {table_upper} (INPUT_QUERY, EXPECTED_TOOLS)
-                                    SELECT INPUT_QUERY, PARSE_JSON(EXPECTED_TOOLS_JSON)
-                                    FROM {temp_table}
-                                    """
-                                    session.sql(insert_sql).collect()
-                                    
-                                    # Verify records were inserted
-                                    count_result = session.sql(f"SELECT COUNT(*) as cnt FROM {table_upper}").collect()
-                                    actual_count = count_result[0]['CNT']
-                                    
-                                    st.toast(f"✅ Saved {nrows} records to {table_name} (Total in table: {actual_count})", icon="✅")
-                                else:
-                                    st.error("❌ Failed to write records to staging table")
+                                nrows = export_dataset_parquet(session, table_upper, with_history)
+                            except (ImportError, AttributeError, NotImplementedError) as e:
+                                # pyarrow or the session's file API is missing
+                                st.warning(f"⚠️ Parquet export unavailable ({e}); staging records row by row instead")
+                                nrows = export_dataset_rows(session, table_upper, with_history)
+
+                            if nrows is not None:
+                                # Verify records were inserted
+                                count_result = session.sql(f"SELECT COUNT(*) as cnt FROM {table_upper}").collect()
+                                actual_count = count_result[0]['CNT']
                                 
-                            except Exception as e:
-                                st.error(f"Error: {e}")
-                                st.error(traceback.format_exc())
+                                st.toast(f"✅ Saved {nrows} records to {table_name} (Total in table: {actual_count})", icon="✅")
+                            else:
+                                st.error("❌ Failed to write records to staging table")
+                            
+                        except Exception as e:
+                            st.error(f"Error: {e}")
+                            st.error(traceback.format_exc())
+        
+        with col2:
+            st.subheader("📥 Download CSV")
+            st.caption("Download the dataset as a CSV file for local use")
             
-            with col2:
-                st.subheader("📥 Download CSV")
-                st.caption("Download the dataset as a CSV file for local use")
-                
-                csv = st.session_state.dataset.to_csv(index=False)
-                st.download_button(
-                    label="📥 Download CSV",
-                    data=csv,
-                    file_name=f"eval_dataset_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    type="primary"
+            if export_blocked:
+                st.caption("Fix the schema problems above, or choose to export them anyway")
+            csv_path = _export_csv_path()
+            # The CSV is only built on request, and reused until the dataset changes
+            if st.button("📄 Prepare CSV", disabled=export_blocked):
+                with st.spinner("Writing CSV..."):
+                    write_export_csv(csv_path)
+                    st.session_state.export_csv_version = st.session_state.get('dataset_version', 0)
+            csv_ready = (st.session_state.export_csv_version == st.session_state.get('dataset_version', 0)
+                         and os.path.exists(csv_path))
+            if not csv_ready and os.path.exists(csv_path):
+                os.remove(csv_path)  # Written for an earlier version of the dataset
+            if csv_ready and not export_blocked:
+                with open(csv_path, 'rb') as csv_file:
+                    st.download_button(
+                        label="📥 Download CSV",
+                        data=csv_file,
+                        file_name=f"eval_dataset_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                        mime="text/csv",
+                        type="primary"
+                    )
+    else:
+        st.warning("No records in dataset. Go to 'Load logs' or 'Add records' tab to build your dataset.")
+
+elif st.session_state.active_tab == 4:
+    session = get_session()
+    if session is None:
+        render_connection_help()
+    else:
+        st.header("Compare evaluation runs")
+        st.caption("Load two evaluation runs once, then compare them per record, metric and tool without re-querying Snowflake")
+
+        try:
+            agent_catalog, _ = get_agent_catalog(session, parse_agent_scope(st.session_state.agent_catalog_scope))
+        except Exception as e:
+            st.error(f"Failed to load agents: {e}")
+            agent_catalog = {}
+
+        run_agents, run_names = [], []
+        for column, label, key in zip(st.columns(2), ["Base run", "Improved run"], ["base", "improved"]):
+            with column:
+                st.subheader(label)
+                if agent_catalog:
+                    agent_fq_name = st.selectbox(
+                        "Agent",
+                        sorted(agent_catalog, key=lambda fq_name: (agent_catalog[fq_name]["name"], fq_name)),
+                        format_func=lambda fq_name: f"{agent_catalog[fq_name]['name']} ({fq_name.rsplit('.', 1)[0]})",
+                        key=f"compare_{key}_agent"
+                    )
+                    run_agents.append(agent_catalog[agent_fq_name])
+                else:
+                    agent_fq_name = st.text_input("Agent", placeholder="DATABASE.SCHEMA.AGENT", key=f"compare_{key}_agent_input")
+                    parts = agent_fq_name.strip().upper().split('.')
+                    run_agents.append(
+                        {"database_name": parts[0], "schema_name": parts[1], "name": parts[2]} if len(parts) == 3 else None
+                    )
+                run_names.append(st.text_input("Evaluation run name", key=f"compare_{key}_run").strip())
+
+        tools_table = st.text_input(
+            "Evaluation dataset table (optional)",
+            placeholder="DATABASE.SCHEMA.TABLE",
+            help="Table the runs were evaluated on, used to break results down by tool. "
+                 "Leave empty to use the dataset loaded in this app.",
+            key="compare_tools_table"
+        )
+        refresh = st.checkbox("Re-fetch runs from Snowflake", value=False,
+                              help=f"Runs are cached as Parquet in {EVAL_CACHE_DIR} after the first load. "
+                                   "Re-fetch a run after it has been re-scored under the same name.",
+                              key="compare_refresh")
+
+        if st.button("📊 Load runs", type="primary"):
+            if None in run_agents or not all(run_names):
+                st.warning("⚠️ Choose an agent and enter a run name for both runs")
+            else:
+                with st.spinner("Loading evaluation runs..."):
+                    try:
+                        base = load_eval_run(session, run_agents[0], run_names[0], refresh)
+                        improved = load_eval_run(session, run_agents[1], run_names[1], refresh)
+                        if tools_table.strip():
+                            tools = record_tools(load_from_tables(session, tools_table))
+                            tools_source = f"table `{tools_table.strip().upper()}`"
+                        else:
+                            tools = dataset_record_tools()
+                            tools_source = f"the dataset loaded in this app ({dataset_len()} records)"
+                        st.session_state.eval_comparison = {
+                            'runs': tuple(run_names), 'base': base, 'improved': improved,
+                            'tools': tools, 'tools_source': tools_source
+                        }
+                        st.toast(f"Loaded {len(base)} and {len(improved)} scores", icon="📊")
+                    except Exception as e:
+                        st.error(f"❌ Failed to load evaluation runs: {e}")
+
+        comparison = st.session_state.eval_comparison
+        if comparison:
+            st.divider()
+            tolerance = st.number_input(
+                "Tie tolerance", min_value=0.0, value=0.0, step=0.01, format="%.2f",
+                help="Score changes no larger than this count as unchanged",
+                key="compare_tolerance"
+            )
+            compared = get_comparison(tolerance)
+            if compared.empty:
+                st.warning("⚠️ The two runs share no evaluated queries and metrics")
+            else:
+                base_name, improved_name = comparison['runs']
+                st.caption(f"{compared['QUERY_HASH'].nunique()} shared queries: `{base_name}` → `{improved_name}`")
+                fetched = [run.attrs.get('fetched_at') for run in (comparison['base'], comparison['improved'])]
+                if all(fetched):
+                    st.caption("Scores fetched from Snowflake " + " and ".join(
+                        f"{at:%Y-%m-%d %H:%M}" for at in fetched) + "; tick **Re-fetch runs** to refresh them")
+
+                st.subheader("📈 Metrics")
+                st.dataframe(summarize_comparison(compared), use_container_width=True, hide_index=True)
+
+                st.subheader("🔧 Regressions by tool")
+                if comparison['tools'].empty:
+                    st.info("Load the evaluation dataset (or enter its table above) to break results down by tool")
+                else:
+                    st.caption(f"Tools from {comparison['tools_source']}")
+                    evaluated = compared['QUERY_HASH'].unique()
+                    unmatched = int((~pd.Series(evaluated).isin(comparison['tools']['QUERY_HASH'])).sum())
+                    if unmatched:
+                        st.warning(f"⚠️ {unmatched} of {len(evaluated)} evaluated queries are not in "
+                                   f"{comparison['tools_source']}; the runs may have been evaluated on a different dataset")
+                    st.dataframe(tool_regressions(compared, comparison['tools']),
+                                 use_container_width=True, hide_index=True, height=300)
+
+                st.subheader("🔍 Records")
+                col_metric, col_outcome, col_tool, col_search = st.columns(4)
+                with col_metric:
+                    metrics = st.multiselect("Metric", sorted(compared['METRIC'].unique()), key="compare_metric_filter")
+                with col_outcome:
+                    outcomes = st.multiselect("Outcome", COMPARE_OUTCOMES, default=["Regressed"], key="compare_outcome_filter")
+                with col_tool:
+                    tool = st.selectbox("Tool", ["All tools", *sorted(comparison['tools']['TOOL_NAME'].unique())],
+                                        key="compare_tool_filter")
+                with col_search:
+                    search_text = st.text_input("Query contains", key="compare_search")
+
+                # Every filter is a vectorized mask over the cached comparison
+                mask = pd.Series(True, index=compared.index)
+                if metrics:
+                    mask &= compared['METRIC'].isin(metrics)
+                if outcomes:
+                    mask &= compared['OUTCOME'].isin(outcomes)
+                if tool != "All tools":
+                    tools = comparison['tools']
+                    mask &= compared['QUERY_HASH'].isin(tools.loc[tools['TOOL_NAME'] == tool, 'QUERY_HASH'])
+                if search_text:
+                    mask &= compared['INPUT_QUERY'].str.contains(search_text, case=False, regex=False, na=False)
+
+                matches = compared[mask].sort_values('DELTA')
+                st.caption(f"{len(matches)} matching scores"
+                           + (f", showing the {PREVIEW_PAGE_SIZE} largest drops" if len(matches) > PREVIEW_PAGE_SIZE else ""))
+                st.dataframe(
+                    matches.head(PREVIEW_PAGE_SIZE).drop(columns=['QUERY_HASH']),
+                    use_container_width=True,
+                    hide_index=True,
+                    height=400,
+                    column_config={
+                        "INPUT_QUERY": st.column_config.TextColumn("Input Query", width="large"),
+                        "DELTA": st.column_config.NumberColumn("Delta", format="%+.3f")
+                    }
                 )
-        else:
-            st.warning("No records in dataset. Go to 'Load logs' or 'Add records' tab to build your dataset.")
 
-else:
-    st.info("👈 Please connect to Snowflake using the sidebar")
-    
-    with st.expander("📝 Connection requirements"):
-        st.markdown("""
-        Required environment variables:
-        - `SNOWFLAKE_ACCOUNT` - Your Snowflake account identifier
-        - `SNOWFLAKE_USER` - Your Snowflake username
-        - `SNOWFLAKE_PASSWORD` - Your Snowflake password
-        
-        Optional environment variables (with defaults):
-        - `SNOWFLAKE_WAREHOUSE` (default: COMPUTE_WH)
-        - `SNOWFLAKE_DATABASE` (default: SNOWFLAKE)
-        - `SNOWFLAKE_SCHEMA` (default: LOCAL)
-        - `SNOWFLAKE_ROLE` (default: ACCOUNTADMIN)
-        """)
+with connection_placeholder.container():
+    if st.session_state.connection_status == 'connected':
+        st.success("✅ Connected")
+        if st.session_state.connection_user_info:
+            st.caption(st.session_state.connection_user_info)
+    elif st.session_state.connection_status == 'failed':
+        st.error("❌ Not connected")
+    else:
+        st.caption("Connects to Snowflake when a tab needs it")
 
 st.divider()
 st.caption("AI evaluation dataset builder | Powered by Snowflake")
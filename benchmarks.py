@@ -0,0 +1,223 @@
+"""Performance benchmarks for the evaluation dataset builder.
+
+Usage:
+    python benchmarks.py startup [--repeat 5] [--max-import-ms 1500] [--max-render-ms 3000]
+    python benchmarks.py postprocess [--rows 200000] [--workers 1,2,4,8] [--repeat 3] [--min-speedup 2]
+
+Each benchmark prints one JSON line per measurement and a summary line, and exits
+non-zero when a --max-* budget is exceeded so it can gate CI.
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_evalset_generator.py")
+
+# Runs in a fresh interpreter so every measurement is a cold start
+IMPORT_PROBE = """
+import time
+start = time.perf_counter()
+{imports}
+print((time.perf_counter() - start) * 1000)
+"""
+
+RENDER_PROBE = """
+import time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app_path!r}, default_timeout=60)
+# The Review & edit tab needs no Snowflake connection, so this measures the app's own first frame
+app.session_state["active_tab"] = 2
+start = time.perf_counter()
+app.run()
+elapsed = (time.perf_counter() - start) * 1000
+if app.exception:
+    raise SystemExit(app.exception[0].value)
+print(elapsed)
+"""
+
+
+def app_import_statements(app_path: str) -> str:
+    """Return the app's module-level import statements as source"""
+    with open(app_path) as f:
+        tree = ast.parse(f.read())
+    imports = [
+        node for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom)) and getattr(node, "module", None) != "__future__"
+    ]
+    return "\n".join(ast.unparse(node) for node in imports)
+
+
+def load_app_functions(app_path: str) -> dict:
+    """Run the app's imports, constants and function definitions, without its UI, and return its namespace"""
+    with open(app_path) as f:
+        tree = ast.parse(f.read())
+    body = [
+        node for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef))
+        or (isinstance(node, ast.Assign) and all(isinstance(target, ast.Name) for target in node.targets)
+            and (all(target.id.isupper() for target in node.targets)
+                 or (isinstance(node.value, ast.Call) and getattr(node.value.func, "id", None) == "lazy_import")))
+    ]
+    namespace = {"__name__": "agent_evalset_generator", "__file__": app_path}
+    exec(compile(ast.Module(body=body, type_ignores=[]), app_path, "exec"), namespace)
+    return namespace
+
+
+def run_probe(source: str) -> float:
+    result = subprocess.run([sys.executable, "-c", source], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(args: argparse.Namespace) -> int:
+    import_source = IMPORT_PROBE.format(imports=app_import_statements(APP_PATH))
+    render_source = RENDER_PROBE.format(app_path=APP_PATH)
+
+    import_ms, render_ms = [], []
+    for run in range(args.repeat):
+        import_ms.append(run_probe(import_source))
+        render_ms.append(run_probe(render_source))
+        print(json.dumps({"benchmark": "startup", "run": run, "import_ms": round(import_ms[-1], 1),
+                          "first_render_ms": round(render_ms[-1], 1)}))
+
+    summary = {
+        "benchmark": "startup",
+        "import_ms_median": round(statistics.median(import_ms), 1),
+        "first_render_ms_median": round(statistics.median(render_ms), 1),
+    }
+    print(json.dumps(summary))
+
+    failed = False
+    if args.max_import_ms is not None and summary["import_ms_median"] > args.max_import_ms:
+        print(f"Import time {summary['import_ms_median']}ms exceeds budget {args.max_import_ms}ms", file=sys.stderr)
+        failed = True
+    if args.max_render_ms is not None and summary["first_render_ms_median"] > args.max_render_ms:
+        print(f"First render {summary['first_render_ms_median']}ms exceeds budget {args.max_render_ms}ms", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+SYNTHETIC_TOOL_NAMES = [
+    "CortexAnalystTool_query_performance_metrics", "CortexSearchService_campaign_docs",
+    "ToolCall-send_email", "SqlExecution_CortexAnalyst", "CortexChartToolImpl-data_to_chart",
+]
+
+
+def synthetic_log_table(rows: int, seed: int, columns: list):
+    """Raw log rows shaped like the app's log query output: quoted text and pretty-printed TOOL_ARRAY JSON.
+
+    `columns` are the app's final columns; the ones not derived from the text and tools are filled in."""
+    import pyarrow as pa
+
+    rng = random.Random(seed)
+    queries, responses, tool_arrays, feedback = [], [], [], []
+    for row in range(rows):
+        tools = []
+        for _ in range(rng.randint(0, 4)):
+            tool_name = rng.choice(SYNTHETIC_TOOL_NAMES)
+            tools.append({"tool_name": tool_name, "tool_type": "tool",
+                          "tool_output": {"SQL": f"SELECT *\nFROM campaigns\nWHERE id = {row}"}})
+        queries.append(json.dumps(f"How did campaign {row % 5000} perform last \"quarter\"?"))
+        responses.append(json.dumps(f"Campaign {row % 5000} reached {rng.random():.1%} of its target.\n"))
+        tool_arrays.append(json.dumps(tools, indent=2))
+        feedback.append(rng.choice([None, 0, 1]))
+
+    table = {
+        "RECORD_ID": [f"record-{row}" for row in range(rows)],
+        "START_TS": pa.array([1_700_000_000_000_000 - row * 1_000_000 for row in range(rows)], pa.timestamp("us")),
+        "AGENT_NAME": ["CAMPAIGN_AGENT"] * rows,
+        "INPUT_QUERY": queries, "AGENT_RESPONSE": responses, "TOOL_ARRAY": tool_arrays,
+        "REASONING_MODEL": ["claude-4-sonnet"] * rows,
+        "USER_FEEDBACKS": pa.array(feedback, pa.int64()),
+        "USER_FEEDBACK_MESSAGES": pa.nulls(rows, pa.string()),
+    }
+    for column in columns:
+        if column.startswith("LATENCY") or column.endswith("_MS"):
+            table[column] = [rng.random() * 1000 for _ in range(rows)]
+    return pa.table(table)
+
+
+def frames_match(left, right) -> bool:
+    import pandas as pd
+
+    try:
+        pd.testing.assert_frame_equal(left.reset_index(drop=True), right.reset_index(drop=True), check_dtype=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def bench_postprocess(args: argparse.Namespace) -> int:
+    app = load_app_functions(APP_PATH)
+    table = synthetic_log_table(args.rows, args.seed, app["FINAL_COLUMNS"])
+
+    def median_ms(run):
+        timings, result = [], None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = run()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), result
+
+    # The app's serial Arrow path is both the reference output and the speedup baseline
+    baseline_ms, baseline = median_ms(lambda: app["postprocess_arrow"](table))
+    print(json.dumps({"benchmark": "postprocess", "rows": args.rows, "workers": 0, "path": "postprocess_arrow",
+                      "median_ms": round(baseline_ms, 1), "rows_per_s": round(args.rows / baseline_ms * 1000)}))
+
+    workers = [int(count) for count in args.workers.split(",")]
+    failed = False
+    for count in workers:
+        elapsed_ms, result = median_ms(lambda: app["postprocess_parallel"](table, count))
+        matches = frames_match(result, baseline)
+        failed = failed or not matches
+        print(json.dumps({"benchmark": "postprocess", "rows": args.rows, "workers": count, "path": "postprocess_parallel",
+                          "median_ms": round(elapsed_ms, 1), "rows_per_s": round(args.rows / elapsed_ms * 1000),
+                          "speedup": round(baseline_ms / elapsed_ms, 2), "matches_serial": matches}))
+
+    summary = {
+        "benchmark": "postprocess",
+        "cpu_count": os.cpu_count(),
+        "max_workers": workers[-1],
+        "max_speedup": round(baseline_ms / elapsed_ms, 2),
+    }
+    print(json.dumps(summary))
+
+    if failed:
+        print("Sharded output differs from the app's serial postprocess_arrow output", file=sys.stderr)
+    if args.min_speedup is not None and summary["max_speedup"] < args.min_speedup:
+        print(f"Speedup {summary['max_speedup']}x at {workers[-1]} workers is below {args.min_speedup}x", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    startup = subparsers.add_parser("startup", help="Cold import time and time to first render")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.add_argument("--max-import-ms", type=float, default=None)
+    startup.add_argument("--max-render-ms", type=float, default=None)
+    startup.set_defaults(func=bench_startup)
+
+    postprocess = subparsers.add_parser("postprocess", help="Sharded log postprocessing throughput by worker count")
+    postprocess.add_argument("--rows", type=int, default=200000)
+    postprocess.add_argument("--workers", default="1,2,4,8",
+                             help="Comma-separated worker counts, each compared with the app's serial path")
+    postprocess.add_argument("--repeat", type=int, default=3)
+    postprocess.add_argument("--seed", type=int, default=0)
+    postprocess.add_argument("--min-speedup", type=float, default=None,
+                             help="Fail when the last worker count is not this much faster than the serial path")
+    postprocess.set_defaults(func=bench_postprocess)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""Postprocessing of raw agent log rows into evaluation records.
+
+Nothing here depends on Streamlit, so a process pool can import this module and postprocess shards
+of a large log pull in parallel. Shards travel between processes as Arrow IPC streams.
+"""
+import ast
+import json
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pj
+
+# Tools dropped from the ground truth, and the keys a tool_output may carry
+DROPPED_TOOLS = ['SqlExecution', 'SqlExecution_CortexAnalyst', 'CortexChartToolImpl-data_to_chart']
+TOOL_OUTPUT_KEYS = ['SQL', 'search results', 'CUSTOM_TOOL_RESULT']
+TOOL_OUTPUT_TYPE = pa.struct([(key, pa.string()) for key in TOOL_OUTPUT_KEYS])
+SEQUENCED_TOOLS_TYPE = pa.list_(pa.struct([
+    ('tool_sequence', pa.int64()),
+    ('tool_name', pa.string()),
+    ('tool_output', TOOL_OUTPUT_TYPE),
+]))
+
+def add_tool_sequence(tool_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    new_order = ['tool_sequence', 'tool_name', 'tool_output']
+    drop_list = DROPPED_TOOLS
+
+    # 1. Remove unwanted tools
+    filtered_tools = [
+        tool
+        for tool in tool_list
+        if tool.get('tool_name') not in drop_list
+    ]
+
+    # 2. Add sequence and reorder keys
+    updated_tools = []
+    for idx, tool in enumerate(filtered_tools):
+        tool_name = tool['tool_name']
+        if tool_name.startswith('CortexAnalystTool_'):
+            tool_name = tool_name.replace('CortexAnalystTool_', '', 1)
+
+        elif tool_name.startswith('CortexSearchService_'):
+            tool_name = 'cortex_search'
+
+        elif tool_name.startswith('ToolCall-'):
+            tool_name = tool_name.replace('ToolCall-', '', 1)
+
+        updated_tool = {
+            **tool,
+            "tool_sequence": idx + 1,
+            "tool_name": tool_name
+        }
+
+
+        # Reorder output keys
+        reordered_tool = {k: updated_tool[k] for k in new_order if k in updated_tool}
+
+        updated_tools.append(reordered_tool)
+
+    # 3. Define return var and return it
+    final_tool_list = updated_tools
+    return final_tool_list
+
+def clean_text(s):
+    """
+    Normalize a text cell:
+    - If it looks like a Python/JSON quoted literal, try ast.literal_eval to unescape safely.
+    - Otherwise try a unicode_escape decode as a fallback.
+    - Remove matching surrounding quotes (single or double), repeating a few times to handle nested quoting.
+    - Remove any leftover backslashes, collapse whitespace, strip.
+    """
+    if pd.isna(s):
+        return s
+
+    s = str(s).strip()
+
+    # Try to safely unescape if it looks like a quoted literal.
+    # Using ast.literal_eval is safest when strings are like: '"abc"', "'abc'", r'\"abc\"'
+    try:
+        # Only try literal_eval for strings that start with a quote or an escape-quote (cheap heuristic)
+        if s.startswith('"') or s.startswith("'") or s.startswith(r'\"') or s.startswith(r"\'"):
+            s_eval = ast.literal_eval(s)
+            # If literal_eval returns a non-str (rare), convert to str
+            s = s_eval if isinstance(s_eval, str) else str(s_eval)
+        else:
+            # fallback: unescape typical escape sequences like \n, \t, \" etc.
+            # This will turn r'\"abc\"' -> '"abc"'
+            try:
+                s = bytes(s, "utf-8").decode("unicode_escape")
+            except Exception:
+                pass
+    except Exception:
+        # If literal_eval fails, try unicode escaping fallback, but don't raise.
+        try:
+            s = bytes(s, "utf-8").decode("unicode_escape")
+        except Exception:
+            pass
+
+    # Remove matching surrounding quotes repeatedly (handles nested quoting)
+    for _ in range(3):  # loop a few times in case of multiple nested levels
+        if len(s) >= 2 and ((s[0] == '"' and s[-1] == '"') or (s[0] == "'" and s[-1] == "'")):
+            s = s[1:-1]
+        else:
+            break
+
+    # Remove leftover backslashes that are likely artifacts
+    s = s.replace('\\', '')
+
+    # Collapse whitespace and trim
+    s = re.sub(r'\s+', ' ', s).strip()
+
+    return s
+
+# Bytes of TOOL_ARRAY text parsed at once; stays well under the 2 GB offset limit of an Arrow string buffer
+PARSE_CHUNK_BYTES = 256 << 20
+
+class ToolSchemaError(ValueError):
+    """TOOL_ARRAY text that does not fit the tool struct schema (e.g. tool outputs that are not strings)"""
+
+def _parse_tool_chunk(text, tool_type):
+    # Wrap each array as {"t": [...]} and join the chunk into one newline-delimited buffer without leaving Arrow
+    lines = pc.binary_join_element_wise('{"t":', text, '}', '')
+    joined = pc.binary_join(pa.ListArray.from_arrays(pa.array([0, len(lines)], pa.int32()), lines), '\n')
+    buffer = joined[0].as_buffer()
+    try:
+        parsed = pj.read_json(
+            pa.BufferReader(buffer),
+            read_options=pj.ReadOptions(use_threads=True, block_size=max(1 << 20, buffer.size + 1)),
+            parse_options=pj.ParseOptions(explicit_schema=pa.schema([('t', pa.list_(tool_type))]),
+                                          newlines_in_values=True, unexpected_field_behavior='ignore'),
+        )
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise ToolSchemaError(str(e)) from e
+    if parsed.num_rows != len(text):
+        raise ToolSchemaError(f"Parsed {parsed.num_rows} tool arrays from {len(text)} rows")
+    return parsed['t'].combine_chunks()
+
+def parse_tool_arrays(column):
+    """Parse TOOL_ARRAY JSON text into a list<struct> Arrow column with pyarrow's JSON reader, chunk by chunk"""
+    tool_type = pa.struct([('tool_name', pa.string()), ('tool_type', pa.string()), ('tool_output', TOOL_OUTPUT_TYPE)])
+    text = pc.fill_null(column.cast(pa.string()), '[]')
+    text = text.combine_chunks() if isinstance(text, pa.ChunkedArray) else text
+    if len(text) == 0:
+        return pa.array([], pa.list_(tool_type))
+
+    # Cut the rows into chunks of about PARSE_CHUNK_BYTES of text each
+    ends = np.cumsum(pc.binary_length(text).to_numpy(zero_copy_only=False))
+    bounds = np.searchsorted(ends, np.arange(PARSE_CHUNK_BYTES, ends[-1], PARSE_CHUNK_BYTES), side='right')
+    bounds = np.unique(np.concatenate([[0], bounds, [len(text)]]))
+    return pa.concat_arrays([
+        _parse_tool_chunk(text.slice(start, end - start), tool_type) for start, end in zip(bounds[:-1], bounds[1:])
+    ])
+
+def sequence_tool_arrays(tools):
+    """Columnar add_tool_sequence: drop, rename and number tools with Arrow kernels.
+
+    Returns the sequenced list<struct> column and each row's tool-name signature for consensus."""
+    flat = pc.list_flatten(tools)
+    parents = pc.list_parent_indices(tools)
+    keep = pc.fill_null(pc.invert(pc.is_in(flat.field('tool_name'), value_set=pa.array(DROPPED_TOOLS))), True)
+    flat = flat.filter(keep)
+    parents = parents.filter(keep).to_numpy()
+
+    names = flat.field('tool_name')
+    renamed = pc.if_else(
+        pc.starts_with(names, 'CortexAnalystTool_'), pc.utf8_slice_codeunits(names, len('CortexAnalystTool_')),
+        pc.if_else(
+            pc.starts_with(names, 'CortexSearchService_'), pa.scalar('cortex_search'),
+            pc.if_else(pc.starts_with(names, 'ToolCall-'), pc.utf8_slice_codeunits(names, len('ToolCall-')), names),
+        ),
+    )
+
+    counts = np.bincount(parents, minlength=len(tools))
+    offsets = pa.array(np.concatenate([[0], np.cumsum(counts)]), pa.int32())
+    sequence = np.arange(len(flat), dtype=np.int64) - offsets.to_numpy()[parents] + 1
+    invocations = pa.StructArray.from_arrays(
+        [pa.array(sequence), renamed, flat.field('tool_output')],
+        names=['tool_sequence', 'tool_name', 'tool_output'],
+    )
+    sequenced = pa.ListArray.from_arrays(offsets, invocations).cast(SEQUENCED_TOOLS_TYPE)
+    signatures = pc.binary_join(pa.ListArray.from_arrays(offsets, pc.fill_null(renamed, '')), '>')
+    return sequenced, signatures
+
+def strip_missing_outputs(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop tool_output keys the struct carries but the source object did not have"""
+    for tool in tools:
+        output = tool.pop('tool_output')
+        if output is not None:
+            tool['tool_output'] = {key: value for key, value in output.items() if value is not None}
+    return tools
+
+def parse_conversation_history(value: Any) -> List[Dict[str, Any]]:
+    """Decode a CONVERSATION_HISTORY array and clean each turn's text the way INPUT_QUERY and AGENT_RESPONSE are"""
+    turns = json.loads(value) if isinstance(value, str) else value
+    if not isinstance(turns, list):
+        return []
+    # Turn text arrives decoded from the VARIANT, so re-quote it to match the text columns clean_text expects
+    return [
+        {key: clean_text(json.dumps(turn[key])) if turn.get(key) is not None else None for key in ('input', 'output')}
+        for turn in turns
+    ]
+
+# Raw columns a shard needs; everything else stays in the parent process
+SHARD_COLUMNS = ['INPUT_QUERY', 'AGENT_RESPONSE', 'TOOL_ARRAY']
+# Shards per worker, so a slow shard does not leave the other workers idle at the end
+SHARDS_PER_WORKER = 4
+
+def to_ipc(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def from_ipc(data: bytes) -> pa.Table:
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+
+def postprocess_shard(data: bytes) -> bytes:
+    """Clean the text columns and sequence the tools of one shard of raw rows.
+
+    Takes and returns an Arrow IPC stream. Tools stay an Arrow list<struct> in TOOL_CALLING; a shard
+    whose tool outputs don't fit that schema carries them as JSON text in TOOL_CALLING_JSON instead."""
+    shard = from_ipc(data)
+    input_query = [clean_text(value) for value in shard['INPUT_QUERY'].to_pylist()]
+    agent_response = [clean_text(value) for value in shard['AGENT_RESPONSE'].to_pylist()]
+
+    try:
+        tools, signatures = sequence_tool_arrays(parse_tool_arrays(shard['TOOL_ARRAY']))
+        tools_json = pa.nulls(shard.num_rows, pa.string())
+    except ToolSchemaError:
+        # Rows without a query are dropped later, so their tools are never decoded (as in the serial path)
+        tool_lists = [
+            add_tool_sequence(ast.literal_eval(raw)) if query is not None else []
+            for query, raw in zip(input_query, shard['TOOL_ARRAY'].to_pylist())
+        ]
+        tools = pa.nulls(shard.num_rows, SEQUENCED_TOOLS_TYPE)
+        tools_json = pa.array([json.dumps(tool_list) for tool_list in tool_lists], pa.string())
+        signatures = pa.array([">".join(tool['tool_name'] for tool in tool_list) for tool_list in tool_lists], pa.string())
+
+    return to_ipc(pa.table({
+        'INPUT_QUERY': pa.array(input_query, pa.string()),
+        'AGENT_RESPONSE': pa.array(agent_response, pa.string()),
+        'TOOL_CALLING': tools,
+        'TOOL_CALLING_JSON': tools_json,
+        'TOOL_SIGNATURE': signatures,
+    }))
+
+def decode_tool_calling(processed: pa.Table) -> List[List[Dict[str, Any]]]:
+    """TOOL_CALLING of postprocessed rows as Python lists, whichever column a shard stored it in"""
+    return [
+        json.loads(text) if text is not None else strip_missing_outputs(tools)
+        for tools, text in zip(processed['TOOL_CALLING'].to_pylist(), processed['TOOL_CALLING_JSON'].to_pylist())
+    ]
+
+def postprocess_shards(table: pa.Table, workers: int, shard_rows: Optional[int] = None) -> pa.Table:
+    """Run postprocess_shard over row slices of `table`, in a process pool when workers > 1.
+
+    Results are concatenated in the original row order."""
+    columns = table.select(SHARD_COLUMNS)
+    if shard_rows is None:
+        shard_rows = max(1, -(-columns.num_rows // (max(workers, 1) * SHARDS_PER_WORKER)))
+    shards = [to_ipc(columns.slice(start, shard_rows)) for start in range(0, columns.num_rows, shard_rows)]
+    shards = shards or [to_ipc(columns)]
+
+    if workers <= 1:
+        results = [postprocess_shard(shard) for shard in shards]
+    else:
+        # spawn: forking a threaded server process is unsafe, and workers only need this module
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context) as pool:
+            results = list(pool.map(postprocess_shard, shards))
+    return pa.concat_tables([from_ipc(result) for result in results])
@@ -0,0 +1,362 @@
+"""Replay an evaluation dataset against a Cortex Agent concurrently.
+
+Sends every INPUT_QUERY from an exported evalset (CSV, JSONL or Parquet) to an agent endpoint and
+records the agent's answer and tool calls in the EXPECTED_TOOLS shape used by the app:
+{"ground_truth_invocations": [{"tool_sequence", "tool_name", "tool_output"}], "ground_truth_output"}.
+
+Results are appended to a JSONL file as they complete, so an interrupted run resumes where it
+stopped; only records that have not succeeded yet are sent again.
+
+Usage:
+    # Against a deployed agent (needs SNOWFLAKE_ACCOUNT and a programmatic access token in SNOWFLAKE_PAT)
+    python evalset_replay.py eval_dataset.csv --agent MARKETING_CAMPAIGNS_DB.AGENTS.MARKETING_CAMPAIGNS_AGENT \\
+        --concurrency 8 --rate 4 --output replay.jsonl
+
+    # Offline, answering from the evalset itself with simulated latency and failures
+    python evalset_replay.py eval_dataset.csv --endpoint local --local-latency-ms 200 --local-failure-rate 0.1
+"""
+import abc
+import argparse
+import ast
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List
+
+import pandas as pd
+from dotenv import load_dotenv
+
+RETRYABLE_HTTP_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """Transient endpoint failure (throttling, timeouts, 5xx) worth retrying"""
+
+
+def parse_expected_tools(value: Any) -> Dict[str, Any]:
+    """EXPECTED_TOOLS from an export: a dict, JSON text, or the Python repr written by the CSV download"""
+    if isinstance(value, dict):
+        return value
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return {}
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return ast.literal_eval(value)
+
+
+def to_expected_tools(response_text: str, tool_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "ground_truth_invocations": [
+            {"tool_sequence": idx + 1, "tool_name": call["tool_name"], "tool_output": call.get("tool_output", {})}
+            for idx, call in enumerate(tool_calls)
+        ],
+        "ground_truth_output": response_text,
+    }
+
+
+class AgentEndpoint(abc.ABC):
+    """An agent that answers one query. Implementations return {"response": str, "tool_calls": [...]}"""
+
+    name = "agent"
+
+    @abc.abstractmethod
+    async def run(self, query: str) -> Dict[str, Any]:
+        ...
+
+
+class CortexAgentEndpoint(AgentEndpoint):
+    """Cortex Agents REST API (agent:run). Blocking HTTP runs in worker threads via asyncio.to_thread"""
+
+    name = "cortex"
+
+    def __init__(self, agent_fq_name: str, account: str, token: str, timeout: float = 300):
+        database, schema, agent = agent_fq_name.split(".")
+        host = account if account.startswith("https://") else f"https://{account}.snowflakecomputing.com"
+        self.url = f"{host}/api/v2/databases/{database}/schemas/{schema}/agents/{agent}:run"
+        self.token = token
+        self.timeout = timeout
+
+    def _post(self, query: str) -> str:
+        body = json.dumps({"messages": [{"role": "user", "content": [{"type": "text", "text": query}]}]})
+        request = urllib.request.Request(
+            self.url,
+            data=body.encode("utf-8"),
+            headers={
+                "Authorization": f"Bearer {self.token}",
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream",
+            },
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read().decode("utf-8")
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")[:500]
+            if e.code in RETRYABLE_HTTP_STATUS:
+                raise RetryableError(f"HTTP {e.code}: {detail}") from e
+            raise RuntimeError(f"HTTP {e.code}: {detail}") from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise RetryableError(str(e)) from e
+
+    @staticmethod
+    def _parse_events(stream: str) -> Dict[str, Any]:
+        """Rebuild the answer and tool calls from the server-sent event stream"""
+        text_parts, tool_names, tool_calls = [], {}, []
+        event = None
+        for line in stream.splitlines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+                continue
+            if not line.startswith("data:"):
+                continue
+            try:
+                data = json.loads(line[len("data:"):].strip())
+            except ValueError:
+                continue
+            if event == "response.text.delta":
+                text_parts.append(data.get("text", ""))
+            elif event == "response.tool_use":
+                tool_names[data.get("tool_use_id")] = data.get("name", "")
+            elif event == "response.tool_result":
+                tool_calls.append({
+                    "tool_name": tool_names.get(data.get("tool_use_id"), data.get("name", "")),
+                    "tool_output": CortexAgentEndpoint._tool_output(data.get("content", [])),
+                })
+            elif event == "error":
+                raise RuntimeError(data.get("message", str(data)))
+        return {"response": "".join(text_parts), "tool_calls": tool_calls}
+
+    @staticmethod
+    def _tool_output(content: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Map a tool result onto the app's tool_output keys: SQL, search results or CUSTOM_TOOL_RESULT"""
+        output = {}
+        for item in content:
+            payload = item.get("json", item.get("text"))
+            if isinstance(payload, dict) and "sql" in payload:
+                output["SQL"] = payload["sql"]
+            elif isinstance(payload, dict) and "searchResults" in payload:
+                output["search results"] = json.dumps(payload["searchResults"])
+            elif payload is not None:
+                output["CUSTOM_TOOL_RESULT"] = payload if isinstance(payload, str) else json.dumps(payload)
+        return output
+
+    async def run(self, query: str) -> Dict[str, Any]:
+        stream = await asyncio.to_thread(self._post, query)
+        return self._parse_events(stream)
+
+
+class LocalAgentEndpoint(AgentEndpoint):
+    """Offline stand-in that answers from the evalset's own EXPECTED_TOOLS"""
+
+    name = "local"
+
+    def __init__(self, dataset: pd.DataFrame, latency_ms: float = 50, failure_rate: float = 0.0, seed: int = 0):
+        self.answers = {}
+        self.skipped_rows = []
+        if "EXPECTED_TOOLS" in dataset.columns:
+            for position, (query, expected) in enumerate(zip(dataset["INPUT_QUERY"], dataset["EXPECTED_TOOLS"])):
+                try:
+                    parsed = parse_expected_tools(expected)
+                except (ValueError, SyntaxError):
+                    parsed = None
+                if not isinstance(parsed, dict):
+                    # A malformed cell only loses that row's answer; the query still replays with an empty one
+                    self.skipped_rows.append(position)
+                    continue
+                self.answers[query] = parsed
+        if self.skipped_rows:
+            print(f"Skipped malformed EXPECTED_TOOLS in {len(self.skipped_rows)} row(s): "
+                  f"{self.skipped_rows[:10]}{' ...' if len(self.skipped_rows) > 10 else ''}", file=sys.stderr)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    async def run(self, query: str) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency_ms / 1000 * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.failure_rate:
+            raise RetryableError("simulated transient failure")
+        expected = self.answers.get(query, {})
+        return {
+            "response": expected.get("ground_truth_output", ""),
+            "tool_calls": [
+                {"tool_name": tool.get("tool_name", ""), "tool_output": tool.get("tool_output", {})}
+                for tool in expected.get("ground_truth_invocations", [])
+            ],
+        }
+
+
+class TokenBucket:
+    """Limits request starts to `rate` per second, allowing bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def record_key(position: int, query: str) -> str:
+    """Stable key per evalset row, so resume survives duplicate queries"""
+    return f"{position}:{hashlib.sha1(query.encode('utf-8')).hexdigest()[:12]}"
+
+
+def load_evalset(path: str) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    elif path.endswith((".jsonl", ".json")):
+        df = pd.read_json(path, lines=path.endswith(".jsonl"))
+    else:
+        df = pd.read_csv(path)
+    df.columns = [column.upper() for column in df.columns]
+    if "INPUT_QUERY" not in df.columns:
+        raise ValueError(f"{path} has no INPUT_QUERY column")
+    return df[df["INPUT_QUERY"].notna()].reset_index(drop=True)
+
+
+def load_completed(output_path: str) -> set:
+    """Keys of records that already succeeded in a previous run"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # Partial last line from an interrupted run
+            if result.get("STATUS") == "ok":
+                completed.add(result["RECORD_KEY"])
+    return completed
+
+
+async def replay_one(endpoint: AgentEndpoint, bucket: TokenBucket, position: int, query: str,
+                     max_retries: int, backoff: float) -> Dict[str, Any]:
+    attempt = 0
+    while True:
+        attempt += 1
+        await bucket.acquire()
+        start = time.perf_counter()
+        try:
+            result = await endpoint.run(query)
+            return {
+                "STATUS": "ok",
+                "EXPECTED_TOOLS": to_expected_tools(result["response"], result["tool_calls"]),
+                "LATENCY_MS": round((time.perf_counter() - start) * 1000, 1),
+                "ATTEMPTS": attempt,
+            }
+        except RetryableError as e:
+            if attempt > max_retries:
+                return {"STATUS": "failed", "ERROR": str(e), "ATTEMPTS": attempt}
+            # Exponential backoff with full jitter
+            await asyncio.sleep(random.uniform(0, backoff * 2 ** (attempt - 1)))
+        except Exception as e:
+            return {"STATUS": "failed", "ERROR": str(e), "ATTEMPTS": attempt}
+
+
+async def replay(endpoint: AgentEndpoint, dataset: pd.DataFrame, output_path: str, concurrency: int,
+                 rate: float, burst: int, max_retries: int, backoff: float) -> Dict[str, Any]:
+    completed = load_completed(output_path)
+    pending = [
+        (position, query) for position, query in enumerate(dataset["INPUT_QUERY"].astype(str))
+        if record_key(position, query) not in completed
+    ]
+
+    queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+
+    bucket = TokenBucket(rate, burst)
+    counts = {"ok": 0, "failed": 0}
+    start = time.perf_counter()
+
+    with open(output_path, "a") as out:
+        async def worker() -> None:
+            while True:
+                try:
+                    position, query = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await replay_one(endpoint, bucket, position, query, max_retries, backoff)
+                result = {"RECORD_KEY": record_key(position, query), "POSITION": position, "INPUT_QUERY": query,
+                          "ENDPOINT": endpoint.name, **result}
+                # One line per record, flushed immediately so an interruption loses at most in-flight queries
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                counts[result["STATUS"]] += 1
+                done = counts["ok"] + counts["failed"]
+                if done % 50 == 0 or done == len(pending):
+                    elapsed = time.perf_counter() - start
+                    print(f"{done}/{len(pending)} done | {done / elapsed:.2f} QPS | {counts['failed']} failed",
+                          file=sys.stderr)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    elapsed = time.perf_counter() - start
+    return {
+        "records": len(dataset),
+        "skipped_completed": len(dataset) - len(pending),
+        "succeeded": counts["ok"],
+        "failed": counts["failed"],
+        "elapsed_s": round(elapsed, 2),
+        "qps": round(len(pending) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def main() -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("evalset", help="Exported evalset (.csv, .jsonl or .parquet) with an INPUT_QUERY column")
+    parser.add_argument("--endpoint", choices=["cortex", "local"], default="cortex")
+    parser.add_argument("--agent", help="Fully qualified agent name DB.SCHEMA.AGENT (cortex endpoint)")
+    parser.add_argument("--output", default="replay_results.jsonl", help="Results file; existing results are resumed")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent workers")
+    parser.add_argument("--rate", type=float, default=5.0, help="Max requests started per second (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=5, help="Requests allowed at once before rate limiting")
+    parser.add_argument("--max-retries", type=int, default=4)
+    parser.add_argument("--backoff", type=float, default=1.0, help="Base backoff in seconds, doubled per retry")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds (cortex endpoint)")
+    parser.add_argument("--local-latency-ms", type=float, default=50)
+    parser.add_argument("--local-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    dataset = load_evalset(args.evalset)
+
+    if args.endpoint == "local":
+        endpoint = LocalAgentEndpoint(dataset, args.local_latency_ms, args.local_failure_rate)
+    else:
+        account, token = os.getenv("SNOWFLAKE_ACCOUNT"), os.getenv("SNOWFLAKE_PAT")
+        if not args.agent or not account or not token:
+            parser.error("the cortex endpoint needs --agent DB.SCHEMA.AGENT, SNOWFLAKE_ACCOUNT and SNOWFLAKE_PAT")
+        endpoint = CortexAgentEndpoint(args.agent, account, token, args.timeout)
+
+    summary = asyncio.run(replay(
+        endpoint, dataset, args.output, args.concurrency, args.rate, args.burst, args.max_retries, args.backoff,
+    ))
+    print(json.dumps({"replay": endpoint.name, **summary}))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
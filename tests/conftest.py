@@ -0,0 +1,54 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmarks  # noqa: E402
+
+
+class FakeSessionState(dict):
+    """Stands in for st.session_state: a dict with attribute access"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def new_session(app, workspace_id=None):
+    """Give the app a fresh browser session, with the session state the app initialises at startup"""
+    app["st"].session_state = FakeSessionState(
+        dataset=None, dataset_spill=None, dataset_memory_bytes=0, record_index=None, bulk_undo_stack=[],
+        validation_report=None, workspace_id=workspace_id or uuid.uuid4().hex, journal_seq=0,
+        journal_ops_since_snapshot=0, journal_writer=uuid.uuid4().hex, spill_id=uuid.uuid4().hex,
+    )
+    return app["st"].session_state
+
+
+@pytest.fixture(scope="session")
+def app_functions():
+    return benchmarks.load_app_functions(benchmarks.APP_PATH)
+
+
+@pytest.fixture
+def app(app_functions, tmp_path, monkeypatch):
+    """The app's functions in a fresh session, with spill and journal files under tmp_path"""
+    monkeypatch.setitem(app_functions, "SPILL_DIR", str(tmp_path / "spill"))
+    monkeypatch.setitem(app_functions, "JOURNAL_DIR", str(tmp_path / "journal"))
+    monkeypatch.setattr(app_functions["st"], "session_state", None)
+    new_session(app_functions)
+    return app_functions
+
+
+@pytest.fixture(params=["memory", "spilled"])
+def storage(request, app, monkeypatch):
+    """Run a test once with the dataset in memory and once spilled to disk"""
+    monkeypatch.setitem(app, "MEMORY_BUDGET_MB", 512.0 if request.param == "memory" else 0.0001)
+    return request.param
@@ -0,0 +1,149 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import new_session
+
+
+def expected_tools(i):
+    return {'ground_truth_invocations': [{'tool_sequence': 1, 'tool_name': f"tool_{i % 4}"}],
+            'ground_truth_output': f"answer {i}"}
+
+
+def sample_dataset(rows=600):
+    return pd.DataFrame({
+        'INPUT_QUERY': [f"how did campaign {i} perform" for i in range(rows)],
+        # A few records without tools, as the log pull produces them
+        'EXPECTED_TOOLS': [expected_tools(i) if i % 50 else None for i in range(rows)],
+        'RUN_COUNT': np.arange(rows),
+        'CONSENSUS_SUPPORT': np.linspace(0, 1, rows),
+    })
+
+
+def read_dataset(app):
+    chunks = list(app["iter_dataset_chunks"](chunk_rows=128))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def assert_same_rows(left, right):
+    pd.testing.assert_frame_equal(left.reset_index(drop=True).astype(object),
+                                  right.reset_index(drop=True).astype(object))
+
+
+def edit_dataset(app, seed=0, steps=40):
+    """Apply the same mix of record edits and bulk changes that the Review & edit tab makes"""
+    rng = random.Random(seed)
+    app["set_dataset"](sample_dataset())
+    app["get_record_index"]()
+    for step in range(steps):
+        rows = app["dataset_len"]()
+        action = rng.choice(["append", "update", "delete"])
+        if action == "append":
+            count = rng.randint(1, 20)
+            app["append_to_dataset"](pd.DataFrame({
+                'INPUT_QUERY': [f"new query {step} {k}" for k in range(count)],
+                'EXPECTED_TOOLS': [expected_tools(step + k) for k in range(count)],
+            }))
+        elif action == "update":
+            app["update_dataset_record"](rng.randrange(rows), {'INPUT_QUERY': f"edited query {step}",
+                                                              'EXPECTED_TOOLS': expected_tools(step)})
+        else:
+            app["delete_dataset_record"](rng.randrange(rows))
+
+    app["apply_bulk_operation"](app["plan_dataset_bulk_operation"](
+        "Rename tool", {'tool': 'tool_1', 'new_name': 'renamed_tool'}))
+    app["apply_bulk_operation"](app["plan_dataset_bulk_operation"](
+        "Delete matching records", {'predicate': 'Input query matches', 'value': r"campaign \d*7 "}))
+    app["apply_bulk_operation"](app["plan_dataset_bulk_operation"](
+        "Regex replace in outputs", {'pattern': r"answer (\d+)", 'replacement': r"reply \1"}))
+    assert app["undo_bulk_operation"]() == "Regex replace in outputs"
+
+
+def test_spilled_dataset_matches_in_memory(app, monkeypatch):
+    results = {}
+    for budget in (512.0, 0.0001):
+        monkeypatch.setitem(app, "MEMORY_BUDGET_MB", budget)
+        session = new_session(app)
+        edit_dataset(app)
+        assert bool(session.dataset_spill) == (budget < 1)
+        results[budget] = {
+            'rows': read_dataset(app),
+            'window': app["get_dataset_rows"]([5, 0, app["dataset_len"]() - 1], ['EXPECTED_TOOLS']),
+            'search': app["search_record_index"](app["get_record_index"](), "campaign 3", "Uses renamed_tool"),
+            'bulk': list(app["plan_dataset_bulk_operation"]("Remove tool", {'tool': 'tool_2'})['positions']),
+        }
+
+    in_memory, spilled = results[512.0], results[0.0001]
+    assert_same_rows(in_memory['rows'], spilled['rows'])
+    assert_same_rows(in_memory['window'], spilled['window'])
+    assert in_memory['search'] == spilled['search'] and in_memory['search']
+    assert in_memory['bulk'] == spilled['bulk'] and in_memory['bulk']
+
+
+def test_record_index_patches_match_a_fresh_build(app, storage):
+    edit_dataset(app)
+    patched = app["get_record_index"]()
+    rebuilt = app["build_record_index"](read_dataset(app))
+    for search_text, record_filter in [("", "No tools"), ("query", "All records"), ("edited", "Uses tool_3")]:
+        assert (app["search_record_index"](patched, search_text, record_filter)
+                == app["search_record_index"](rebuilt, search_text, record_filter))
+
+
+def test_record_search_matches_token_substrings(app):
+    index = app["build_record_index"](pd.DataFrame({
+        'INPUT_QUERY': ["Campaign spend by region", "Send the weekly email", "ca"],
+        'EXPECTED_TOOLS': [expected_tools(1), {'ground_truth_invocations': [{'tool_name': 'ToolCall-send_email'}]}, None],
+    }))
+    search = app["search_record_index"]
+    assert search(index, "ampaig") == [0]
+    assert search(index, "email") == [1]
+    assert search(index, "mail send") == [1]
+    # Terms shorter than an n-gram match token prefixes
+    assert search(index, "ca") == [0, 2]
+    assert search(index, "am") == []
+    assert search(index, "xyz") == []
+
+    app["index_update_record"](index, 1, "weekly digest", None)
+    assert search(index, "email") == []
+    assert "ema" not in index['grams'] and "ail" not in index['grams']
+
+
+def test_bulk_undo_restores_rows(app, storage):
+    app["set_dataset"](sample_dataset())
+    before = read_dataset(app)
+    app["apply_bulk_operation"](app["plan_dataset_bulk_operation"](
+        "Delete matching records", {'predicate': 'Uses tool', 'value': 'tool_[02]', 'regex': True}))
+    app["apply_bulk_operation"](app["plan_dataset_bulk_operation"](
+        "Remove tool", {'tool': 'tool_1'}))
+    assert app["dataset_len"]() < len(before)
+
+    assert app["undo_bulk_operation"]() == "Remove tool"
+    assert app["undo_bulk_operation"]() == "Delete matching records"
+    assert_same_rows(before, read_dataset(app))
+
+
+@pytest.mark.parametrize("compact_ops", [3, 500])
+def test_journal_restore_reproduces_rows(app, storage, monkeypatch, compact_ops):
+    # A small JOURNAL_COMPACT_OPS replays on top of a snapshot taken mid-session
+    monkeypatch.setitem(app, "JOURNAL_COMPACT_OPS", compact_ops)
+    edit_dataset(app)
+    live = read_dataset(app)
+
+    workspace_id = app["st"].session_state.workspace_id
+    new_session(app, workspace_id)
+    assert app["restore_from_journal"]() == len(live)
+    assert_same_rows(live, read_dataset(app))
+
+
+def test_journal_restore_of_previous_dataset(app, storage):
+    edit_dataset(app, steps=10)
+    previous = read_dataset(app)
+    app["archive_journal"]()
+    app["set_dataset"](sample_dataset(rows=20))
+
+    assert app["has_archived_journal"]()
+    assert app["restore_from_journal"](archive=True) == len(previous)
+    assert_same_rows(previous, read_dataset(app))
+    assert not app["has_archived_journal"]()
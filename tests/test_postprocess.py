@@ -0,0 +1,23 @@
+import pytest
+
+import benchmarks
+
+
+@pytest.fixture(scope="module")
+def log_table(app_functions):
+    return benchmarks.synthetic_log_table(2000, seed=7, columns=app_functions["FINAL_COLUMNS"])
+
+
+def test_postprocess_paths_agree(app_functions, log_table):
+    arrow = app_functions["postprocess_arrow"](log_table)
+    assert len(arrow) > 0
+    assert benchmarks.frames_match(app_functions["postprocess_parallel"](log_table, 2), arrow)
+    assert benchmarks.frames_match(app_functions["postprocess_pandas"](log_table.to_pandas()), arrow)
+
+
+def test_postprocess_paths_agree_without_rows(app_functions, log_table):
+    empty = log_table.slice(0, 0)
+    arrow = app_functions["postprocess_arrow"](empty)
+    assert list(arrow.columns) == app_functions["FINAL_COLUMNS"] and arrow.empty
+    assert benchmarks.frames_match(app_functions["postprocess_parallel"](empty, 2), arrow)
+    assert benchmarks.frames_match(app_functions["postprocess_pandas"](empty.to_pandas()), arrow)